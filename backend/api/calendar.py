@@ -0,0 +1,161 @@
+"""iCalendar (RFC 5545) feeds of upcoming showtimes.
+
+A feed only changes when the catalogue is refreshed, so renders are cached
+per (feed, catalogue version) and the version doubles as the ETag: calendar
+clients polling with If-None-Match get a 304 without touching the showtimes.
+The first render streams events straight from a server-side cursor and is
+kept for the next requests once complete.
+"""
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Bump when the rendering changes, so cached copies with the same catalogue
+# version are not reused across deploys
+RENDER_FORMAT = 1
+DEFAULT_DURATION = 120
+TZID = 'Europe/Rome'
+MEDIA_TYPE = 'text/calendar; charset=utf-8'
+
+VTIMEZONE = "\r\n".join([
+    "BEGIN:VTIMEZONE",
+    f"TZID:{TZID}",
+    "BEGIN:DAYLIGHT",
+    "TZOFFSETFROM:+0100",
+    "TZOFFSETTO:+0200",
+    "TZNAME:CEST",
+    "DTSTART:19700329T020000",
+    "RRULE:FREQ=YEARLY;BYMONTH=3;BYDAY=-1SU",
+    "END:DAYLIGHT",
+    "BEGIN:STANDARD",
+    "TZOFFSETFROM:+0200",
+    "TZOFFSETTO:+0100",
+    "TZNAME:CET",
+    "DTSTART:19701025T030000",
+    "RRULE:FREQ=YEARLY;BYMONTH=10;BYDAY=-1SU",
+    "END:STANDARD",
+    "END:VTIMEZONE",
+]) + "\r\n"
+
+
+def escape_text(value: str) -> str:
+    return (value.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+            .replace('\r\n', '\\n').replace('\n', '\\n'))
+
+
+def fold(line: str) -> str:
+    """Fold a content line at 75 octets, without splitting UTF-8 sequences"""
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line + "\r\n"
+    parts = []
+    limit = 75
+    while encoded:
+        cut = min(limit, len(encoded))
+        # Back off to a character boundary
+        while cut < len(encoded) and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode('utf-8'))
+        encoded = encoded[cut:]
+        limit = 74  # continuation lines start with a space
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def _local(value: datetime) -> str:
+    return value.strftime('%Y%m%dT%H%M%S')
+
+
+def render_event(row: Dict, stamp: datetime) -> str:
+    starts_at = row['starts_at']
+    minutes = row.get('duration') or DEFAULT_DURATION
+    uid = f"{row['movie_id']}-{row['cinema_id']}-{_local(starts_at)}@stacco"
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:{uid}",
+        f"DTSTAMP:{stamp.strftime('%Y%m%dT%H%M%SZ')}",
+        f"DTSTART;TZID={TZID}:{_local(starts_at)}",
+        f"DTEND;TZID={TZID}:{_local(starts_at + timedelta(minutes=minutes))}",
+        f"SUMMARY:{escape_text(row['title'])} – {escape_text(row['cinema_name'])}",
+        f"LOCATION:{escape_text(row['cinema_name'])}",
+    ]
+    if row.get('latitude') is not None and row.get('longitude') is not None:
+        lines.append(f"GEO:{row['latitude']};{row['longitude']}")
+    if row.get('booking_link'):
+        lines.append(f"URL:{row['booking_link']}")
+    lines.append("END:VEVENT")
+    return ''.join(fold(line) for line in lines)
+
+
+def render_calendar(name: str, rows: Iterable[Dict], stamp: datetime, chunk_events: int = 200) -> Iterator[str]:
+    """The feed as text chunks of up to `chunk_events` events"""
+    yield ''.join(fold(line) for line in [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        "PRODID:-//Stacco//Programmazione cinema//IT",
+        "CALSCALE:GREGORIAN",
+        "METHOD:PUBLISH",
+        f"X-WR-CALNAME:{escape_text(name)}",
+        f"X-WR-TIMEZONE:{TZID}",
+        "REFRESH-INTERVAL;VALUE=DURATION:PT6H",
+    ]) + VTIMEZONE
+    events = []
+    for row in rows:
+        events.append(render_event(row, stamp))
+        if len(events) >= chunk_events:
+            yield ''.join(events)
+            events = []
+    yield ''.join(events) + "END:VCALENDAR\r\n"
+
+
+class CalendarCache:
+    """Rendered feeds for the current catalogue version, least recently used first out"""
+
+    def __init__(self, db, max_entries: int = 512, version_ttl: float = 5.0):
+        self.db = db
+        self.max_entries = max_entries
+        self.version_ttl = version_ttl
+        self._renders: "OrderedDict[Tuple[str, str], Tuple[int, bytes]]" = OrderedDict()
+        self._version: Optional[Tuple[int, datetime]] = None
+        self._version_checked = 0.0
+
+    async def version(self) -> Tuple[int, datetime]:
+        """(catalogue version, refresh time), re-read at most every `version_ttl` seconds"""
+        if self._version is None or time.monotonic() - self._version_checked >= self.version_ttl:
+            self._version = await self.db.get_catalogue_version()
+            self._version_checked = time.monotonic()
+        return self._version
+
+    @staticmethod
+    def etag(version: int) -> str:
+        return f'"v{version}.{RENDER_FORMAT}"'
+
+    def get(self, key: Tuple[str, str], version: int) -> Optional[bytes]:
+        cached = self._renders.get(key)
+        if cached is None or cached[0] != version:
+            return None
+        self._renders.move_to_end(key)
+        return cached[1]
+
+    def put(self, key: Tuple[str, str], version: int, body: bytes):
+        self._renders[key] = (version, body)
+        self._renders.move_to_end(key)
+        while len(self._renders) > self.max_entries:
+            self._renders.popitem(last=False)
+
+    def tee(self, key: Tuple[str, str], version: int, chunks: Iterable[str]) -> Iterator[bytes]:
+        """Pass a streamed render through, caching it once it has completed"""
+        parts: List[bytes] = []
+        for chunk in chunks:
+            data = chunk.encode('utf-8')
+            parts.append(data)
+            yield data
+        self.put(key, version, b''.join(parts))
+
+
+def not_modified(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(',')]
+    # Weak comparison, as RFC 7232 prescribes for If-None-Match
+    return '*' in candidates or etag in candidates or f"W/{etag}" in candidates
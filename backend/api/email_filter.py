@@ -0,0 +1,182 @@
+import asyncio
+import hashlib
+import logging
+import math
+import time
+from typing import Iterable, Optional
+
+try:
+    from utils.metrics import EMAIL_PREFILTER_RESULTS
+except ImportError:  # imported from the project root (tests, scripts)
+    from backend.utils.metrics import EMAIL_PREFILTER_RESULTS
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_email(email: str) -> str:
+    return email.strip().lower()
+
+
+class CountingBloomFilter:
+    """Bloom filter with 8-bit counters, so members can also be removed.
+
+    Lookups never give false negatives for members that were added and not
+    removed; false positives happen at about `error_rate` once `capacity`
+    members are stored.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        capacity = max(1, capacity)
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.capacity = capacity
+        self.count = 0
+        self._counters = bytearray(self.size)
+
+    def _indexes(self, item: str):
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    def add(self, item: str):
+        counters = self._counters
+        for index in self._indexes(item):
+            if counters[index] < 255:
+                counters[index] += 1
+        self.count += 1
+
+    def remove(self, item: str):
+        """Remove a member; only call this for items known to have been added"""
+        counters = self._counters
+        indexes = self._indexes(item)
+        if not all(counters[index] for index in indexes):
+            return
+        for index in indexes:
+            # A saturated counter no longer knows how many members share it
+            if counters[index] < 255:
+                counters[index] -= 1
+        self.count = max(0, self.count - 1)
+
+    def __contains__(self, item: str) -> bool:
+        counters = self._counters
+        return all(counters[index] for index in self._indexes(item))
+
+
+class EmailPrefilter:
+    """Answers "is this email registered?" without Postgres for new addresses.
+
+    The filter is built from users.email in the background, then kept current
+    by adding new users (by id) every `sync_interval` seconds and fully
+    rebuilt every `rebuild_interval`, which also resizes it and forgets users
+    deleted by other workers. A "not registered" answer also syncs first
+    when the last sync is more than `recheck_interval` seconds old, with
+    concurrent lookups sharing that one query, so an address registered
+    through another worker is reported missing for at most that long.
+    Until the first build completes every lookup goes to the database.
+    """
+
+    def __init__(self, db, error_rate: float = 0.001, sync_interval: float = 30.0,
+                 rebuild_interval: float = 3600.0, recheck_interval: float = 1.0):
+        self.db = db
+        self.error_rate = error_rate
+        self.sync_interval = sync_interval
+        self.rebuild_interval = rebuild_interval
+        self.recheck_interval = recheck_interval
+        self.filter: Optional[CountingBloomFilter] = None
+        self.synced_id = 0
+        self.built_at: Optional[float] = None
+        self.synced_at = float('-inf')
+        self._task: Optional[asyncio.Task] = None
+        self._recheck: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    def _new_filter(self, rows: Iterable) -> CountingBloomFilter:
+        rows = list(rows)
+        bloom = CountingBloomFilter(max(1000, 2 * len(rows)), self.error_rate)
+        for _, email in rows:
+            bloom.add(normalize_email(email))
+        return bloom
+
+    async def rebuild(self):
+        async with self._lock:
+            self.synced_at = time.monotonic()
+            rows = await self.db.get_user_emails()
+            self.filter = self._new_filter(rows)
+            self.synced_id = max((user_id for user_id, _ in rows), default=0)
+            self.built_at = time.monotonic()
+            logger.info(f"Email prefilter built with {len(rows)} addresses "
+                        f"({self.filter.size // 1024} KiB)")
+
+    async def sync(self):
+        """Add users created since the last build or sync (possibly by other workers)"""
+        async with self._lock:
+            if self.filter is None:
+                return
+            self.synced_at = time.monotonic()
+            rows = await self.db.get_user_emails(after_id=self.synced_id)
+            for user_id, email in rows:
+                self.filter.add(normalize_email(email))
+                self.synced_id = max(self.synced_id, user_id)
+        if self.filter.count > self.filter.capacity:
+            await self.rebuild()
+
+    async def _recheck_sync(self):
+        """Sync unless the last one is recent; concurrent callers share one query"""
+        if self._recheck is None or self._recheck.done():
+            if time.monotonic() - self.synced_at < self.recheck_interval:
+                return
+            self._recheck = asyncio.create_task(self.sync())
+        await asyncio.shield(self._recheck)
+
+    def add(self, email: str):
+        if self.filter is not None:
+            self.filter.add(normalize_email(email))
+
+    def remove(self, email: str, user_id: int):
+        # Removing an address the filter never saw would clear counters shared
+        # with real members and turn them into false negatives.
+        if self.filter is not None and user_id <= self.synced_id:
+            self.filter.remove(normalize_email(email))
+
+    def might_exist(self, email: str) -> bool:
+        if self.filter is None:
+            return True
+        return normalize_email(email) in self.filter
+
+    async def email_exists(self, email: str) -> bool:
+        if self.filter is None:
+            EMAIL_PREFILTER_RESULTS.labels(result='not_ready').inc()
+            return await self.db.email_exists(email)
+        if not self.might_exist(email):
+            await self._recheck_sync()
+            if not self.might_exist(email):
+                EMAIL_PREFILTER_RESULTS.labels(result='filtered').inc()
+                return False
+        exists = await self.db.email_exists(email)
+        EMAIL_PREFILTER_RESULTS.labels(result='found' if exists else 'false_positive').inc()
+        return exists
+
+    async def _run(self):
+        while True:
+            try:
+                if self.filter is None or time.monotonic() - self.built_at >= self.rebuild_interval:
+                    await self.rebuild()
+                else:
+                    await self.sync()
+            except Exception as e:
+                logger.error(f"Email prefilter refresh failed: {str(e)}")
+            await asyncio.sleep(self.sync_interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,232 @@
+"""Server-Sent Events push of catalogue changes.
+
+update_movies_and_showtimes and update_cinemas NOTIFY their changes when they
+commit, whichever process ran them (usually the scraper). Each API worker
+LISTENs on one dedicated connection and fans the events out in-process to
+its subscribers. Every subscriber has a bounded queue: one that falls behind
+has its backlog dropped and receives a `resync` event instead, telling the
+client to re-fetch what it shows. Subscribers also get `resync` after the
+listener reconnects, as notifications sent in between are lost.
+
+Logged changes carry their catalogue_changes sequence number, sent as the
+SSE event id, which clients can pass to GET /api/catalogue/changes?since=
+to catch up.
+"""
+import asyncio
+import json
+import logging
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Set
+
+import psycopg2
+
+try:
+    from utils.metrics import CHANGE_EVENTS, CHANGE_SUBSCRIBERS
+except ImportError:  # imported from the project root (tests, scripts)
+    from backend.utils.metrics import CHANGE_EVENTS, CHANGE_SUBSCRIBERS
+
+logger = logging.getLogger(__name__)
+
+MEDIA_TYPE = 'text/event-stream'
+RESYNC = {'type': 'resync'}
+
+
+# The fields identifying what each kind of change is about
+CHANGE_KEYS = {
+    'showtime': ('movie_id', 'cinema_id', 'date', 'time'),
+    'movie': ('movie_id',),
+    'cinema': ('cinema_id',),
+}
+
+
+def format_event(change: Dict) -> str:
+    event_id = f"id: {change['seq']}\n" if 'seq' in change else ''
+    return f"{event_id}event: {change['type']}\ndata: {json.dumps(change, separators=(',', ':'))}\n\n"
+
+
+def compact_changes(changes: List[Dict]) -> List[Dict]:
+    """One change per showtime, movie or cinema: the net effect of `changes`, in log order.
+
+    The latest change of each wins, except that something added within
+    `changes` stays an addition (with the latest data), and something both
+    added and removed within them is left out.
+    """
+    latest: Dict[tuple, Dict] = {}
+    added: Set[tuple] = set()
+    for change in changes:
+        entity, action = change['type'].split('.', 1)
+        key = (entity,) + tuple(change.get(field) for field in CHANGE_KEYS.get(entity, ()))
+        if key not in latest and action == 'added':
+            added.add(key)
+        # Re-inserted so the result stays ordered by each key's latest change
+        latest.pop(key, None)
+        latest[key] = change
+
+    compacted = []
+    for key, change in latest.items():
+        if key in added:
+            action = change['type'].split('.', 1)[1]
+            if action == 'removed':
+                continue
+            if action != 'added':
+                change = dict(change, type=f"{key[0]}.added")
+        compacted.append(change)
+    return compacted
+
+
+class Subscription:
+    def __init__(self, cinemas: Iterable[str] = (), movies: Iterable[str] = (), queue_size: int = 256):
+        self.cinemas = frozenset(cinemas)
+        self.movies = frozenset(movies)
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+
+    def wants(self, change: Dict) -> bool:
+        if not self.cinemas and not self.movies:
+            return True
+        return change.get('cinema_id') in self.cinemas or change.get('movie_id') in self.movies
+
+    def push(self, change: Optional[Dict]) -> bool:
+        """Queue a change; on overflow replace the backlog with a resync"""
+        try:
+            self.queue.put_nowait(change)
+            return True
+        except asyncio.QueueFull:
+            dropped = self.queue.qsize() + 1
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+            CHANGE_EVENTS.labels(outcome='dropped').inc(dropped)
+            return False
+
+    def close(self):
+        """End the stream after whatever it has already queued"""
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+
+class ChangeBroker:
+    def __init__(self, db, queue_size: int = 256, heartbeat: float = 15.0, reconnect_delay: float = 5.0):
+        self.db = db
+        self.queue_size = queue_size
+        self.heartbeat = heartbeat
+        self.reconnect_delay = reconnect_delay
+        self._subscribers: Set[Subscription] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self, cinemas: Iterable[str] = (), movies: Iterable[str] = ()) -> Subscription:
+        subscription = Subscription(cinemas, movies, self.queue_size)
+        self._subscribers.add(subscription)
+        CHANGE_SUBSCRIBERS.inc()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        if subscription in self._subscribers:
+            self._subscribers.discard(subscription)
+            CHANGE_SUBSCRIBERS.dec()
+
+    def publish(self, changes: Iterable[Dict]):
+        for change in changes:
+            for subscription in self._subscribers:
+                if subscription.wants(change) and subscription.push(change):
+                    CHANGE_EVENTS.labels(outcome='delivered').inc()
+
+    def resync(self):
+        for subscription in self._subscribers:
+            subscription.push(RESYNC)
+
+    async def stream(self, subscription: Subscription,
+                     is_disconnected: Callable[[], Awaitable[bool]]) -> AsyncIterator[str]:
+        """SSE text for one subscriber, with a comment line every `heartbeat` idle seconds"""
+        try:
+            yield f"retry: {int(self.reconnect_delay * 1000)}\n\n"
+            while True:
+                try:
+                    change = await asyncio.wait_for(subscription.queue.get(), timeout=self.heartbeat)
+                except asyncio.TimeoutError:
+                    if await is_disconnected():
+                        break
+                    yield ": keep-alive\n\n"
+                    continue
+                if change is None:
+                    break
+                yield format_event(change)
+        finally:
+            self.unsubscribe(subscription)
+
+    def _drain(self, conn, lost: asyncio.Future):
+        try:
+            conn.poll()
+        except psycopg2.Error as e:
+            if not lost.done():
+                lost.set_exception(e)
+            return
+        while conn.notifies:
+            notify = conn.notifies.pop(0)
+            try:
+                self.publish(json.loads(notify.payload))
+            except ValueError:
+                logger.error(f"Ignoring malformed change notification: {notify.payload[:200]}")
+
+    @staticmethod
+    def _ping(conn):
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1")
+
+    async def _listen(self, conn):
+        """Publish notifications from `conn` until it fails"""
+        loop = asyncio.get_running_loop()
+        lost = loop.create_future()
+        loop.add_reader(conn.fileno(), self._drain, conn, lost)
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(asyncio.shield(lost), timeout=self.heartbeat)
+                except asyncio.TimeoutError:
+                    # A dropped TCP connection never becomes readable
+                    await asyncio.to_thread(self._ping, conn)
+                    self._drain(conn, lost)
+        finally:
+            loop.remove_reader(conn.fileno())
+            if lost.done():
+                lost.exception()
+
+    async def _run(self):
+        connected_before = False
+        while True:
+            try:
+                conn = await asyncio.to_thread(self.db.open_change_listener)
+            except Exception as e:
+                logger.error(f"Change listener could not connect: {str(e)}")
+                await asyncio.sleep(self.reconnect_delay)
+                continue
+
+            if connected_before:
+                self.resync()
+            connected_before = True
+            try:
+                await self._listen(conn)
+            except psycopg2.Error as e:
+                logger.error(f"Change listener connection lost: {str(e)}")
+            finally:
+                conn.close()
+            await asyncio.sleep(self.reconnect_delay)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # End the open streams
+        for subscription in list(self._subscribers):
+            subscription.close()
@@ -0,0 +1,224 @@
+"""Image proxy for movie posters and cinema icons.
+
+Catalogue documents point at /api/images/<id>, where <id> is the md5 of the
+original URL registered in image_sources, so only images the scraper has
+seen can be proxied. The first request for an image downloads the original
+once and renders every width in IMAGE_WIDTHS as WebP and JPEG in a process
+pool. Variants are served from a size-bounded disk cache with immutable
+Cache-Control headers. Originals and variants share one size budget,
+evicting the least recently used files first.
+"""
+import asyncio
+import logging
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+IMAGE_WIDTHS = (160, 320, 640)
+DEFAULT_WIDTH = 320
+FORMATS = {'webp': 'image/webp', 'jpeg': 'image/jpeg'}
+MAX_ORIGINAL_BYTES = 15 * 1024 * 1024
+IMMUTABLE = "public, max-age=31536000, immutable"
+# Don't retry a failing original on every request
+FAILURE_BACKOFF = 300
+
+_IMAGE_ID = re.compile(r'^[0-9a-f]{32}$')
+
+
+def render_variants(original_path: str, output_dir: str, image_id: str, widths=IMAGE_WIDTHS) -> Dict[str, int]:
+    """Write every width/format variant of one original; runs in a worker process"""
+    from PIL import Image, ImageOps
+
+    written = {}
+    with Image.open(original_path) as original:
+        original = ImageOps.exif_transpose(original)
+        has_alpha = original.mode in ('RGBA', 'LA') or 'transparency' in original.info
+        base = original.convert('RGBA' if has_alpha else 'RGB')
+        for width in widths:
+            # Never upscale
+            target = min(width, base.width)
+            height = max(1, round(base.height * target / base.width))
+            resized = base.resize((target, height), Image.LANCZOS) if target != base.width else base
+            for fmt in FORMATS:
+                path = os.path.join(output_dir, f"{image_id}_{width}.{fmt}")
+                tmp_path = f"{path}.tmp"
+                if fmt == 'jpeg':
+                    image = resized
+                    if image.mode == 'RGBA':
+                        # JPEG has no alpha: flatten on white
+                        image = Image.new('RGB', resized.size, (255, 255, 255))
+                        image.paste(resized, mask=resized.split()[-1])
+                    image.save(tmp_path, 'JPEG', quality=82, optimize=True, progressive=True)
+                else:
+                    resized.save(tmp_path, 'WEBP', quality=80, method=4)
+                os.replace(tmp_path, path)
+                written[path] = os.path.getsize(path)
+    return written
+
+
+class ImageProxy:
+    def __init__(self, db, cache_dir: str, max_bytes: int = 512 * 1024 * 1024, workers: int = 2):
+        self.db = db
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.workers = workers
+        self._sources: Dict[str, str] = {}
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._session = None
+        self._failures: Dict[str, float] = {}
+        self._cache_bytes: Optional[int] = None
+        self._evict_lock = asyncio.Lock()
+
+    @staticmethod
+    def valid_id(image_id: str) -> bool:
+        return bool(_IMAGE_ID.match(image_id))
+
+    @staticmethod
+    def pick_width(requested: Optional[int]) -> int:
+        """Smallest configured width covering the request"""
+        if not requested:
+            return DEFAULT_WIDTH
+        return next((width for width in IMAGE_WIDTHS if width >= requested), IMAGE_WIDTHS[-1])
+
+    @staticmethod
+    def pick_format(requested: Optional[str], accept: str) -> str:
+        if requested in FORMATS:
+            return requested
+        return 'webp' if 'image/webp' in (accept or '') else 'jpeg'
+
+    def _dir(self, kind: str, image_id: str) -> str:
+        return os.path.join(self.cache_dir, kind, image_id[:2])
+
+    def variant_path(self, image_id: str, width: int, fmt: str) -> str:
+        return os.path.join(self._dir('variants', image_id), f"{image_id}_{width}.{fmt}")
+
+    async def _source_url(self, image_id: str) -> Optional[str]:
+        url = self._sources.get(image_id)
+        if url is None:
+            # Unknown ids are not remembered: the next scrape may register them
+            url = await self.db.get_image_source(image_id)
+            if url is not None:
+                self._sources[image_id] = url
+        return url
+
+    async def _download(self, url: str, path: str) -> int:
+        import aiohttp
+
+        if self._session is None:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=30, connect=10))
+        async with self._session.get(url) as response:
+            if response.status != 200:
+                raise ValueError(f"Upstream answered HTTP {response.status}")
+            if not response.headers.get('Content-Type', '').startswith('image/'):
+                raise ValueError(f"Upstream sent {response.headers.get('Content-Type')}, not an image")
+            body = await response.content.read(MAX_ORIGINAL_BYTES + 1)
+            if len(body) > MAX_ORIGINAL_BYTES:
+                raise ValueError("Original image too large")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(f"{path}.tmp", 'wb') as f:
+            f.write(body)
+        os.replace(f"{path}.tmp", path)
+        return len(body)
+
+    async def _materialize(self, image_id: str, url: str):
+        """Download the original once and render all its variants"""
+        original = os.path.join(self._dir('originals', image_id), image_id)
+        downloaded = 0
+        if not os.path.exists(original):
+            downloaded = await self._download(url, original)
+        output_dir = self._dir('variants', image_id)
+        os.makedirs(output_dir, exist_ok=True)
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        written = await asyncio.get_running_loop().run_in_executor(
+            self._pool, render_variants, original, output_dir, image_id
+        )
+        await self._account(downloaded + sum(written.values()))
+
+    async def variant(self, image_id: str, width: int, fmt: str) -> Optional[str]:
+        """Path of a ready variant, rendering it first if needed; None for unknown images"""
+        path = self.variant_path(image_id, width, fmt)
+        if os.path.exists(path):
+            os.utime(path)  # recency for the LRU
+            return path
+
+        url = await self._source_url(image_id)
+        if url is None:
+            return None
+
+        failed_at = self._failures.get(image_id)
+        if failed_at is not None and time.monotonic() - failed_at < FAILURE_BACKOFF:
+            raise ValueError(f"Image {image_id} failed recently")
+
+        future = self._in_flight.get(image_id)
+        if future is None:
+            future = asyncio.ensure_future(self._materialize(image_id, url))
+            self._in_flight[image_id] = future
+            future.add_done_callback(lambda _: self._in_flight.pop(image_id, None))
+        try:
+            await asyncio.shield(future)
+        except Exception:
+            self._failures[image_id] = time.monotonic()
+            raise
+        self._failures.pop(image_id, None)
+        return path
+
+    def _scan(self):
+        """(mtime, size, path) of every cached original and variant"""
+        files = []
+        for root, _, names in os.walk(self.cache_dir):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+        return files
+
+    async def _account(self, added: int):
+        async with self._evict_lock:
+            if self._cache_bytes is None:
+                files = await asyncio.to_thread(self._scan)
+                self._cache_bytes = sum(size for _, size, _ in files)
+            else:
+                self._cache_bytes += added
+            if self._cache_bytes > self.max_bytes:
+                # Originals still being rendered stay put
+                await asyncio.to_thread(self._evict, frozenset(self._in_flight))
+
+    def _evict(self, keep=frozenset()):
+        """Delete least recently used files down to 90% of the budget, sparing
+        the originals of the images in `keep`"""
+        files = sorted(self._scan())
+        total = sum(size for _, size, _ in files)
+        target = self.max_bytes * 0.9
+        for _, size, path in files:
+            if total <= target:
+                break
+            if os.path.basename(path) in keep:
+                continue
+            try:
+                os.remove(path)
+                total -= size
+            except FileNotFoundError:
+                pass
+        self._cache_bytes = total
+        logger.info(f"Image cache trimmed to {total // (1024 * 1024)} MiB")
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+def response_headers(fmt: str) -> Tuple[str, Dict[str, str]]:
+    return FORMATS[fmt], {"Cache-Control": IMMUTABLE, "Vary": "Accept"}
@@ -0,0 +1,118 @@
+"""Load shedding: answer 503 early instead of queueing work we cannot finish.
+
+Load is the larger of two ratios: requests in flight over `max_in_flight`,
+and event loop lag (how late the loop runs a timer, i.e. how long any ready
+callback waits its turn) over `max_lag`. Each route priority sheds at its
+own load level, so heavy endpoints go first, catalogue reads hold out the
+longest and health checks and metrics are always served. Shed requests get
+503 with Retry-After and never touch the database.
+
+Server-Sent Events streams stay open for as long as the client listens and
+mostly wait, so they are admitted like normal requests but not counted as
+in flight.
+"""
+import asyncio
+import re
+import time
+from typing import Optional
+
+from starlette.responses import JSONResponse
+
+try:
+    from utils.metrics import EVENT_LOOP_LAG, REQUESTS_SHED
+except ImportError:  # imported from the project root (tests, scripts)
+    from backend.utils.metrics import EVENT_LOOP_LAG, REQUESTS_SHED
+
+# (priority, path pattern, load at which it is shed), first match wins
+PRIORITIES = (
+    ('critical', re.compile(r'^/(health|metrics)$'), None),
+    ('heavy', re.compile(
+        r'^/api/(users|users/export|watches/bulk|debug/.+|(movies|cinemas)/[^/]+/calendar\.ics)$'
+    ), 0.5),
+    ('catalogue', re.compile(
+        r'^/api/(movies(/[^/]+)?|cinemas(/[^/]+)?|catalogue/changes|images/[^/]+)$'
+    ), 1.5),
+)
+DEFAULT_PRIORITY = ('normal', 1.0)
+UNTRACKED = re.compile(r'^/api/events$')
+
+
+def route_priority(path: str):
+    """(priority, load at which it is shed) for a request path"""
+    for priority, pattern, threshold in PRIORITIES:
+        if pattern.match(path):
+            return priority, threshold
+    return DEFAULT_PRIORITY
+
+
+class LoadShedder:
+    def __init__(self, max_in_flight: int = 256, max_lag: float = 0.5, retry_after: int = 2,
+                 check_interval: float = 0.1):
+        self.max_in_flight = max_in_flight
+        self.max_lag = max_lag
+        self.retry_after = retry_after
+        self.check_interval = check_interval
+        self.in_flight = 0
+        self.lag = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def load(self) -> float:
+        return max(self.in_flight / self.max_in_flight, self.lag / self.max_lag)
+
+    def admits(self, path: str) -> bool:
+        priority, threshold = route_priority(path)
+        if threshold is None or self.load < threshold:
+            return True
+        REQUESTS_SHED.labels(priority=priority).inc()
+        return False
+
+    async def _run(self):
+        while True:
+            expected = time.monotonic() + self.check_interval
+            await asyncio.sleep(self.check_interval)
+            self.lag = max(0.0, time.monotonic() - expected)
+            EVENT_LOOP_LAG.set(self.lag)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+class LoadSheddingMiddleware:
+    def __init__(self, app, shedder: LoadShedder):
+        self.app = app
+        self.shedder = shedder
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        path = scope['path']
+        if not self.shedder.admits(path):
+            response = JSONResponse(
+                {"detail": "Server busy, retry shortly"},
+                status_code=503,
+                headers={"Retry-After": str(self.shedder.retry_after)}
+            )
+            await response(scope, receive, send)
+            return
+
+        if UNTRACKED.match(path):
+            await self.app(scope, receive, send)
+            return
+        self.shedder.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.shedder.in_flight -= 1
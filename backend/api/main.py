@@ -1,24 +1,35 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File, Request, Body
+from fastapi import FastAPI, HTTPException, UploadFile, File, Request, Body, Query, Header, Path as PathParam
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, EmailStr
-from passlib.context import CryptContext
+from fastapi.encoders import jsonable_encoder
+from fastapi.exception_handlers import http_exception_handler
+from pydantic import BaseModel, EmailStr, Field
 from datetime import datetime, date
-from database.db_manager import DatabaseManager
+from database.db_manager import USER_COLUMNS, DatabaseManager, PoolTimeout
+from database.catalogue_snapshot import CatalogueSnapshot
+from utils.metrics import PrometheusMiddleware, mark_worker_exit, render_latest
 from .models import Movie, Showtime, Cinema
+from .calendar import MEDIA_TYPE as CALENDAR_MEDIA_TYPE, CalendarCache, not_modified, render_calendar
+from .email_filter import EmailPrefilter
+from .events import MEDIA_TYPE as EVENTS_MEDIA_TYPE, ChangeBroker, compact_changes
+from .pagination import history_cursor, parse_history_cursor
+from .images import ImageProxy, response_headers
+from .load_shedding import LoadShedder, LoadSheddingMiddleware
+from .rate_limit import build_rate_limiter
+from .snapshot_only import SnapshotOnlyMiddleware
+from .stats import StatsCache
+from .user_export import EXPORT_FORMATS, ExportLimiter, csv_chunks, ndjson_chunks, token_matches
+from .watch_buffer import WatchEventBuffer
 from typing import List, Optional
-import jwt
 from datetime import datetime, timedelta
-from email.mime.text import MIMEText
-import smtplib
+from functools import lru_cache
 from pathlib import Path
+import asyncio
 import os
-from jwt.exceptions import PyJWTError
 from dotenv import load_dotenv
-import sqlite3
-from psycopg2.extras import RealDictCursor
 import logging
-from fastapi.responses import JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 import json
+from psycopg2.errors import ForeignKeyViolation, QueryCanceled
 
 load_dotenv()
 
@@ -44,11 +55,69 @@ app = FastAPI(
     redoc_url="/api/redoc"  # Customize redoc URL
 )
 
-db = DatabaseManager()
+# Shared, memory-mapped catalogue published by the scraper. When configured,
+# every worker serves catalogue reads from the same file instead of Postgres.
+CATALOGUE_SNAPSHOT_PATH = os.getenv("CATALOGUE_SNAPSHOT_PATH")
+catalogue_snapshot = CatalogueSnapshot(CATALOGUE_SNAPSHOT_PATH) if CATALOGUE_SNAPSHOT_PATH else None
 
+# Read-only edge instances serve the catalogue from the snapshot alone and
+# have no database configured at all
+SNAPSHOT_ONLY = os.getenv("SNAPSHOT_ONLY", "false").lower() == "true"
+if SNAPSHOT_ONLY and catalogue_snapshot is None:
+    raise RuntimeError("SNAPSHOT_ONLY=true requires CATALOGUE_SNAPSHOT_PATH")
 
-# Password hashing configuration
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+db = None if SNAPSHOT_ONLY else DatabaseManager()
+
+def snapshot_available() -> bool:
+    return catalogue_snapshot is not None and catalogue_snapshot.available
+
+# Table cardinalities and scrape freshness for the debug/monitoring endpoints
+stats_cache = StatsCache(db, interval=float(os.getenv("STATS_REFRESH_SECONDS", "60")))
+rate_limiter = build_rate_limiter()
+email_prefilter = EmailPrefilter(
+    db,
+    sync_interval=float(os.getenv("EMAIL_FILTER_SYNC_SECONDS", "30")),
+    recheck_interval=float(os.getenv("EMAIL_FILTER_RECHECK_SECONDS", "1"))
+)
+calendar_cache = CalendarCache(db, max_entries=int(os.getenv("CALENDAR_CACHE_ENTRIES", "512")))
+watch_buffer = WatchEventBuffer(
+    db,
+    max_batch=int(os.getenv("WATCH_BUFFER_BATCH", "500")),
+    flush_interval=float(os.getenv("WATCH_BUFFER_FLUSH_SECONDS", "1")),
+    max_pending=int(os.getenv("WATCH_BUFFER_MAX_PENDING", "20000"))
+)
+# Catalogue changes pushed to Server-Sent Events clients
+change_broker = ChangeBroker(
+    db,
+    queue_size=int(os.getenv("CHANGE_QUEUE_SIZE", "256")),
+    heartbeat=float(os.getenv("CHANGE_HEARTBEAT_SECONDS", "15"))
+)
+# Turns requests away with 503 once in-flight work or event loop lag
+# crosses these limits, heavy endpoints first
+load_shedder = LoadShedder(
+    max_in_flight=int(os.getenv("SHED_MAX_IN_FLIGHT", "256")),
+    max_lag=float(os.getenv("SHED_MAX_LOOP_LAG_SECONDS", "0.5")),
+    retry_after=int(os.getenv("SHED_RETRY_AFTER_SECONDS", "2"))
+)
+image_proxy = ImageProxy(
+    db,
+    cache_dir=os.getenv("IMAGE_CACHE_DIR", "cache/images"),
+    max_bytes=int(os.getenv("IMAGE_CACHE_MAX_MB", "512")) * 1024 * 1024,
+    workers=int(os.getenv("IMAGE_WORKERS", "2"))
+)
+
+
+# Password hashing configuration. passlib/bcrypt, jwt and smtplib are only
+# imported by the handlers that need them to keep worker cold starts short.
+@lru_cache(maxsize=None)
+def get_pwd_context():
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+if SNAPSHOT_ONLY:
+    app.add_middleware(SnapshotOnlyMiddleware, snapshot=catalogue_snapshot)
+
+app.add_middleware(LoadSheddingMiddleware, shedder=load_shedder)
 
 # CORS configuration for Railway deployment
 app.add_middleware(
@@ -63,8 +132,35 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE"],  # Explicitly list allowed methods
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
+# Per-route latency and in-flight metrics, exposed at /metrics
+app.add_middleware(PrometheusMiddleware)
+
+# A query that waited too long for a connection or hit its statement_timeout
+# means the database is overloaded: tell clients to back off rather than
+# reporting a server error
+def database_busy_response() -> JSONResponse:
+    return JSONResponse(
+        {"detail": "Database busy, retry shortly"},
+        status_code=503,
+        headers={"Retry-After": str(load_shedder.retry_after)}
+    )
+
+@app.exception_handler(PoolTimeout)
+@app.exception_handler(QueryCanceled)
+async def database_busy_handler(request: Request, exc: Exception):
+    logger.warning(f"Database busy on {request.url.path}: {str(exc)}")
+    return database_busy_response()
+
+@app.exception_handler(HTTPException)
+async def busy_aware_http_exception_handler(request: Request, exc: HTTPException):
+    # Most handlers wrap database errors in a 500
+    if exc.status_code == 500 and isinstance(exc.__context__, (PoolTimeout, QueryCanceled)):
+        return await database_busy_handler(request, exc.__context__)
+    return await http_exception_handler(request, exc)
+
 # Upload directory configuration
 UPLOAD_DIR = Path("uploads/profile_pictures")
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
@@ -99,14 +195,27 @@ class UserResponse(BaseModel):
     data_nascita: str
     telefono: str
 
+# Queued watches are only written later, so anything the database would
+# refuse has to be rejected up front: ids must fit Postgres' integer and
+# text columns cannot hold NUL bytes
+MAX_USER_ID = 2**31 - 1
+
+class WatchCreate(BaseModel):
+    movie_id: str = Field(pattern=r'^[^\x00]+$')
+    cinema_id: str = Field(pattern=r'^[^\x00]+$')
+    watch_date: Optional[datetime] = None
+
+class WatchEvent(WatchCreate):
+    user_id: int = Field(ge=1, le=MAX_USER_ID)
+
 class PasswordResetRequest(BaseModel):
     email: str
 
 @app.post("/api/check_email")
-async def check_email(email: str = Body(..., embed=True)):
+async def check_email(request: Request, email: str = Body(..., embed=True)):
+    await rate_limiter.hit("check_email", request)
     try:
-        user = await db.get_user_by_email(email)
-        return {"exists": user is not None}
+        return {"exists": await email_prefilter.email_exists(email)}
     except Exception as e:
         logger.error(f"Error checking email: {str(e)}")
         raise HTTPException(
@@ -123,85 +232,177 @@ async def health_check():
         "environment": "production" if os.getenv("RAILWAY_ENVIRONMENT") else "development"
     }
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint"""
+    payload, content_type = render_latest()
+    return Response(content=payload, media_type=content_type)
+
 @app.get("/api/movies")
 async def get_movies():
     try:
-        movies = await db.get_all_movies()
-        # Add showtimes to each movie
-        for movie in movies:
-            showtimes = await db.get_movie_showtimes(movie["id"])
-            movie["showtimes"] = [{
-                "date": showtime["date"],
-                "time": showtime["time"],
-                "cinema": showtime["cinema_name"],
-                "booking_link": showtime["booking_link"]
-            } for showtime in showtimes]
-        
-        return movies
+        if snapshot_available():
+            return Response(content=catalogue_snapshot.movies(), media_type="application/json")
+        movies = await db.get_catalogue_movies()
+        return Response(content=movies, media_type="application/json")
     except Exception as e:
-        print(f"Error in get_movies: {str(e)}")
+        logger.error(f"Error in get_movies: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 @app.get("/api/movies/{movie_id}")
 async def get_movie(movie_id: str):
-    movie = await db.get_movie_by_id(movie_id)
+    if snapshot_available():
+        movie = catalogue_snapshot.movie(movie_id)
+    else:
+        movie = await db.get_catalogue_movie(movie_id)
     
     if not movie:
         raise HTTPException(status_code=404, detail="Movie not found")
     
-    # Get actual showtimes from database
-    showtimes = await db.get_movie_showtimes(movie_id)
-    
-    # Format showtimes to match the expected structure
-    formatted_showtimes = [{
-        "date": showtime["date"].strftime("%Y-%m-%d") if isinstance(showtime["date"], datetime) else showtime["date"],
-        "time": showtime["time"],
-        "cinema": showtime["cinema_name"],
-        "booking_link": showtime["booking_link"]
-    } for showtime in showtimes]
-    
-    movie["showtimes"] = formatted_showtimes
-    return movie
+    return Response(content=movie, media_type="application/json")
+
+@app.get("/api/movies/{movie_id}/also-watched")
+async def get_also_watched(movie_id: str, limit: int = Query(10, ge=1, le=20)):
+    """Playing movies most often watched by the people who watched this one"""
+    try:
+        movies = await db.get_similar_movies(movie_id, limit)
+        return Response(content=movies, media_type="application/json")
+    except Exception as e:
+        logger.error(f"Error in get_also_watched: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+async def calendar_feed(request: Request, kind: str, feed_id: str):
+    """Serve one iCalendar feed, conditionally and from the render cache when possible"""
+    version, refreshed_at = await calendar_cache.version()
+    etag = calendar_cache.etag(version)
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=300"}
+    if not_modified(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    key = (kind, feed_id)
+    body = calendar_cache.get(key, version)
+    if body is not None:
+        return Response(content=body, media_type=CALENDAR_MEDIA_TYPE, headers=headers)
+
+    filters = {"cinema_id": feed_id} if kind == "cinema" else {"movie_id": feed_id}
+    name = await db.get_calendar_name(**filters)
+    if name is None:
+        raise HTTPException(status_code=404, detail=f"{kind.capitalize()} not found")
+
+    chunks = render_calendar(f"{name} · Stacco", db.iter_calendar_showtimes(**filters), refreshed_at or datetime.utcnow())
+    return StreamingResponse(calendar_cache.tee(key, version, chunks), media_type=CALENDAR_MEDIA_TYPE, headers=headers)
+
+@app.get("/api/cinemas/{cinema_id}/calendar.ics")
+async def get_cinema_calendar(request: Request, cinema_id: str):
+    return await calendar_feed(request, "cinema", cinema_id)
+
+@app.get("/api/movies/{movie_id}/calendar.ics")
+async def get_movie_calendar(request: Request, movie_id: str):
+    return await calendar_feed(request, "movie", movie_id)
+
+MAX_EVENT_FILTERS = 100
+
+@app.get("/api/events")
+async def catalogue_events(request: Request, cinema: List[str] = Query([]), movie: List[str] = Query([])):
+    """Server-Sent Events stream of catalogue changes.
+
+    Without filters every change is sent; `cinema` and `movie` (repeatable)
+    restrict the stream to changes of those cinemas and movies. A `resync`
+    event means changes were missed and the client should re-fetch.
+    """
+    if len(cinema) + len(movie) > MAX_EVENT_FILTERS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_EVENT_FILTERS} cinema/movie filters")
+
+    subscription = change_broker.subscribe(cinema, movie)
+    return StreamingResponse(
+        change_broker.stream(subscription, request.is_disconnected),
+        media_type=EVENTS_MEDIA_TYPE,
+        # Keep proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/api/catalogue/changes")
+async def get_catalogue_changes(since: Optional[int] = Query(None, ge=0), limit: int = Query(1000, ge=1, le=5000)):
+    """Catalogue changes since a previous sync, compacted to one per showtime, movie or cinema.
+
+    Without `since` (first sync) or once the log no longer reaches back to
+    it, the answer has `resync: true` and no changes: the client downloads
+    the full catalogue and continues from `next`, the newest change that
+    catalogue already reflects. With `has_more`, `next` is where the
+    following page starts.
+    """
+    try:
+        log = await db.get_catalogue_changes(since or 0, limit)
+    except Exception as e:
+        logger.error(f"Error in get_catalogue_changes: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+    # A cursor ahead of the log comes from another database (or a reset one)
+    if since is None or since < log["pruned_through"] or since > log["last_seq"]:
+        # The read model is only rebuilt after a scrape batch, so changes
+        # logged since then are not in the catalogue the client downloads
+        changes_through = log["changes_through"]
+        if snapshot_available():
+            changes_through = min(changes_through, catalogue_snapshot.header.get("changes_through", 0))
+        return {"since": since, "next": changes_through, "resync": True, "has_more": False, "changes": []}
+
+    changes = log["changes"]
+    has_more = len(changes) == limit and changes[-1]["seq"] < log["last_seq"]
+    return {
+        "since": since,
+        "next": changes[-1]["seq"] if has_more else log["last_seq"],
+        "resync": False,
+        "has_more": has_more,
+        "changes": compact_changes(changes)
+    }
 
 @app.get("/api/cinemas")
 async def get_cinemas():
     try:
-        cinemas = await db.get_all_cinemas()
-        
-        # Add current movies to each cinema
-        for cinema in cinemas:
-            movies = await db.get_cinema_movies(cinema["id"])
-            cinema["currentMovies"] = movies
-        
-        return cinemas
+        if snapshot_available():
+            return Response(content=catalogue_snapshot.cinemas(), media_type="application/json")
+        cinemas = await db.get_catalogue_cinemas()
+        return Response(content=cinemas, media_type="application/json")
     except Exception as e:
-        print(f"Error in get_cinemas: {str(e)}")
+        logger.error(f"Error in get_cinemas: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 @app.get("/api/cinemas/{cinema_id}")
 async def get_cinema(cinema_id: str):
     try:
-        # Get the cinema details
-        cinema = await db.get_cinema(cinema_id)
+        if snapshot_available():
+            cinema = catalogue_snapshot.cinema(cinema_id)
+        else:
+            cinema = await db.get_catalogue_cinema(cinema_id)
         if not cinema:
             raise HTTPException(status_code=404, detail="Cinema not found")
 
-        # Get current movies for this cinema
-        movies = await db.get_cinema_movies(cinema_id)
-        
-        # Ensure showtimes is never null
-        for movie in movies:
-            if movie['showtimes'] is None:
-                movie['showtimes'] = []
-        
-        # Add the movies to the cinema object
-        cinema['currentMovies'] = movies
-
-        return cinema
+        return Response(content=cinema, media_type="application/json")
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in get_cinema: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
     
+@app.get("/api/images/{image_id}")
+async def get_image(image_id: str, request: Request, w: Optional[int] = None, format: Optional[str] = None):
+    """Resized poster or icon; ids come from the URLs in catalogue documents"""
+    if not ImageProxy.valid_id(image_id):
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    fmt = ImageProxy.pick_format(format, request.headers.get("accept", ""))
+    width = ImageProxy.pick_width(w)
+    try:
+        path = await image_proxy.variant(image_id, width, fmt)
+    except Exception as e:
+        logger.error(f"Error serving image {image_id}: {str(e)}")
+        raise HTTPException(status_code=502, detail="Image unavailable")
+    if path is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    media_type, headers = response_headers(fmt)
+    return FileResponse(path, media_type=media_type, headers=headers)
+
 @app.post("/api/users/register")
 async def register_user(user_data: UserRegister):
     try:
@@ -211,7 +412,7 @@ async def register_user(user_data: UserRegister):
             raise HTTPException(status_code=400, detail="Email already registered")
         
         # Hash the password
-        hashed_password = pwd_context.hash(user_data.password)
+        hashed_password = get_pwd_context().hash(user_data.password)
         
         # Create user with hashed password
         user_dict = user_data.dict()
@@ -222,6 +423,7 @@ async def register_user(user_data: UserRegister):
         
         if not created_user:
             raise HTTPException(status_code=500, detail="Failed to create user")
+        email_prefilter.add(created_user["email"])
             
         # Format the date in the response
         if isinstance(created_user["data_nascita"], date):
@@ -249,7 +451,8 @@ async def register_user(user_data: UserRegister):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/users/login")
-async def login(user_data: UserLogin):
+async def login(user_data: UserLogin, request: Request):
+    await rate_limiter.hit("login", request, account=user_data.email)
     try:
         email = user_data.email
         password = user_data.password  # Make sure we're getting the password
@@ -262,8 +465,8 @@ async def login(user_data: UserLogin):
                 detail="Invalid email or password"
             )
 
-        # Verify the password using the same pwd_context we used for hashing
-        if not pwd_context.verify(password, user.get('password', '')):
+        # Verify the password using the same context we used for hashing
+        if not get_pwd_context().verify(password, user.get('password', '')):
             raise HTTPException(
                 status_code=401,
                 detail="Invalid email or password"
@@ -287,32 +490,20 @@ async def login(user_data: UserLogin):
         )
 
 @app.get("/api/users", response_model=List[UserResponse])
-async def get_users():
+async def get_users(after: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=1000)):
+    """One page of users in id order; pass X-Next-Cursor back as `after` for the next page"""
     try:
-        logger.info("Fetching all users")
-        users = await db.get_all_users()
-        
-        # Format the response
-        formatted_users = []
+        # One extra row tells whether another page exists
+        users = await db.get_users_page(after, limit + 1)
+        has_more = len(users) > limit
+        users = users[:limit]
+
         for user in users:
-            # Convert date to string format
-            data_nascita = user["data_nascita"]
-            if isinstance(data_nascita, date):
-                data_nascita = data_nascita.isoformat()
-            
-            formatted_user = {
-                "id": user["id"],
-                "email": user["email"],
-                "nome": user["nome"],
-                "cognome": user["cognome"],
-                "citta": user["citta"],
-                "cap": user["cap"],
-                "data_nascita": data_nascita,
-                "telefono": user["telefono"]
-            }
-            formatted_users.append(formatted_user)
-        
-        return JSONResponse(content=formatted_users)
+            if isinstance(user["data_nascita"], date):
+                user["data_nascita"] = user["data_nascita"].isoformat()
+
+        headers = {"X-Next-Cursor": str(users[-1]["id"])} if has_more else {}
+        return JSONResponse(content=users, headers=headers)
         
     except Exception as e:
         logger.error(f"Error getting users: {str(e)}")
@@ -321,8 +512,38 @@ async def get_users():
             detail=f"Error retrieving users: {str(e)}"
         )
 
+# Admin credential for the user export; the endpoint is disabled without one
+EXPORT_TOKEN = os.getenv("EXPORT_TOKEN")
+export_limiter = ExportLimiter(int(os.getenv("EXPORT_CONCURRENCY", "1")))
+
+@app.get("/api/users/export")
+async def export_users(format: str = Query("ndjson"), x_export_token: Optional[str] = Header(None)):
+    """Stream every user as NDJSON or CSV without loading them all in memory.
+
+    Requires the EXPORT_TOKEN admin credential in the X-Export-Token header.
+    """
+    if not token_matches(EXPORT_TOKEN, x_export_token):
+        raise HTTPException(status_code=403, detail="Not allowed to export users")
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format, use one of: {', '.join(EXPORT_FORMATS)}")
+
+    rows = db.iter_users()
+    chunks = export_limiter.stream(csv_chunks(rows, USER_COLUMNS) if format == "csv" else ndjson_chunks(rows))
+    if chunks is None:
+        raise HTTPException(status_code=503, detail="An export is already running, retry later",
+                            headers={"Retry-After": "30"})
+    return StreamingResponse(
+        chunks,
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="users.{format}"'}
+    )
+
 @app.post("/api/users/send-verification")
 async def send_verification_email(email_data: dict):
+    import jwt
+    import smtplib
+    from email.mime.text import MIMEText
+
     try:
         # Generate verification token
         token = jwt.encode(
@@ -364,6 +585,8 @@ async def send_verification_email(email_data: dict):
 
 @app.get("/api/users/verify/{token}")
 async def verify_email(token: str):
+    import jwt
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
         email = payload['email']
@@ -385,7 +608,13 @@ async def verify_email(token: str):
 
 # Password Reset Request
 @app.post("/api/users/password-reset/request")
-async def request_password_reset(email_data: PasswordResetRequest):
+async def request_password_reset(email_data: PasswordResetRequest, request: Request):
+    await rate_limiter.hit("password_reset", request, account=email_data.email)
+
+    import jwt
+    import smtplib
+    from email.mime.text import MIMEText
+
     try:
         email = email_data.email
         logger.info(f"Processing password reset request for email: {email}")
@@ -465,6 +694,8 @@ async def request_password_reset(email_data: PasswordResetRequest):
 # Reset Password with Token
 @app.post("/api/users/reset-password/{token}")
 async def reset_password(token: str, password_data: dict):
+    import jwt
+
     try:
         logger.info(f"Attempting to verify token: {token[:20]}...")  # Log first 20 chars
         
@@ -507,7 +738,7 @@ async def reset_password(token: str, password_data: dict):
             raise HTTPException(status_code=400, detail="Password is required")
 
         # Hash the new password
-        hashed_password = pwd_context.hash(new_password)
+        hashed_password = get_pwd_context().hash(new_password)
 
         # Update the password in the database
         success = await db.update_user_password(int(user_id), hashed_password)
@@ -563,19 +794,82 @@ async def update_user(user_id: int, user_data: dict):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/users/{user_id}/movie-history")
-async def get_user_movie_history(user_id: int):
+async def get_user_movie_history(user_id: int, before: Optional[str] = None,
+                                 limit: int = Query(50, ge=1, le=200)):
+    """Newest watches first; pass X-Next-Cursor back as `before` for older ones"""
     try:
-        history = await db.get_user_movie_history(user_id)
-        
+        cursor = parse_history_cursor(before) if before else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        history = await db.get_user_movie_history(user_id, cursor, limit + 1)
+        has_more = len(history) > limit
+        history = history[:limit]
+        headers = {"X-Next-Cursor": history_cursor(history[-1]["watch_date"], history[-1]["watch_id"])} if has_more else {}
+
         # Format dates in the movie history
         for entry in history:
             if isinstance(entry.get("watch_date"), (date, datetime)):
                 entry["watch_date"] = entry["watch_date"].isoformat()
                 
-        return JSONResponse(content=history)
+        return JSONResponse(content=history, headers=headers)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/users/{user_id}/movie-history", status_code=201)
+async def add_movie_watch(user_id: int, watch: WatchCreate):
+    try:
+        recorded = await db.record_watch(user_id, watch.movie_id, watch.cinema_id, watch.watch_date)
+        return JSONResponse(status_code=201, content=jsonable_encoder(recorded))
+    except ForeignKeyViolation:
+        raise HTTPException(status_code=404, detail="Unknown user, movie or cinema")
+    except Exception as e:
+        logger.error(f"Error recording watch: {str(e)}")
+        raise HTTPException(status_code=500, detail="Error recording watch")
+
+MAX_BULK_WATCHES = 1000
+
+def _queue_watches(events: List[dict]):
+    if not watch_buffer.offer(events):
+        raise HTTPException(
+            status_code=503,
+            detail="Too many watch events pending, retry shortly",
+            headers={"Retry-After": str(max(1, round(watch_buffer.flush_interval)))}
+        )
+    return JSONResponse(status_code=202, content={"accepted": len(events)})
+
+@app.post("/api/users/{user_id}/watches", status_code=202)
+async def queue_watch(watch: WatchCreate, user_id: int = PathParam(ge=1, le=MAX_USER_ID)):
+    """Record a watch asynchronously; it shows up in the history within a second or so"""
+    return _queue_watches([{"user_id": user_id, **watch.dict()}])
+
+@app.post("/api/watches/bulk", status_code=202)
+async def queue_watches(watches: List[WatchEvent]):
+    if len(watches) > MAX_BULK_WATCHES:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BULK_WATCHES} watches per request")
+    return _queue_watches([watch.dict() for watch in watches])
+
+@app.get("/api/users/{user_id}/recommendations")
+async def get_user_recommendations(user_id: int, limit: int = Query(10, ge=1, le=20)):
+    """Playing movies similar to what the user watched, precomputed offline"""
+    try:
+        movies = await db.get_user_recommendations(user_id, limit)
+        return Response(content=movies, media_type="application/json")
+    except Exception as e:
+        logger.error(f"Error getting recommendations: {str(e)}")
+        raise HTTPException(status_code=500, detail="Error retrieving recommendations")
+
+@app.get("/api/users/{user_id}/watch-stats")
+async def get_user_watch_stats(user_id: int):
+    """Account page summary, read from the per-user aggregates"""
+    try:
+        stats = await db.get_user_watch_stats(user_id)
+        return JSONResponse(content=jsonable_encoder(stats))
+    except Exception as e:
+        logger.error(f"Error getting watch stats: {str(e)}")
+        raise HTTPException(status_code=500, detail="Error retrieving watch stats")
+
 # Profile Picture Upload
 @app.post("/api/users/{user_id}/profile-picture")
 async def upload_profile_picture(user_id: int, profile_picture: UploadFile = File(...)):
@@ -601,6 +895,10 @@ async def upload_profile_picture(user_id: int, profile_picture: UploadFile = Fil
 # Resend Verification Email
 @app.post("/api/users/{user_id}/resend-verification")
 async def resend_verification_email(user_id: int):
+    import jwt
+    import smtplib
+    from email.mime.text import MIMEText
+
     try:
         # Get user email
         user = await db.get_user_by_id(user_id)
@@ -646,8 +944,8 @@ async def resend_verification_email(user_id: int):
 @app.delete("/api/users/{user_id}")
 async def delete_user(user_id: int):
     try:
-        # Get user to check if exists
-        user = await db.get_user_by_id(user_id)
+        # Get user to check if exists (from the primary: it is about to be deleted)
+        user = await db.get_user_by_id(user_id, fresh=True)
         print(f"Attempting to delete user {user_id}")  # Debug log
         
         if not user:
@@ -666,6 +964,7 @@ async def delete_user(user_id: int):
         # Delete user from database
         try:
             await db.delete_user(user_id)
+            email_prefilter.remove(user["email"], user_id)
             print(f"User {user_id} deleted successfully")  # Debug log
             return {"message": "User account deleted successfully"}
         except Exception as e:
@@ -686,37 +985,31 @@ async def delete_user(user_id: int):
 
 @app.get("/api/debug/db-status")
 async def check_db_status():
-    try:
-        with db._get_connection() as conn:
-            with conn.cursor() as cur:
-                # Check movies table
-                cur.execute("SELECT COUNT(*) as count FROM movies")
-                movie_count = cur.fetchone()[0]
-                
-                # Check cinemas table
-                cur.execute("SELECT COUNT(*) as count FROM cinemas")
-                cinema_count = cur.fetchone()[0]
-                
-                # Check showtimes table
-                cur.execute("SELECT COUNT(*) as count FROM showtimes")
-                showtime_count = cur.fetchone()[0]
-                
-                return {
-                    "database_connection": "successful",
-                    "movie_count": movie_count,
-                    "cinema_count": cinema_count,
-                    "showtime_count": showtime_count
-                }
-    except Exception as e:
+    snapshot = await stats_cache.get()
+    if snapshot is None:
         return {
             "status": "error",
-            "message": str(e)
+            "message": stats_cache.last_error
         }
 
+    counts = snapshot["counts"]
+    return {
+        "database_connection": "successful" if stats_cache.last_error is None else "stale",
+        "movie_count": counts.get("movies", 0),
+        "cinema_count": counts.get("cinemas", 0),
+        "showtime_count": counts.get("showtimes", 0),
+        "counts_are_estimates": True,
+        "catalogue_version": snapshot["catalogue_version"],
+        "last_scrapes": jsonable_encoder(snapshot["last_scrapes"]),
+        "stats_refreshed_at": stats_cache.refreshed_at.isoformat()
+    }
+
 @app.get("/api/debug/db-connection")
 async def test_db_connection():
+    from psycopg2.extras import RealDictCursor
+
     try:
-        with db._get_connection() as conn:
+        with db._get_connection(readonly=True, fresh=True) as conn:
             with conn.cursor(cursor_factory=RealDictCursor) as cur:
                 cur.execute("SELECT version();")
                 version = cur.fetchone()
@@ -732,50 +1025,29 @@ async def test_db_connection():
 
 @app.get("/api/debug/data")
 async def get_debug_data():
-    try:
-        with db._get_connection() as conn:
-            with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                # Get cinemas count
-                cur.execute("SELECT COUNT(*) as cinema_count FROM cinemas")
-                cinema_count = cur.fetchone()['cinema_count']
-                
-                # Get movies count
-                cur.execute("SELECT COUNT(*) as movie_count FROM movies")
-                movie_count = cur.fetchone()['movie_count']
-                
-                # Get showtimes count
-                cur.execute("SELECT COUNT(*) as showtime_count FROM showtimes")
-                showtime_count = cur.fetchone()['showtime_count']
-                
-                # Get sample data
-                cur.execute("SELECT * FROM cinemas LIMIT 2")
-                sample_cinemas = cur.fetchall()
-                
-                cur.execute("SELECT * FROM movies LIMIT 2")
-                sample_movies = cur.fetchall()
-                
-                cur.execute("SELECT * FROM showtimes LIMIT 2")
-                sample_showtimes = cur.fetchall()
-                
-                return {
-                    "counts": {
-                        "cinemas": cinema_count,
-                        "movies": movie_count,
-                        "showtimes": showtime_count
-                    },
-                    "samples": {
-                        "cinemas": sample_cinemas,
-                        "movies": sample_movies,
-                        "showtimes": sample_showtimes
-                    }
-                }
-    except Exception as e:
-        return {"error": str(e)}
+    snapshot = await stats_cache.get()
+    if snapshot is None:
+        return {"error": stats_cache.last_error}
+
+    counts = snapshot["counts"]
+    return jsonable_encoder({
+        "counts": {
+            "cinemas": counts.get("cinemas", 0),
+            "movies": counts.get("movies", 0),
+            "showtimes": counts.get("showtimes", 0)
+        },
+        "samples": snapshot["samples"],
+        "catalogue_version": snapshot["catalogue_version"],
+        "catalogue_refreshed_at": snapshot["catalogue_refreshed_at"],
+        "stats_refreshed_at": stats_cache.refreshed_at
+    })
 
 @app.get("/api/debug/users")
 async def debug_users():
+    from psycopg2.extras import RealDictCursor
+
     try:
-        with db._get_connection() as conn:
+        with db._get_connection(readonly=True, fresh=True) as conn:
             with conn.cursor(cursor_factory=RealDictCursor) as cur:
                 # Check table existence
                 cur.execute("""
@@ -815,43 +1087,82 @@ async def debug_users():
     except Exception as e:
         return {"error": str(e)}
 
-@app.on_event("startup")
-async def startup_event():
-    """Initialize application state on startup"""
+async def initialize_database():
+    """Apply the schema and build the read model once the app is serving"""
     try:
-        # Test database connection
-        await db.test_connection()
-        
-        # Log important configuration
-        port = int(os.getenv("PORT", 8000))
-        logger.info(f"Starting application on port {port}")
-        logger.info(f"Database host: {os.getenv('PGHOST') or 'using DATABASE_URL'}")
-        
-        # Store CORS origins in app state
-        app.state.cors_origins = [
-            "http://localhost:3000",
-            "https://stacco.vercel.app",
-            "https://stacco-production.up.railway.app",
-            os.getenv("NEXT_PUBLIC_FRONTEND_URL", "")
-        ]
-        
-        # Initialize database tables
-        try:
-            await db._ensure_db_exists()
-        except Exception as e:
-            logger.error(f"Database initialization error: {e}")
-            # Don't raise here, allow the application to start even if tables exist
-            
+        await db._ensure_db_exists()
     except Exception as e:
-        logger.error(f"Startup error: {e}")
-        raise
+        logger.error(f"Database initialization error: {e}")
+        # Don't raise here, allow the application to start even if tables exist
+
+    # Build the catalogue read model on a fresh database
+    try:
+        await db.ensure_catalogue()
+    except Exception as e:
+        logger.error(f"Catalogue initialization error: {e}")
+
+    stats_cache.start()
+    email_prefilter.start()
+
+@app.on_event("startup")
+async def startup_event():
+    """Initialize application state on startup.
+
+    Nothing here waits on Postgres: the connection pool opens on first use
+    and schema/read-model initialization runs as a background task, so the
+    worker starts accepting requests immediately.
+    """
+    # Log important configuration
+    port = int(os.getenv("PORT", 8000))
+    logger.info(f"Starting application on port {port}")
+    logger.info(f"Database host: {os.getenv('PGHOST') or 'using DATABASE_URL'}")
+    
+    # Store CORS origins in app state
+    app.state.cors_origins = [
+        "http://localhost:3000",
+        "https://stacco.vercel.app",
+        "https://stacco-production.up.railway.app",
+        os.getenv("NEXT_PUBLIC_FRONTEND_URL", "")
+    ]
+
+    load_shedder.start()
+
+    if SNAPSHOT_ONLY:
+        # Map the snapshot now rather than on the first request
+        if catalogue_snapshot.available:
+            logger.info(f"Serving catalogue snapshot v{catalogue_snapshot.header['catalogue_version']} only")
+        else:
+            logger.error(f"No catalogue snapshot at {CATALOGUE_SNAPSHOT_PATH} yet")
+        return
+
+    watch_buffer.start()
+    change_broker.start()
+
+    # Set SKIP_DB_INIT=true on scale-ups against an already migrated database
+    if os.getenv("SKIP_DB_INIT", "false").lower() == "true":
+        stats_cache.start()
+        email_prefilter.start()
+    else:
+        app.state.db_init_task = asyncio.create_task(initialize_database())
 
 # Proper shutdown event
 @app.on_event("shutdown")
 async def shutdown_event():
     """Cleanup on application shutdown"""
     try:
-        await db.close_connections()
+        await load_shedder.stop()
+        await stats_cache.stop()
+        await email_prefilter.stop()
+        # Write out buffered watch events before the pool goes away
+        await watch_buffer.stop()
+        await change_broker.stop()
+        if db is not None:
+            await db.close_connections()
+        await rate_limiter.close()
+        await image_proxy.close()
+        if catalogue_snapshot is not None:
+            catalogue_snapshot.close()
+        mark_worker_exit()
     except Exception as e:
         print(f"Shutdown error: {e}")
 
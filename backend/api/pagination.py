@@ -0,0 +1,28 @@
+"""Opaque cursors for keyset-paginated endpoints."""
+import base64
+import json
+from datetime import datetime
+from typing import Tuple
+
+
+def _encode(values) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+
+def _decode(token: str):
+    padded = token + '=' * (-len(token) % 4)
+    return json.loads(base64.urlsafe_b64decode(padded.encode()))
+
+
+def history_cursor(watch_date: datetime, watch_id: int) -> str:
+    """Cursor pointing just past one watch in a newest-first history"""
+    return _encode([watch_date.isoformat(), watch_id])
+
+
+def parse_history_cursor(token: str) -> Tuple[datetime, int]:
+    """Inverse of history_cursor; raises ValueError on anything malformed"""
+    try:
+        watch_date, watch_id = _decode(token)
+        return datetime.fromisoformat(watch_date), int(watch_id)
+    except (TypeError, ValueError, json.JSONDecodeError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {token!r}") from e
@@ -0,0 +1,223 @@
+"""Token-bucket rate limiting for the unauthenticated, expensive endpoints.
+
+Each protected route has one or more rules. A rule limits either the client
+IP or the account (the normalised email in the request body) to `burst`
+requests, refilled evenly over `period` seconds. Handlers call
+`rate_limiter.hit(...)` before any database lookup, bcrypt verification or
+SMTP send, so rejected requests cost nothing but a dictionary lookup.
+
+Buckets live in process memory by default. Set RATE_LIMIT_REDIS_URL (and
+install `redis`) to share them across workers and replicas. Per-route
+limits can be overridden with RATE_LIMITS, a JSON object such as
+{"login": {"ip": "20/60", "account": "5/300"}}.
+"""
+import json
+import logging
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from fastapi import HTTPException, Request
+
+try:
+    from utils.metrics import RATE_LIMITED
+except ImportError:  # imported from the project root (tests, scripts)
+    from backend.utils.metrics import RATE_LIMITED
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimit:
+    """At most `burst` requests, refilled at burst/period tokens per second"""
+
+    def __init__(self, burst: int, period: float):
+        if burst <= 0 or period <= 0:
+            raise ValueError("burst and period must be positive")
+        self.burst = burst
+        self.period = period
+
+    @property
+    def rate(self) -> float:
+        return self.burst / self.period
+
+    @classmethod
+    def parse(cls, spec: str) -> "RateLimit":
+        """Parse '<requests>/<seconds>', e.g. '5/300'"""
+        burst, period = spec.split('/')
+        return cls(int(burst), float(period))
+
+    def __repr__(self):
+        return f"RateLimit({self.burst}/{self.period:g}s)"
+
+
+# route -> scope ('ip' or 'account') -> limit
+DEFAULT_RULES = {
+    'check_email': {'ip': RateLimit(30, 60)},
+    'login': {'ip': RateLimit(20, 60), 'account': RateLimit(5, 300)},
+    'password_reset': {'ip': RateLimit(5, 600), 'account': RateLimit(3, 3600)},
+}
+
+
+class InMemoryBucketStore:
+    """Token buckets held in this process.
+
+    Least recently used buckets are dropped beyond `max_keys`; a dropped
+    bucket simply starts full again, which errs on the side of the client.
+    """
+
+    def __init__(self, max_keys: int = 100_000, clock=time.monotonic):
+        self.max_keys = max_keys
+        self.clock = clock
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    async def consume(self, key: str, limit: RateLimit, cost: float = 1.0) -> Tuple[bool, float]:
+        """Take `cost` tokens; returns (allowed, seconds until enough tokens)"""
+        now = self.clock()
+        tokens, updated = self._buckets.pop(key, (float(limit.burst), now))
+        tokens = min(float(limit.burst), tokens + (now - updated) * limit.rate)
+
+        allowed = tokens >= cost
+        retry_after = 0.0
+        if allowed:
+            tokens -= cost
+        else:
+            retry_after = (cost - tokens) / limit.rate
+
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return allowed, retry_after
+
+    def reset(self):
+        self._buckets.clear()
+
+
+# Refill and take atomically on the Redis server, using its clock so workers
+# on different hosts agree on elapsed time.
+_REDIS_TOKEN_BUCKET = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    retry_after = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000))
+return {allowed, tostring(retry_after)}
+"""
+
+
+class RedisBucketStore:
+    """Token buckets shared through Redis by every worker and replica"""
+
+    def __init__(self, url: str, prefix: str = 'stacco:ratelimit:'):
+        try:
+            import redis.asyncio as redis_asyncio
+        except ImportError as e:
+            raise RuntimeError("RATE_LIMIT_REDIS_URL is set but the redis package is not installed") from e
+        self.prefix = prefix
+        self._client = redis_asyncio.from_url(url)
+        self._script = self._client.register_script(_REDIS_TOKEN_BUCKET)
+
+    async def consume(self, key: str, limit: RateLimit, cost: float = 1.0) -> Tuple[bool, float]:
+        allowed, retry_after = await self._script(
+            keys=[self.prefix + key], args=[limit.burst, limit.rate, cost]
+        )
+        return bool(int(allowed)), float(retry_after)
+
+    async def close(self):
+        await self._client.close()
+
+
+class RateLimiter:
+    def __init__(self, store, rules: Dict[str, Dict[str, RateLimit]], enabled: bool = True,
+                 fallback_store: Optional[InMemoryBucketStore] = None):
+        self.store = store
+        self.rules = rules
+        self.enabled = enabled
+        # Used when a shared store is unreachable, so an outage of the
+        # limiter's backend neither takes the API down nor disables limiting.
+        self.fallback_store = fallback_store or InMemoryBucketStore()
+
+    async def _consume(self, key: str, limit: RateLimit) -> Tuple[bool, float]:
+        try:
+            return await self.store.consume(key, limit)
+        except Exception as e:
+            if self.store is self.fallback_store:
+                raise
+            logger.error(f"Rate limit store error, using local buckets: {str(e)}")
+            return await self.fallback_store.consume(key, limit)
+
+    async def check(self, route: str, ip: Optional[str] = None, account: Optional[str] = None):
+        """Raise 429 if any rule of `route` is exhausted for this client"""
+        if not self.enabled:
+            return
+        identities = {
+            'ip': ip,
+            'account': account.strip().lower() if account else None
+        }
+        for scope, limit in self.rules.get(route, {}).items():
+            identity = identities.get(scope)
+            if not identity:
+                continue
+            allowed, retry_after = await self._consume(f"{route}:{scope}:{identity}", limit)
+            if not allowed:
+                RATE_LIMITED.labels(route=route, scope=scope).inc()
+                logger.warning(f"Rate limit exceeded on {route} by {scope}")
+                raise HTTPException(
+                    status_code=429,
+                    detail="Troppe richieste, riprova più tardi",
+                    headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+                )
+
+    async def hit(self, route: str, request: Request, account: Optional[str] = None):
+        client_ip = request.client.host if request.client else None
+        await self.check(route, ip=client_ip, account=account)
+
+    async def close(self):
+        if hasattr(self.store, 'close'):
+            await self.store.close()
+
+
+def load_rules(overrides: Optional[str] = None) -> Dict[str, Dict[str, RateLimit]]:
+    """DEFAULT_RULES with the RATE_LIMITS JSON overrides applied"""
+    rules = {route: dict(scopes) for route, scopes in DEFAULT_RULES.items()}
+    if overrides:
+        for route, scopes in json.loads(overrides).items():
+            for scope, spec in scopes.items():
+                if scope not in ('ip', 'account'):
+                    raise ValueError(f"Unknown rate limit scope '{scope}' for {route}")
+                rules.setdefault(route, {})[scope] = RateLimit.parse(spec)
+    return rules
+
+
+def build_rate_limiter() -> RateLimiter:
+    """Rate limiter configured from the environment"""
+    enabled = os.getenv('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+    rules = load_rules(os.getenv('RATE_LIMITS'))
+
+    store = None
+    redis_url = os.getenv('RATE_LIMIT_REDIS_URL')
+    if redis_url:
+        try:
+            store = RedisBucketStore(redis_url)
+            logger.info("Rate limiting with shared Redis buckets")
+        except Exception as e:
+            logger.error(f"Could not set up Redis rate limit store: {str(e)}")
+    if store is None:
+        store = InMemoryBucketStore()
+
+    return RateLimiter(store, rules, enabled=enabled)
@@ -0,0 +1,46 @@
+"""Read-only serving from a catalogue snapshot, with no database at all.
+
+With SNAPSHOT_ONLY=true an API instance answers the catalogue endpoints from
+the memory-mapped snapshot published by the scraper (or exported with
+scripts/export_snapshot.py) and never connects to Postgres. Every other
+route answers 503, so a load balancer can send them to a full instance.
+Until a snapshot is available the catalogue routes and /health answer 503
+as well, keeping the instance out of rotation.
+"""
+import re
+
+from starlette.responses import JSONResponse
+
+# Routes a snapshot-only instance serves
+SNAPSHOT_ROUTES = re.compile(
+    r'^/(health|metrics|api/test|api/docs|api/redoc|openapi\.json'
+    r'|api/movies(/[^/]+)?|api/cinemas(/[^/]+)?)$'
+)
+# Of those, the ones that need the snapshot to be mapped
+SNAPSHOT_REQUIRED = re.compile(r'^/(health|api/movies(/[^/]+)?|api/cinemas(/[^/]+)?)$')
+
+
+class SnapshotOnlyMiddleware:
+    def __init__(self, app, snapshot, retry_after: int = 5):
+        self.app = app
+        self.snapshot = snapshot
+        self.retry_after = retry_after
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        path = scope['path']
+        if not SNAPSHOT_ROUTES.match(path):
+            response = JSONResponse({"detail": "Not served by this read-only instance"}, status_code=503)
+        elif SNAPSHOT_REQUIRED.match(path) and not self.snapshot.available:
+            response = JSONResponse(
+                {"detail": "Catalogue snapshot not available yet"},
+                status_code=503,
+                headers={"Retry-After": str(self.retry_after)}
+            )
+        else:
+            await self.app(scope, receive, send)
+            return
+        await response(scope, receive, send)
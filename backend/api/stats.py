@@ -0,0 +1,57 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class StatsCache:
+    """Database statistics refreshed in the background.
+
+    Monitoring endpoints read the last snapshot from memory, so polling them
+    costs no queries at all; only the refresh loop touches the database.
+    """
+
+    def __init__(self, db, interval: float = 60.0):
+        self.db = db
+        self.interval = interval
+        self.snapshot: Optional[Dict] = None
+        self.refreshed_at: Optional[datetime] = None
+        self.last_error: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    async def refresh(self):
+        async with self._lock:
+            try:
+                self.snapshot = await self.db.get_stats_snapshot()
+                self.refreshed_at = datetime.utcnow()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                logger.error(f"Stats refresh failed: {str(e)}")
+
+    async def get(self) -> Optional[Dict]:
+        # Only the very first caller waits for a refresh
+        if self.snapshot is None:
+            await self.refresh()
+        return self.snapshot
+
+    async def _run(self):
+        while True:
+            await self.refresh()
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
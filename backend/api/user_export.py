@@ -0,0 +1,86 @@
+"""Streaming encoders for the user export endpoint.
+
+Rows come one at a time from a server-side cursor and leave as text chunks
+of `chunk_rows` rows, so memory use is bounded by one chunk whatever the
+size of the user base. Every running export holds a pooled connection and
+an open transaction until its download ends, so ExportLimiter caps how many
+run at once.
+"""
+import csv
+import io
+import json
+import secrets
+import threading
+import weakref
+from datetime import date, datetime
+from typing import Dict, Iterable, Iterator, Optional, Sequence
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+
+def _plain(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def ndjson_chunks(rows: Iterable[Dict], chunk_rows: int = 500) -> Iterator[str]:
+    lines = []
+    for row in rows:
+        lines.append(json.dumps({key: _plain(value) for key, value in row.items()}, ensure_ascii=False))
+        if len(lines) >= chunk_rows:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def csv_chunks(rows: Iterable[Dict], columns: Sequence[str], chunk_rows: int = 500) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    pending = 0
+    for row in rows:
+        writer.writerow([_plain(row[column]) for column in columns])
+        pending += 1
+        if pending >= chunk_rows:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    # Always flush: at least the header is pending
+    yield buffer.getvalue()
+
+
+def token_matches(expected: Optional[str], provided: Optional[str]) -> bool:
+    """Constant-time check of an admin token; always False when none is configured"""
+    if not expected or not provided:
+        return False
+    return secrets.compare_digest(provided.encode('utf-8'), expected.encode('utf-8'))
+
+
+class ExportLimiter:
+    def __init__(self, limit: int = 1):
+        self._slots = threading.BoundedSemaphore(limit)
+
+    def stream(self, chunks: Iterator[str]) -> Optional[Iterator[str]]:
+        """`chunks` holding an export slot until it is exhausted, closed or
+        dropped; None when every slot is taken"""
+        if not self._slots.acquire(blocking=False):
+            return None
+        release = []
+        stream = self._stream(chunks, release)
+        # A finalizer runs once: on the stream's end, or when a stream that
+        # never started (client gone before the first chunk) is collected
+        release.append(weakref.finalize(stream, self._slots.release))
+        return stream
+
+    @staticmethod
+    def _stream(chunks: Iterator[str], release: list) -> Iterator[str]:
+        try:
+            yield from chunks
+        finally:
+            release[0]()
@@ -0,0 +1,128 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+import psycopg2
+
+try:
+    from utils.metrics import WATCH_BUFFER_PENDING, WATCH_EVENTS
+except ImportError:  # imported from the project root (tests, scripts)
+    from backend.utils.metrics import WATCH_BUFFER_PENDING, WATCH_EVENTS
+
+logger = logging.getLogger(__name__)
+
+# Errors no retry can fix: values the database refuses to store, such as an
+# out-of-range id (DataError) or a NUL byte in a string (ValueError)
+INVALID_EVENT_ERRORS = (psycopg2.DataError, ValueError)
+
+
+class WatchEventBuffer:
+    """Write-behind buffer for watch events.
+
+    Requests only append to an in-memory queue; a background task writes the
+    queue with one multi-row statement per `max_batch` events, as soon as a
+    batch is full or `flush_interval` seconds after the oldest pending event.
+    When `max_pending` events are waiting (the database is slow or down)
+    `offer` refuses new ones so callers can push back on clients. A batch
+    holding invalid events is split until they are isolated and dropped;
+    batches failing for any other reason stay queued and are retried. `stop`
+    writes whatever is left.
+    """
+
+    def __init__(self, db, max_batch: int = 500, flush_interval: float = 1.0,
+                 max_pending: int = 20000, retry_delay: float = 2.0):
+        self.db = db
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.retry_delay = retry_delay
+        self._pending = deque()
+        self._batch_ready = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def offer(self, events: List[Dict]) -> bool:
+        """Queue events for writing; False (nothing queued) when the buffer is full"""
+        if len(self._pending) + len(events) > self.max_pending:
+            WATCH_EVENTS.labels(outcome='rejected').inc(len(events))
+            return False
+        self._pending.extend(events)
+        WATCH_EVENTS.labels(outcome='accepted').inc(len(events))
+        WATCH_BUFFER_PENDING.set(len(self._pending))
+        if len(self._pending) >= self.max_batch:
+            self._batch_ready.set()
+        return True
+
+    async def flush(self) -> int:
+        """Write every pending event; returns how many were stored"""
+        stored = 0
+        async with self._flush_lock:
+            while self._pending:
+                # Parts of the batch still to write, the next one last
+                parts = [[self._pending.popleft() for _ in range(min(self.max_batch, len(self._pending)))]]
+                while parts:
+                    batch = parts.pop()
+                    try:
+                        written = await self.db.record_watches(batch)
+                    except INVALID_EVENT_ERRORS as e:
+                        if len(batch) == 1:
+                            logger.warning(f"Dropping watch event the database refuses: {str(e)}")
+                            WATCH_EVENTS.labels(outcome='invalid').inc()
+                        else:
+                            middle = len(batch) // 2
+                            parts.extend([batch[middle:], batch[:middle]])
+                        continue
+                    except Exception:
+                        # Back at the front, in order, for the next attempt
+                        for part in parts + [batch]:
+                            self._pending.extendleft(reversed(part))
+                        WATCH_BUFFER_PENDING.set(len(self._pending))
+                        raise
+                    stored += written
+                    WATCH_EVENTS.labels(outcome='stored').inc(written)
+                    if written < len(batch):
+                        WATCH_EVENTS.labels(outcome='invalid').inc(len(batch) - written)
+                WATCH_BUFFER_PENDING.set(len(self._pending))
+        return stored
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._batch_ready.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._batch_ready.clear()
+            if not self._pending:
+                continue
+            started = time.perf_counter()
+            try:
+                stored = await self.flush()
+                logger.debug(f"Flushed {stored} watch events in {time.perf_counter() - started:.3f}s")
+            except Exception as e:
+                logger.error(f"Watch event flush failed, {len(self._pending)} pending: {str(e)}")
+                await asyncio.sleep(self.retry_delay)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._pending:
+            try:
+                stored = await self.flush()
+                logger.info(f"Flushed {stored} watch events on shutdown")
+            except Exception as e:
+                logger.error(f"Lost {len(self._pending)} watch events on shutdown: {str(e)}")
@@ -0,0 +1,327 @@
+"""In-process load benchmark for the Stacco API.
+
+Seeds a local Postgres with synthetic data, drives the FastAPI app through an
+ASGI transport (no sockets, no uvicorn) and writes latency percentiles,
+throughput and SQL query counts to a JSON file so runs can be compared across
+commits.
+
+Usage:
+    python backend/benchmarks/api_benchmark.py \\
+        --database-url postgresql://postgres@localhost:5432/stacco_bench \\
+        --cinemas 20 --movies 300 --showtimes-per-movie 40 --users 2000
+
+    python backend/benchmarks/api_benchmark.py --database-url ... \\
+        --compare backend/benchmarks/results/api-<previous run>.json
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List
+
+# Add the backend directory to Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+backend_dir = os.path.dirname(current_dir)
+sys.path.append(backend_dir)
+
+RESULTS_DIR = os.path.join(current_dir, 'results')
+
+
+class _CountingCursor:
+    def __init__(self, cursor, counter):
+        self._cursor = cursor
+        self._counter = counter
+
+    def execute(self, *args, **kwargs):
+        self._counter.queries += 1
+        return self._cursor.execute(*args, **kwargs)
+
+    def executemany(self, query, params_list):
+        params_list = list(params_list)
+        self._counter.queries += len(params_list)
+        return self._cursor.executemany(query, params_list)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __enter__(self):
+        self._cursor.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._cursor.__exit__(*exc)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class _CountingConnection:
+    def __init__(self, conn, counter):
+        self._conn = conn
+        self._counter = counter
+
+    def cursor(self, *args, **kwargs):
+        return _CountingCursor(self._conn.cursor(*args, **kwargs), self._counter)
+
+    def __enter__(self):
+        self._conn.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._conn.__exit__(*exc)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+class QueryCounter:
+    """Counts statements executed through a DatabaseManager instance"""
+
+    def __init__(self):
+        self.queries = 0
+        self.connections = 0
+
+    def install(self, db):
+        get_connection = db._get_connection
+
+        @contextmanager
+        def counting_get_connection(*args, **kwargs):
+            self.connections += 1
+            with get_connection(*args, **kwargs) as conn:
+                yield _CountingConnection(conn, self)
+
+        db._get_connection = counting_get_connection
+
+    def reset(self):
+        self.queries = 0
+        self.connections = 0
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100.0 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(latencies: List[float], wall_time: float, errors: int, counter: QueryCounter) -> Dict:
+    latencies = sorted(latencies)
+    count = len(latencies)
+    return {
+        'requests': count,
+        'errors': errors,
+        'wall_time_s': round(wall_time, 4),
+        'throughput_rps': round(count / wall_time, 2) if wall_time else 0.0,
+        'latency_ms': {
+            'mean': round(sum(latencies) / count * 1000, 3) if count else 0.0,
+            'p50': round(percentile(latencies, 50) * 1000, 3),
+            'p95': round(percentile(latencies, 95) * 1000, 3),
+            'p99': round(percentile(latencies, 99) * 1000, 3),
+            'max': round(latencies[-1] * 1000, 3) if count else 0.0
+        },
+        'queries': counter.queries,
+        'queries_per_request': round(counter.queries / count, 2) if count else 0.0,
+        'connections': counter.connections
+    }
+
+
+def build_scenarios(dataset: Dict, password: str) -> Dict:
+    """Map scenario name to a factory returning (method, path, json body)"""
+    cinema_ids = dataset['cinema_ids']
+    movie_ids = dataset['movie_ids']
+    emails = dataset['user_emails']
+    return {
+        'GET /api/movies': lambda rng: ('GET', '/api/movies', None),
+        'GET /api/cinemas': lambda rng: ('GET', '/api/cinemas', None),
+        'GET /api/cinemas/{id}': lambda rng: ('GET', f'/api/cinemas/{rng.choice(cinema_ids)}', None),
+        'GET /api/movies/{id}': lambda rng: ('GET', f'/api/movies/{rng.choice(movie_ids)}', None),
+        'POST /api/users/login': lambda rng: (
+            'POST', '/api/users/login', {'email': rng.choice(emails), 'password': password}
+        ) if emails else None,
+    }
+
+
+async def run_scenario(client, factory, requests: int, concurrency: int,
+                       counter: QueryCounter, seed: int) -> Dict:
+    rng = random.Random(seed)
+    plan = [factory(rng) for _ in range(requests)]
+    plan = [call for call in plan if call]
+    latencies = []
+    errors = 0
+    queue = asyncio.Queue()
+    for call in plan:
+        queue.put_nowait(call)
+
+    async def worker():
+        nonlocal errors
+        while True:
+            try:
+                method, path, body = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            started = time.perf_counter()
+            response = await client.request(method, path, json=body)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+
+    counter.reset()
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, time.perf_counter() - started, errors, counter)
+
+
+def git_revision() -> Dict:
+    def git(*args):
+        try:
+            return subprocess.check_output(['git', *args], cwd=backend_dir, stderr=subprocess.DEVNULL).decode().strip()
+        except Exception:
+            return None
+
+    return {
+        'commit': git('rev-parse', 'HEAD'),
+        'dirty': bool(git('status', '--porcelain', '--untracked-files=no'))
+    }
+
+
+def compare(current: Dict, baseline_path: str):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+
+    base_commit = (baseline['meta']['git'].get('commit') or '?')[:10]
+    print(f"\nComparison against {baseline_path} ({base_commit})")
+    print(f"{'scenario':<28}{'p50 ms':>18}{'p95 ms':>18}{'rps':>18}")
+    for name, result in current['results'].items():
+        before = baseline['results'].get(name)
+        if not before:
+            continue
+
+        def delta(key_path):
+            old, new = before, result
+            for key in key_path:
+                old, new = old[key], new[key]
+            change = ((new - old) / old * 100) if old else 0.0
+            return f"{new:>9.2f} ({change:+.0f}%)"
+
+        print(f"{name:<28}{delta(['latency_ms', 'p50']):>18}{delta(['latency_ms', 'p95']):>18}{delta(['throughput_rps']):>18}")
+
+
+async def main(args):
+    # The app builds its DatabaseManager at import time, so configure it first
+    os.environ['LOCAL_MODE'] = 'true'
+    os.environ['LOCAL_DATABASE_URL'] = args.database_url
+    # Every request comes from one client address: measure the endpoints,
+    # not the login rate limits and the load shedder rejecting them
+    os.environ['RATE_LIMIT_ENABLED'] = 'false'
+    os.environ['SHED_MAX_IN_FLIGHT'] = '100000'
+    os.environ['SHED_MAX_LOOP_LAG_SECONDS'] = '3600'
+
+    import httpx
+    from api.main import app, db
+    from benchmarks.synthetic_data import BENCH_PASSWORD, seed_database
+
+    await db._ensure_db_exists()
+
+    print("Seeding synthetic dataset...")
+    seed_started = time.perf_counter()
+    dataset = await seed_database(
+        db,
+        cinemas=args.cinemas,
+        movies=args.movies,
+        showtimes_per_movie=args.showtimes_per_movie,
+        users=args.users,
+        seed=args.seed
+    )
+    seed_time = time.perf_counter() - seed_started
+    print(f"Seeded {args.cinemas} cinemas, {args.movies} movies, "
+          f"{dataset['showtime_count']} showtimes, {args.users} users in {seed_time:.1f}s")
+
+    counter = QueryCounter()
+    counter.install(db)
+    scenarios = build_scenarios(dataset, BENCH_PASSWORD)
+    selected = args.scenario or list(scenarios)
+
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+        for name in selected:
+            factory = scenarios[name]
+            requests = args.login_requests if 'login' in name else args.requests
+            await run_scenario(client, factory, args.warmup, 1, counter, args.seed)
+            results[name] = await run_scenario(client, factory, requests, args.concurrency, counter, args.seed)
+            latency = results[name]['latency_ms']
+            print(f"{name:<28} p50={latency['p50']:.2f}ms p95={latency['p95']:.2f}ms "
+                  f"p99={latency['p99']:.2f}ms rps={results[name]['throughput_rps']:.1f} "
+                  f"queries/req={results[name]['queries_per_request']}")
+
+    report = {
+        'meta': {
+            'timestamp': datetime.utcnow().isoformat(),
+            'git': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'params': {
+                'cinemas': args.cinemas,
+                'movies': args.movies,
+                'showtimes_per_movie': args.showtimes_per_movie,
+                'users': args.users,
+                'requests': args.requests,
+                'login_requests': args.login_requests,
+                'concurrency': args.concurrency,
+                'warmup': args.warmup,
+                'seed': args.seed
+            },
+            'seed_time_s': round(seed_time, 3),
+            'showtime_count': dataset['showtime_count']
+        },
+        'results': results
+    }
+
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        commit = (report['meta']['git']['commit'] or 'nogit')[:10]
+        output = os.path.join(RESULTS_DIR, f"api-{datetime.utcnow():%Y%m%dT%H%M%S}-{commit}.json")
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        compare(report, args.compare)
+
+    failed = [name for name, result in results.items() if result['errors']]
+    if failed:
+        raise SystemExit(f"Requests failed in {', '.join(failed)}: latencies are not comparable")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Stacco API load benchmark")
+    parser.add_argument('--database-url', default=os.getenv('BENCH_DATABASE_URL'),
+                        required=not os.getenv('BENCH_DATABASE_URL'),
+                        help="Postgres URL of a disposable benchmark database (it is wiped)")
+    parser.add_argument('--cinemas', type=int, default=10)
+    parser.add_argument('--movies', type=int, default=150)
+    parser.add_argument('--showtimes-per-movie', type=int, default=30)
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--requests', type=int, default=300, help="Requests per catalogue scenario")
+    parser.add_argument('--login-requests', type=int, default=50, help="Requests for the bcrypt-bound login scenario")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--scenario', action='append', help="Only run the named scenario (repeatable)")
+    parser.add_argument('--output', help="Result file path (default: benchmarks/results/api-<time>-<commit>.json)")
+    parser.add_argument('--compare', help="Previous result file to compare against")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
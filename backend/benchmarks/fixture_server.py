@@ -0,0 +1,143 @@
+"""Local HTTP server replaying the recorded cinemadiroma.it HTML corpus.
+
+Pages live in tests/fixtures/cinemadiroma: '/' maps to index.html and any other
+path to '<path>.html' (movie detail pages under schede-film/in-sala/). Latency, jitter and an error rate can be injected so the
+scraper's retry handling and throughput can be measured without the network.
+
+Usage:
+    python backend/benchmarks/fixture_server.py serve --port 8765 --latency 0.05
+    python backend/benchmarks/fixture_server.py record   # refresh the corpus from the live site
+"""
+import argparse
+import asyncio
+import os
+import random
+from collections import Counter
+from typing import Optional
+
+import aiohttp
+from aiohttp import web
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CORPUS_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(current_dir)), 'tests', 'fixtures', 'cinemadiroma'
+)
+
+PROGRAMME_PATHS = [
+    'programmazione-cinema-intrastevere',
+    'programmazione-multisala-lux',
+    'programmazione-multisala-odeon',
+    'programmazione-cinema-tibur',
+]
+
+
+class FixtureServer:
+    def __init__(self, corpus_dir: str = DEFAULT_CORPUS_DIR, latency: float = 0.0,
+                 jitter: float = 0.0, error_rate: float = 0.0, seed: Optional[int] = None):
+        self.corpus_dir = corpus_dir
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.requests = 0
+        self.requests_by_path = Counter()
+        self.errors = 0
+        self.bytes_served = 0
+        self.base_url = None
+        self._pages = {}
+        self._runner = None
+
+    def _load_page(self, path: str) -> Optional[bytes]:
+        name = path.strip('/') or 'index'
+        if name not in self._pages:
+            file_path = os.path.join(self.corpus_dir, f"{name}.html")
+            # Only serve files that really sit inside the corpus directory
+            corpus = os.path.abspath(self.corpus_dir)
+            if os.path.commonpath([os.path.abspath(file_path), corpus]) != corpus:
+                return None
+            if not os.path.exists(file_path):
+                return None
+            with open(file_path, 'rb') as f:
+                self._pages[name] = f.read()
+        return self._pages[name]
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        self.requests_by_path[request.path] += 1
+        delay = self.latency + (self.rng.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            await asyncio.sleep(delay)
+
+        if self.error_rate and self.rng.random() < self.error_rate:
+            self.errors += 1
+            return web.Response(status=503, text="Injected failure")
+
+        body = self._load_page(request.path)
+        if body is None:
+            return web.Response(status=404, text="Not found")
+
+        self.bytes_served += len(body)
+        return web.Response(body=body, content_type='text/html', charset='utf-8')
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        app = web.Application()
+        app.router.add_get('/{path:.*}', self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        bound_port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://{host}:{bound_port}"
+        return self.base_url
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+
+async def record_corpus(base_url: str = "https://www.cinemadiroma.it", corpus_dir: str = DEFAULT_CORPUS_DIR):
+    """Download the main page and programme pages into the fixture corpus"""
+    os.makedirs(corpus_dir, exist_ok=True)
+    async with aiohttp.ClientSession() as session:
+        for path in [''] + PROGRAMME_PATHS:
+            async with session.get(f"{base_url}/{path}") as response:
+                response.raise_for_status()
+                html = await response.read()
+            with open(os.path.join(corpus_dir, f"{path or 'index'}.html"), 'wb') as f:
+                f.write(html)
+            print(f"Recorded /{path} ({len(html)} bytes)")
+
+
+async def serve(args):
+    server = FixtureServer(args.corpus, args.latency, args.jitter, args.error_rate, args.seed)
+    base_url = await server.start(port=args.port)
+    print(f"Serving {args.corpus} at {base_url}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="cinemadiroma.it fixture server")
+    parser.add_argument('command', choices=['serve', 'record'])
+    parser.add_argument('--corpus', default=DEFAULT_CORPUS_DIR)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds added to every response")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Extra random latency, in seconds")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of requests answered with 503")
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        asyncio.run(record_corpus(corpus_dir=args.corpus))
+    else:
+        asyncio.run(serve(args))
@@ -0,0 +1,191 @@
+"""Hermetic throughput benchmark for CinemaDiRomaScraper.
+
+Serves the recorded HTML corpus from a local FixtureServer and times each
+stage of the scrape pipeline (fetch, parse, DB write) per programme page.
+Without --database-url the DB write stage goes to an in-memory sink, so the
+benchmark needs neither network nor Postgres.
+
+Usage:
+    python backend/benchmarks/scraper_benchmark.py --rounds 20 --latency 0.02 --error-rate 0.05
+    python backend/benchmarks/scraper_benchmark.py --database-url postgresql://postgres@localhost:5432/stacco_bench
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from typing import Dict, List
+
+# Add the backend directory and the project root to Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+backend_dir = os.path.dirname(current_dir)
+sys.path.append(backend_dir)
+sys.path.append(os.path.dirname(backend_dir))
+
+from benchmarks.api_benchmark import RESULTS_DIR, git_revision, percentile
+from benchmarks.fixture_server import DEFAULT_CORPUS_DIR, FixtureServer
+
+
+class InMemorySink:
+    """Stands in for DatabaseManager when no benchmark database is given"""
+
+    def __init__(self):
+        self.cinemas = {}
+        self.movies = {}
+        self.showtimes = set()
+
+    async def update_cinemas(self, cinemas: List[Dict]):
+        for cinema in cinemas:
+            self.cinemas[cinema['id']] = dict(cinema)
+
+    async def update_movies_and_showtimes(self, cinema_id: str, movies: List[Dict], prune_missing: bool = False):
+        for movie in movies:
+            self.movies[movie['id']] = {k: v for k, v in movie.items() if k != 'showtimes'}
+            for showtime in movie['showtimes']:
+                self.showtimes.add((movie['id'], cinema_id, showtime['date'], showtime['time']))
+
+
+def stage_stats(durations: List[float]) -> Dict:
+    durations = sorted(durations)
+    total = sum(durations)
+    return {
+        'count': len(durations),
+        'total_s': round(total, 4),
+        'mean_ms': round(total / len(durations) * 1000, 3) if durations else 0.0,
+        'p95_ms': round(percentile(durations, 95) * 1000, 3)
+    }
+
+
+async def run(args) -> Dict:
+    from backend.scrapers.cinema_di_roma_scraper import CinemaDiRomaScraper
+
+    if args.database_url:
+        os.environ['LOCAL_MODE'] = 'true'
+        os.environ['LOCAL_DATABASE_URL'] = args.database_url
+        from backend.database.db_manager import DatabaseManager
+        db = DatabaseManager()
+        await db._ensure_db_exists()
+    else:
+        db = InMemorySink()
+
+    server = FixtureServer(args.corpus, args.latency, args.jitter, args.error_rate, args.seed)
+    base_url = await server.start()
+    scraper = CinemaDiRomaScraper(base_url=base_url, db=db)
+    scraper.retry_delay = args.retry_delay
+    scraper.request_delay = 0
+
+    stages = {'fetch': [], 'parse': [], 'db_write': []}
+    pages = failed = rows = 0
+    bytes_fetched = 0
+    try:
+        await scraper.get_cinemas()
+        if not scraper.cinemas:
+            raise RuntimeError("No cinemas parsed from the fixture corpus")
+
+        started = time.perf_counter()
+        for _ in range(args.rounds):
+            for cinema_id, cinema in scraper.cinemas.items():
+                url = f"{scraper.base_url}/{cinema['url_path']}"
+
+                stage_started = time.perf_counter()
+                try:
+                    html = await scraper._make_request(url)
+                except Exception:
+                    failed += 1
+                    continue
+                stages['fetch'].append(time.perf_counter() - stage_started)
+                bytes_fetched += len(html.encode('utf-8'))
+
+                stage_started = time.perf_counter()
+                movies = scraper.parse_showtimes(html, cinema_id)
+                stages['parse'].append(time.perf_counter() - stage_started)
+
+                stage_started = time.perf_counter()
+                await db.update_movies_and_showtimes(cinema_id, movies)
+                stages['db_write'].append(time.perf_counter() - stage_started)
+
+                pages += 1
+                rows += len(movies) + sum(len(movie['showtimes']) for movie in movies)
+        wall_time = time.perf_counter() - started
+
+        # Parser-only throughput, independent of the HTTP and DB stages
+        corpus = {}
+        for cinema_id, cinema in scraper.cinemas.items():
+            with open(os.path.join(args.corpus, f"{cinema['url_path']}.html"), encoding='utf-8') as f:
+                corpus[cinema_id] = f.read()
+        parse_started = time.perf_counter()
+        for _ in range(args.parse_repeat):
+            for cinema_id, html in corpus.items():
+                scraper.parse_showtimes(html, cinema_id)
+        parse_wall = time.perf_counter() - parse_started
+        parse_pages = args.parse_repeat * len(corpus)
+    finally:
+        await scraper.close()
+        await server.stop()
+
+    return {
+        'meta': {
+            'timestamp': datetime.utcnow().isoformat(),
+            'git': git_revision(),
+            'params': {
+                'rounds': args.rounds,
+                'latency': args.latency,
+                'jitter': args.jitter,
+                'error_rate': args.error_rate,
+                'retry_delay': args.retry_delay,
+                'parse_repeat': args.parse_repeat,
+                'database': 'postgres' if args.database_url else 'memory'
+            }
+        },
+        'results': {
+            'pages': pages,
+            'failed_pages': failed,
+            'server_requests': server.requests,
+            'injected_errors': server.errors,
+            'bytes_fetched': bytes_fetched,
+            'rows_written': rows,
+            'wall_time_s': round(wall_time, 4),
+            'pages_per_second': round(pages / wall_time, 2) if wall_time else 0.0,
+            'parse_only_pages_per_second': round(parse_pages / parse_wall, 2) if parse_wall else 0.0,
+            'stages': {name: stage_stats(durations) for name, durations in stages.items()}
+        }
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scraper fetch/parse/write benchmark")
+    parser.add_argument('--corpus', default=DEFAULT_CORPUS_DIR)
+    parser.add_argument('--rounds', type=int, default=10, help="Passes over every programme page")
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--retry-delay', type=float, default=0.01)
+    parser.add_argument('--parse-repeat', type=int, default=25)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--database-url', help="Write to this Postgres instead of the in-memory sink")
+    parser.add_argument('--output', help="Result file path (default: benchmarks/results/scraper-<time>-<commit>.json)")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    results = report['results']
+    print(f"Pages: {results['pages']} ({results['failed_pages']} failed, "
+          f"{results['injected_errors']} injected errors)")
+    print(f"End-to-end: {results['pages_per_second']} pages/s, parser only: "
+          f"{results['parse_only_pages_per_second']} pages/s")
+    for name, stats in results['stages'].items():
+        print(f"  {name:<9} mean={stats['mean_ms']:.2f}ms p95={stats['p95_ms']:.2f}ms total={stats['total_s']:.3f}s")
+
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        commit = (report['meta']['git']['commit'] or 'nogit')[:10]
+        output = os.path.join(RESULTS_DIR, f"scraper-{datetime.utcnow():%Y%m%dT%H%M%S}-{commit}.json")
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""Cold-start benchmark for the API process.
+
+Reports the import-time profile of api.main (python -X importtime) and the
+wall time from spawning uvicorn until /health first answers, over several
+runs.
+
+Usage:
+    python backend/benchmarks/startup_benchmark.py --runs 5
+    python backend/benchmarks/startup_benchmark.py --top 30 --output startup.json
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from datetime import datetime
+from typing import Dict, List
+
+# Add the backend directory to Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+backend_dir = os.path.dirname(current_dir)
+sys.path.append(backend_dir)
+
+from benchmarks.api_benchmark import RESULTS_DIR, git_revision
+
+
+def import_profile(top: int) -> Dict:
+    """Run `python -X importtime -c 'import api.main'` and rank the modules"""
+    started = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import api.main'],
+        cwd=backend_dir, capture_output=True, text=True
+    )
+    wall_time = time.perf_counter() - started
+    if completed.returncode != 0:
+        raise RuntimeError(f"Importing api.main failed:\n{completed.stderr[-2000:]}")
+
+    modules = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        modules.append({
+            'module': name.strip(),
+            'self_ms': int(self_us) / 1000,
+            'cumulative_ms': int(cumulative_us) / 1000
+        })
+
+    total_ms = next((m['cumulative_ms'] for m in modules if m['module'] == 'api.main'), None)
+    return {
+        'process_wall_time_s': round(wall_time, 4),
+        'api_main_cumulative_ms': total_ms,
+        'top_cumulative': sorted(modules, key=lambda m: m['cumulative_ms'], reverse=True)[:top],
+        'top_self': sorted(modules, key=lambda m: m['self_ms'], reverse=True)[:top]
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def time_to_first_response(timeout: float) -> float:
+    port = _free_port()
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'api.main:app', '--host', '127.0.0.1', '--port', str(port),
+         '--log-level', 'warning'],
+        cwd=backend_dir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with code {process.returncode}")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - started
+            except OSError:
+                time.sleep(0.01)
+        raise TimeoutError(f"/health did not answer within {timeout}s")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API cold-start benchmark")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=20, help="Modules listed in the import profile")
+    parser.add_argument('--timeout', type=float, default=30.0)
+    parser.add_argument('--output', help="Result file path (default: benchmarks/results/startup-<time>-<commit>.json)")
+    args = parser.parse_args()
+
+    profile = import_profile(args.top)
+    print(f"import api.main: {profile['api_main_cumulative_ms']:.1f}ms cumulative")
+    for module in profile['top_cumulative'][:10]:
+        print(f"  {module['cumulative_ms']:>9.1f}ms  {module['module']}")
+
+    startups: List[float] = [time_to_first_response(args.timeout) for _ in range(args.runs)]
+    print(f"Time to first /health response: median={statistics.median(startups) * 1000:.0f}ms "
+          f"min={min(startups) * 1000:.0f}ms max={max(startups) * 1000:.0f}ms")
+
+    report = {
+        'meta': {
+            'timestamp': datetime.utcnow().isoformat(),
+            'git': git_revision(),
+            'runs': args.runs
+        },
+        'results': {
+            'import_profile': profile,
+            'time_to_first_response_ms': {
+                'median': round(statistics.median(startups) * 1000, 1),
+                'min': round(min(startups) * 1000, 1),
+                'max': round(max(startups) * 1000, 1),
+                'runs': [round(value * 1000, 1) for value in startups]
+            }
+        }
+    }
+
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        commit = (report['meta']['git']['commit'] or 'nogit')[:10]
+        output = os.path.join(RESULTS_DIR, f"startup-{datetime.utcnow():%Y%m%dT%H%M%S}-{commit}.json")
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
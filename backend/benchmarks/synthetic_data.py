@@ -0,0 +1,131 @@
+"""Deterministic synthetic catalogue and user data for benchmarks.
+
+The generator only produces plain dicts shaped like the scraper output, so the
+seeding step goes through the same DatabaseManager ingestion paths as a real
+scrape.
+"""
+import random
+from datetime import date, timedelta
+from typing import Dict, List
+
+from psycopg2.extras import execute_values
+
+GENRES = ['Drammatico', 'Commedia', 'Azione', 'Animazione', 'Thriller', 'Documentario', 'Horror']
+LANGUAGES = ['Italiano', 'Inglese', 'Francese', 'Spagnolo']
+TIMES = ['14:30', '16:15', '17:00', '18:45', '19:30', '20:00', '21:15', '22:30']
+
+BENCH_PASSWORD = 'benchmark-password'
+
+
+def generate_cinemas(count: int, seed: int = 42) -> List[Dict]:
+    rng = random.Random(seed)
+    return [{
+        'id': f'bench-cinema-{i}',
+        'name': f'Cinema Bench {i:03d}',
+        'cinema_chain': 'Bench Chain',
+        'latitude': round(41.85 + rng.random() * 0.1, 4),
+        'longitude': round(12.45 + rng.random() * 0.1, 4),
+        'website': f'https://bench.example.com/cinema-{i}',
+        'icon_url': f'https://bench.example.com/icons/cinema-{i}.png'
+    } for i in range(count)]
+
+
+def generate_movies(count: int, cinemas: List[Dict], showtimes_per_movie: int,
+                    seed: int = 42, start: date = None) -> Dict[str, List[Dict]]:
+    """Return the scraper-shaped movie list for each cinema id"""
+    rng = random.Random(seed)
+    start = start or date.today()
+    by_cinema = {cinema['id']: [] for cinema in cinemas}
+
+    for i in range(count):
+        movie = {
+            'id': f'bench-movie-{i}',
+            'title': f'Film Sintetico {i:04d}',
+            'genre': rng.choice(GENRES),
+            'duration': rng.randint(80, 180),
+            'language': rng.choice(LANGUAGES),
+            'poster_url': f'https://bench.example.com/posters/{i}.jpg',
+        }
+
+        # Spread the showtimes over a handful of cinemas and the next week
+        screens = rng.sample(cinemas, k=min(len(cinemas), rng.randint(1, 4)))
+        showtimes = {cinema['id']: set() for cinema in screens}
+        for _ in range(showtimes_per_movie):
+            cinema = rng.choice(screens)
+            day = start + timedelta(days=rng.randint(0, 6))
+            showtimes[cinema['id']].add((day.strftime('%d-%m-%Y'), rng.choice(TIMES)))
+
+        for cinema_id, slots in showtimes.items():
+            if not slots:
+                continue
+            by_cinema[cinema_id].append({
+                **movie,
+                'showtimes': [{
+                    'date': day,
+                    'time': time,
+                    'booking_link': f'https://bench.example.com/book/{movie["id"]}/{cinema_id}'
+                } for day, time in sorted(slots)]
+            })
+
+    return by_cinema
+
+
+def generate_users(count: int, password_hash: str, seed: int = 42) -> List[Dict]:
+    rng = random.Random(seed)
+    return [{
+        'email': f'user{i}@bench.stacco.test',
+        'password': password_hash,
+        'nome': f'Nome{i}',
+        'cognome': f'Cognome{i}',
+        'citta': 'Roma',
+        'cap': f'00{rng.randint(100, 199)}',
+        'data_nascita': date(1970, 1, 1) + timedelta(days=rng.randint(0, 15000)),
+        'telefono': f'3{rng.randint(100000000, 999999999)}'
+    } for i in range(count)]
+
+
+async def seed_database(db, cinemas: int, movies: int, showtimes_per_movie: int,
+                        users: int, seed: int = 42) -> Dict:
+    """Wipe the benchmark database and load a fresh synthetic dataset"""
+    from passlib.context import CryptContext
+
+    with db._get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                TRUNCATE catalogue_movies, catalogue_cinemas, movie_watches,
+                         showtimes, users, movies, cinemas
+                RESTART IDENTITY CASCADE
+            """)
+        conn.commit()
+
+    cinema_rows = generate_cinemas(cinemas, seed)
+    await db.update_cinemas(cinema_rows)
+
+    showtime_count = 0
+    for cinema_id, cinema_movies in generate_movies(movies, cinema_rows, showtimes_per_movie, seed).items():
+        if cinema_movies:
+            await db.update_movies_and_showtimes(cinema_id, cinema_movies)
+            showtime_count += sum(len(movie['showtimes']) for movie in cinema_movies)
+
+    # Hash once: bcrypt per user would dominate seeding time
+    password_hash = CryptContext(schemes=["bcrypt"], deprecated="auto").hash(BENCH_PASSWORD)
+    user_rows = generate_users(users, password_hash, seed)
+    with db._get_connection() as conn:
+        with conn.cursor() as cur:
+            execute_values(cur, """
+                INSERT INTO users (email, password, nome, cognome, citta, cap, data_nascita, telefono)
+                VALUES %s
+            """, [(
+                user['email'], user['password'], user['nome'], user['cognome'],
+                user['citta'], user['cap'], user['data_nascita'], user['telefono']
+            ) for user in user_rows])
+        conn.commit()
+
+    await db.refresh_catalogue()
+
+    return {
+        'cinema_ids': [cinema['id'] for cinema in cinema_rows],
+        'movie_ids': [f'bench-movie-{i}' for i in range(movies)],
+        'user_emails': [user['email'] for user in user_rows],
+        'showtime_count': showtime_count
+    }
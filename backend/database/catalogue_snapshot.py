@@ -0,0 +1,174 @@
+"""Immutable, memory-mapped catalogue snapshots shared by API workers.
+
+A snapshot file holds the ready-to-serve JSON of the catalogue read model:
+
+    b'STCSNAP1' | uint32 header length | header JSON | data
+
+The data region is the movie list JSON followed by the cinema list JSON.
+The header records the byte range of each list and, inside it, of every
+single document, so detail lookups are slices of the list blob and no
+document is stored twice. Snapshots are written to a temporary file and
+atomically renamed into place. Every worker maps the same file read-only,
+so the catalogue lives once in the page cache however many workers run.
+"""
+import json
+import mmap
+import os
+import struct
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Tuple
+
+MAGIC = b'STCSNAP1'
+FORMAT_VERSION = 1
+_HEADER_LENGTH = struct.Struct('<I')
+
+
+def _pack_list(documents: Iterable[Tuple[str, str]], start: int) -> Tuple[bytes, Dict[str, list]]:
+    """Join (id, json) pairs into one JSON array, recording each document's range"""
+    parts = [b'[']
+    offsets = {}
+    position = start + 1
+    for index, (doc_id, document) in enumerate(documents):
+        if index:
+            parts.append(b',')
+            position += 1
+        encoded = document.encode('utf-8')
+        offsets[doc_id] = [position, len(encoded)]
+        parts.append(encoded)
+        position += len(encoded)
+    parts.append(b']')
+    return b''.join(parts), offsets
+
+
+def write_snapshot(path: str, movies: Iterable[Tuple[str, str]], cinemas: Iterable[Tuple[str, str]],
+                   catalogue_version: int = 0, changes_through: int = 0) -> Dict:
+    """Atomically write a snapshot from (id, document JSON) pairs in display order.
+
+    `changes_through` is the newest catalogue_changes sequence number the
+    documents reflect, where clients continue delta syncs from.
+    """
+    movies_blob, movie_offsets = _pack_list(movies, 0)
+    cinemas_blob, cinema_offsets = _pack_list(cinemas, len(movies_blob))
+
+    header = {
+        'format': FORMAT_VERSION,
+        'catalogue_version': catalogue_version,
+        'changes_through': changes_through,
+        'created_at': datetime.utcnow().isoformat(),
+        'movies_list': [0, len(movies_blob)],
+        'cinemas_list': [len(movies_blob), len(cinemas_blob)],
+        'movies': movie_offsets,
+        'cinemas': cinema_offsets
+    }
+    header_bytes = json.dumps(header, separators=(',', ':')).encode('utf-8')
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.catalogue-', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(MAGIC)
+            f.write(_HEADER_LENGTH.pack(len(header_bytes)))
+            f.write(header_bytes)
+            f.write(movies_blob)
+            f.write(cinemas_blob)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    return {k: header[k] for k in ('format', 'catalogue_version', 'created_at')}
+
+
+async def publish_catalogue_snapshot(db, path: str) -> Dict:
+    """Export the current read model of `db` to a snapshot file"""
+    movies, cinemas, version, changes_through = await db.get_catalogue_documents()
+    return write_snapshot(path, movies, cinemas, version, changes_through)
+
+
+class CatalogueSnapshot:
+    """Read side of a snapshot file, transparently following new publications"""
+
+    def __init__(self, path: str, check_interval: float = 1.0):
+        self.path = path
+        self.check_interval = check_interval
+        self.header: Optional[Dict] = None
+        self._map: Optional[mmap.mmap] = None
+        self._data_start = 0
+        self._identity = None
+        self._checked_at = 0.0
+
+    def _open(self):
+        with open(self.path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if mapped[:len(MAGIC)] != MAGIC:
+            mapped.close()
+            raise ValueError(f"{self.path} is not a catalogue snapshot")
+
+        header_length = _HEADER_LENGTH.unpack_from(mapped, len(MAGIC))[0]
+        header_start = len(MAGIC) + _HEADER_LENGTH.size
+        header = json.loads(mapped[header_start:header_start + header_length])
+        if header.get('format') != FORMAT_VERSION:
+            mapped.close()
+            raise ValueError(f"Unsupported snapshot format {header.get('format')}")
+
+        previous = self._map
+        self._map = mapped
+        self.header = header
+        self._data_start = header_start + header_length
+        self._identity = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if previous is not None:
+            previous.close()
+
+    def refresh(self) -> bool:
+        """Map the latest published file; returns whether a snapshot is available"""
+        now = time.monotonic()
+        if self._map is not None and now - self._checked_at < self.check_interval:
+            return True
+        self._checked_at = now
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return self._map is not None
+        if (stat.st_ino, stat.st_mtime_ns, stat.st_size) != self._identity:
+            self._open()
+        return True
+
+    @property
+    def available(self) -> bool:
+        try:
+            return self.refresh()
+        except (OSError, ValueError):
+            return False
+
+    def _slice(self, byte_range) -> bytes:
+        offset, length = byte_range
+        start = self._data_start + offset
+        return self._map[start:start + length]
+
+    def movies(self) -> bytes:
+        return self._slice(self.header['movies_list'])
+
+    def cinemas(self) -> bytes:
+        return self._slice(self.header['cinemas_list'])
+
+    def movie(self, movie_id: str) -> Optional[bytes]:
+        byte_range = self.header['movies'].get(movie_id)
+        return self._slice(byte_range) if byte_range else None
+
+    def cinema(self, cinema_id: str) -> Optional[bytes]:
+        byte_range = self.header['cinemas'].get(cinema_id)
+        return self._slice(byte_range) if byte_range else None
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+            self._identity = None
@@ -1,10 +1,31 @@
+import asyncio
+import inspect
+import json
 import os
+import threading
+import weakref
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.pool import PoolError, ThreadedConnectionPool
 from dotenv import load_dotenv
-from urllib.parse import urlparse
 from typing import List, Dict, Optional
 import logging
+import time
+
+try:
+    from utils.metrics import (
+        DB_CONNECTION_WAIT, DB_POOL_TIMEOUTS, DB_READS_ROUTED, current_db_method, instrument_db_methods
+    )
+except ImportError:  # imported from the project root (scrapers, scripts)
+    from backend.utils.metrics import (
+        DB_CONNECTION_WAIT, DB_POOL_TIMEOUTS, DB_READS_ROUTED, current_db_method, instrument_db_methods
+    )
+
+from .replicas import ConnectionSlots, ReplicaSet, connection_pool, parse_database_url
+from .statements import StatementRegistry
+from .storage import CatalogueStorage
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -12,7 +33,185 @@ logger = logging.getLogger(__name__)
 
 load_dotenv()
 
-class DatabaseManager:
+# Showtimes with their start parsed from the scraped 'DD-MM-YYYY' / 'HH:MM'
+# strings, so the read model can derive the next upcoming screening.
+LIVE_SHOWTIMES_CTE = r"""
+    live_showtimes AS (
+        SELECT s.*,
+            CASE WHEN s.date ~ '^\d{2}-\d{2}-\d{4}$' AND s.time ~ '^\d{1,2}:\d{2}$'
+                THEN to_timestamp(s.date || ' ' || s.time, 'DD-MM-YYYY HH24:MI')::timestamp
+            END AS starts_at,
+            (now() AT TIME ZONE 'Europe/Rome') AS now_local
+        FROM showtimes s
+    )
+"""
+
+# NOTIFY channel carrying catalogue change events to the API workers
+CHANGES_CHANNEL = 'catalogue_events'
+# Transaction-level advisory lock serializing writes to catalogue_changes
+CHANGE_LOG_LOCK_KEY = 0x53544145  # 'STAE'
+# Postgres rejects NOTIFY payloads of 8000 bytes or more
+MAX_NOTIFY_PAYLOAD = 7900
+
+# statement_timeout (ms) for methods expected to run longer than the default;
+# DB_STATEMENT_TIMEOUTS="method=ms,..." overrides these, 0 disables the limit
+STATEMENT_TIMEOUTS = {
+    'refresh_catalogue': 120000,
+    'update_cinemas': 30000,
+    'update_movies_and_showtimes': 30000,
+    'record_watches': 30000,
+    'get_watches': 60000,
+    'replace_movie_similar': 60000,
+    'replace_user_recommendations': 60000,
+    'get_stats_snapshot': 15000,
+}
+
+
+# Coroutine methods that never borrow a pooled connection
+UNPOOLED_METHODS = {'close_connections', 'try_advisory_lock', 'lock_alive'}
+
+
+class PoolTimeout(Exception):
+    """No pooled connection became free within DB_POOL_TIMEOUT_SECONDS"""
+
+
+class _Reservation:
+    """Pool slot bookkeeping for the running coroutine method"""
+
+    def __init__(self):
+        # Slot awaited for the method after _NoFreeSlot, if any
+        self.slots: Optional[ConnectionSlots] = None
+        self.in_use = False
+        self.borrowed = False
+
+
+class _NoFreeSlot(BaseException):
+    """Raised by _get_connection on the event loop when its pool is saturated.
+
+    A BaseException so the methods' `except Exception` logging passes it
+    through to `_reserving_slot`, which waits for a slot and runs the
+    method again.
+    """
+
+    def __init__(self, slots: ConnectionSlots, target: str):
+        super().__init__(target)
+        self.slots = slots
+        self.target = target
+
+
+_reservation: ContextVar[Optional[_Reservation]] = ContextVar('db_slot_reservation', default=None)
+
+
+def _on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+
+# Public profile fields: everything but the password hash and bookkeeping
+USER_COLUMNS = ('id', 'email', 'nome', 'cognome', 'citta', 'cap', 'data_nascita', 'telefono')
+
+# psycopg2.extras is imported on first use rather than with the module, to
+# keep it off the API's import path
+def _dict_cursor(conn, **kwargs):
+    """A cursor returning rows as dicts"""
+    from psycopg2.extras import RealDictCursor
+    return conn.cursor(cursor_factory=RealDictCursor, **kwargs)
+
+def execute_values(cur, sql, argslist, **kwargs):
+    from psycopg2.extras import execute_values
+    return execute_values(cur, sql, argslist, **kwargs)
+
+def _reserving_slot(method):
+    @wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        reservation = _Reservation()
+        token = _reservation.set(reservation)
+        deadline = time.monotonic() + self.pool_timeout if self.pool_timeout else None
+        try:
+            while True:
+                try:
+                    return await method(self, *args, **kwargs)
+                except _NoFreeSlot as busy:
+                    # Raised before the method borrowed a connection, so it
+                    # can run again once a slot of the pool it chose is ours
+                    if reservation.slots is not None:
+                        reservation.slots.release()
+                        reservation.slots = None
+                    started = time.perf_counter()
+                    remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+                    if not await busy.slots.acquire_async(remaining):
+                        DB_POOL_TIMEOUTS.labels(target=busy.target).inc()
+                        raise PoolTimeout(f"No database connection free after {self.pool_timeout}s") from None
+                    DB_CONNECTION_WAIT.observe(time.perf_counter() - started)
+                    reservation.slots = busy.slots
+        finally:
+            _reservation.reset(token)
+            if reservation.slots is not None:
+                reservation.slots.release()
+
+    return wrapper
+
+def reserve_connection_slots(cls):
+    """Class decorator letting coroutine methods wait for a pool slot without blocking the loop.
+
+    The methods query synchronously on the event loop, so waiting inside
+    `_get_connection` would stall every request on the worker while
+    threads (streamed exports, calendars) hold the pool. On the loop,
+    `_get_connection` only takes free slots; when the pool it routed to
+    (replica or primary) is saturated the method is suspended here until
+    a slot of that pool frees up, then runs again.
+    """
+    for name, method in list(vars(cls).items()):
+        if name in UNPOOLED_METHODS or not inspect.iscoroutinefunction(method):
+            continue
+        setattr(cls, name, _reserving_slot(method))
+    return cls
+
+def _proxied_image(column: str) -> str:
+    """SQL for an image URL rewritten to the API image proxy when one is configured"""
+    return f"""
+        CASE WHEN %(image_base)s::text IS NOT NULL AND {column} ~ '^https?://'
+            THEN %(image_base)s::text || '/' || md5({column})
+            ELSE {column}
+        END"""
+
+def parse_statement_timeouts(spec: str) -> Dict[str, int]:
+    """Parse "method=ms,method=ms" into {method: ms}"""
+    timeouts = {}
+    for item in spec.split(','):
+        if not item.strip():
+            continue
+        method, _, value = item.partition('=')
+        if not value.strip():
+            raise ValueError(f"Invalid statement timeout {item.strip()!r}, expected method=ms")
+        timeouts[method.strip()] = int(value)
+    return timeouts
+
+def change_payloads(changes: List[Dict], limit: int = MAX_NOTIFY_PAYLOAD) -> List[str]:
+    """Change events as JSON arrays, each small enough for one NOTIFY"""
+    payloads = []
+    batch = []
+    size = 2
+    for change in changes:
+        encoded = json.dumps(change, separators=(',', ':'))
+        if len(encoded.encode('utf-8')) + 2 > limit:
+            logger.warning(f"Change event too large to notify: {encoded[:200]}")
+            continue
+        if batch and size + len(encoded.encode('utf-8')) + 1 > limit:
+            payloads.append('[' + ','.join(batch) + ']')
+            batch, size = [], 2
+        batch.append(encoded)
+        size += len(encoded.encode('utf-8')) + 1
+    if batch:
+        payloads.append('[' + ','.join(batch) + ']')
+    return payloads
+
+@instrument_db_methods
+@reserve_connection_slots
+class DatabaseManager(CatalogueStorage):
     def __init__(self):
         try:
             # Check if we're in local mode
@@ -28,24 +227,48 @@ class DatabaseManager:
             if not database_url:
                 raise ValueError("No database URL configured")
 
-            result = urlparse(database_url)
-            logger.info(f"Parsed URL components: host={result.hostname}, port={result.port}")
-            
-            self.db_config = {
-                'dbname': result.path[1:],
-                'user': result.username,
-                'password': result.password,
-                'host': result.hostname,
-                'port': result.port
+            self.db_config = parse_database_url(database_url)
+            self.db_config['connect_timeout'] = int(os.getenv('DB_CONNECT_TIMEOUT_SECONDS', '5'))
+            logger.info(f"Parsed URL components: host={self.db_config['host']}, port={self.db_config['port']}")
+
+            # The pool is created on first use so importing the API (and
+            # starting a worker) never waits on Postgres.
+            self.pool_size = int(os.getenv('DB_POOL_SIZE', '10'))
+            self._pool = None
+            self._pool_lock = threading.Lock()
+            self._pool_slots = ConnectionSlots(self.pool_size)
+            # How long a query waits for a free connection before failing
+            # with PoolTimeout (0 waits indefinitely)
+            self.pool_timeout = float(os.getenv('DB_POOL_TIMEOUT_SECONDS', '5')) or None
+
+            # Per-query statement_timeout, by instrumented method name
+            self.statement_timeout = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', '5000'))
+            self.statement_timeouts = {
+                **STATEMENT_TIMEOUTS,
+                **parse_statement_timeouts(os.getenv('DB_STATEMENT_TIMEOUTS', ''))
             }
-            
-            # Test connection
-            with self._get_connection() as conn:
-                with conn.cursor() as cur:
-                    cur.execute('SELECT version()')
-                    version = cur.fetchone()[0]
-                    logger.info(f"Successfully connected to PostgreSQL: {version}")
-                    
+            # statement_timeout currently set on each pooled connection
+            self._session_timeouts = weakref.WeakKeyDictionary()
+
+            # Optional read replicas for catalogue and profile reads. Reads
+            # stay on the primary for a while after this process writes, so
+            # a client never reads back older data than it just wrote.
+            replica_urls = [url.strip() for url in os.getenv('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+            self.replicas = ReplicaSet(
+                replica_urls,
+                self.pool_size,
+                max_lag=float(os.getenv('DB_REPLICA_MAX_LAG_SECONDS', '5')),
+                check_interval=float(os.getenv('DB_REPLICA_CHECK_SECONDS', '5'))
+            ) if replica_urls else None
+            self.read_after_write_window = float(os.getenv('DB_READ_AFTER_WRITE_SECONDS', '5'))
+            self._last_write = float('-inf')
+            if self.replicas:
+                logger.info(f"Routing reads to {len(replica_urls)} replica(s)")
+
+            self.statements = StatementRegistry(
+                enabled=os.getenv('DB_PREPARED_STATEMENTS', 'true').lower() == 'true'
+            )
+
         except Exception as e:
             logger.error(f"Database initialization error: {str(e)}")
             raise
@@ -53,7 +276,7 @@ class DatabaseManager:
     async def test_connection(self):
         """Test the database connection"""
         try:
-            with self._get_connection() as conn:
+            with self._get_connection(readonly=True, fresh=True) as conn:
                 with conn.cursor() as cur:
                     cur.execute('SELECT version()')
                     version = cur.fetchone()[0]
@@ -66,26 +289,165 @@ class DatabaseManager:
     async def close_connections(self):
         """Close any open database connections"""
         try:
-            # If you have any connection pooling or persistent connections, close them here
             logger.info("Closing database connections")
+            with self._pool_lock:
+                if self._pool is not None:
+                    self._pool.closeall()
+                    self._pool = None
+            if self.replicas:
+                self.replicas.close()
             return True
         except Exception as e:
             logger.error(f"Error closing database connections: {str(e)}")
             raise
 
-    def _get_connection(self):
+    def _get_pool(self) -> ThreadedConnectionPool:
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = connection_pool(self.pool_size, self.db_config)
+                    logger.info(f"Opened connection pool to {self.db_config['host']}:{self.db_config['port']}")
+        return self._pool
+
+    def _read_replica(self):
+        """The replica to serve a read from, or None for the primary"""
+        if time.monotonic() - self._last_write < self.read_after_write_window:
+            DB_READS_ROUTED.labels(target='primary_after_write').inc()
+            return None
+        replica = self.replicas.choose()
+        DB_READS_ROUTED.labels(target='replica' if replica else 'primary_fallback').inc()
+        return replica
+
+    @staticmethod
+    def _claim_reserved(reservation: Optional[_Reservation], slots: ConnectionSlots) -> bool:
+        if reservation is not None and reservation.slots is slots and not reservation.in_use:
+            reservation.in_use = True
+            return True
+        return False
+
+    @staticmethod
+    def _return_slot(reservation: Optional[_Reservation], slots: ConnectionSlots, reserved: bool):
+        if reserved:
+            reservation.in_use = False
+        else:
+            slots.release()
+
+    def _borrow_replica(self, replica, reservation: Optional[_Reservation], on_loop: bool):
+        """(pool, conn, whether the reserved slot was used); no connection when the replica is busy or down"""
+        started = time.perf_counter()
+        reserved = self._claim_reserved(reservation, replica.slots)
+        # A saturated replica is not down: give up sooner and let the
+        # primary serve the read
+        if not reserved and not replica.slots.acquire(
+                not on_loop, timeout=self.pool_timeout / 2 if self.pool_timeout and not on_loop else None):
+            if not on_loop:
+                DB_POOL_TIMEOUTS.labels(target='replica').inc()
+            return None, None, False
         try:
-            conn = psycopg2.connect(**self.db_config)
-            return conn
+            pool = replica.get_pool()
+            conn = pool.getconn()
+        except Exception as e:
+            self._return_slot(reservation, replica.slots, reserved)
+            replica.mark_down(e)
+            return None, None, False
+        DB_CONNECTION_WAIT.observe(time.perf_counter() - started)
+        return pool, conn, reserved
+
+    @contextmanager
+    def _get_connection(self, readonly: bool = False, fresh: bool = False, timeout_ms: Optional[int] = None,
+                        pins_reads: bool = True):
+        """Borrow a pooled connection.
+
+        Behaves like psycopg2's `with conn:` block: the transaction is
+        committed on success and rolled back on error, then the connection
+        goes back to the pool.
+
+        `readonly` reads may be served by a replica; `fresh` keeps a read on
+        the primary (authentication, read-after-write). Anything else counts
+        as a write and pins this process's reads to the primary for
+        `read_after_write_window` seconds, unless `pins_reads` is False:
+        background writes nobody reads back right away must not keep the
+        replicas idle.
+
+        Statements are cancelled after `timeout_ms` milliseconds, by default
+        the timeout configured for the calling method (0 disables it).
+
+        Threads wait up to `pool_timeout` for a free connection. On the
+        event loop nothing waits: busy replicas are skipped, and when the
+        primary is saturated too a coroutine method is suspended until a
+        slot frees up (see `reserve_connection_slots`); anything else
+        raises PoolTimeout straight away.
+        """
+        on_loop = _on_event_loop()
+        # Threads never use a reservation, even in a context copied from a method
+        reservation = _reservation.get() if on_loop else None
+        replica = self._read_replica() if readonly and not fresh and self.replicas else None
+        pool, conn, reserved = self._borrow_replica(replica, reservation, on_loop) if replica else (None, None, False)
+        if conn is not None:
+            slots = replica.slots
+        else:
+            # A replica that failed has been marked down; one still healthy was only busy
+            busy_replica = replica if replica is not None and replica.healthy else None
+            replica = None
+            slots = self._pool_slots
+            started = time.perf_counter()
+            reserved = self._claim_reserved(reservation, slots)
+            if not reserved and not slots.acquire(not on_loop, timeout=None if on_loop else self.pool_timeout):
+                if reservation is not None and not reservation.borrowed:
+                    # Wait for the replica the read was meant for, if it was only busy
+                    if busy_replica is not None:
+                        raise _NoFreeSlot(busy_replica.slots, 'replica')
+                    raise _NoFreeSlot(slots, 'primary')
+                DB_POOL_TIMEOUTS.labels(target='primary').inc()
+                raise PoolTimeout("No database connection free" if on_loop
+                                  else f"No database connection free after {self.pool_timeout}s")
+            try:
+                pool = self._get_pool()
+                conn = pool.getconn()
+            except Exception as e:
+                self._return_slot(reservation, slots, reserved)
+                logger.error(f"Connection error: {str(e)}")
+                logger.error(f"Attempted connection to: {self.db_config['host']}:{self.db_config['port']}")
+                raise
+            DB_CONNECTION_WAIT.observe(time.perf_counter() - started)
+        if reservation is not None:
+            reservation.borrowed = True
+
+        try:
+            if timeout_ms is None:
+                timeout_ms = self.statement_timeouts.get(current_db_method.get(), self.statement_timeout)
+            if self._session_timeouts.get(conn) != timeout_ms:
+                with conn.cursor() as cur:
+                    cur.execute("SET statement_timeout = %s", (timeout_ms,))
+                self._session_timeouts[conn] = timeout_ms
+            yield conn
+            if not conn.closed:
+                conn.commit()
+            if not readonly and pins_reads:
+                self._last_write = time.monotonic()
         except Exception as e:
-            logger.error(f"Connection error: {str(e)}")
-            logger.error(f"Attempted connection to: {self.db_config['host']}:{self.db_config['port']}")
+            if not conn.closed:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    pass
+            # A rollback also undoes the SET above
+            self._session_timeouts.pop(conn, None)
+            if replica is not None and conn.closed:
+                replica.mark_down(e)
             raise
+        finally:
+            try:
+                pool.putconn(conn, close=bool(conn.closed))
+            except PoolError:
+                # The replica's pool was dropped while this connection was out
+                conn.close()
+            self._return_slot(reservation, slots, reserved)
 
     async def _ensure_db_exists(self):
         """Create tables if they don't exist"""
         try:
-            with self._get_connection() as conn:
+            with self._get_connection(timeout_ms=0) as conn:
                 with conn.cursor() as cur:
                     with open(os.path.join(os.path.dirname(__file__), 'schema.sql'), 'r') as f:
                         cur.execute(f.read())
@@ -98,11 +460,16 @@ class DatabaseManager:
     async def update_cinemas(self, cinemas: List[Dict]):
         with self._get_connection() as conn:
             with conn.cursor() as cur:
+                changes = []
                 for cinema in cinemas:
                     cur.execute("""
+                        WITH previous AS (
+                            SELECT name, cinema_chain, latitude, longitude, website, icon_url
+                            FROM cinemas WHERE id = %(id)s
+                        )
                         INSERT INTO cinemas 
                         (id, name, cinema_chain, latitude, longitude, website, icon_url)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s)
+                        VALUES (%(id)s, %(name)s, %(cinema_chain)s, %(latitude)s, %(longitude)s, %(website)s, %(icon_url)s)
                         ON CONFLICT (id) DO UPDATE SET
                             name = EXCLUDED.name,
                             cinema_chain = EXCLUDED.cinema_chain,
@@ -111,34 +478,44 @@ class DatabaseManager:
                             website = EXCLUDED.website,
                             icon_url = EXCLUDED.icon_url,
                             last_updated = CURRENT_TIMESTAMP
-                    """, (
-                        cinema['id'],
-                        cinema['name'],
-                        cinema['cinema_chain'],
-                        cinema['latitude'],
-                        cinema['longitude'],
-                        cinema['website'],
-                        cinema.get('icon_url', '')
-                    ))
+                        RETURNING (xmax = 0) AS inserted,
+                            (name, cinema_chain, latitude, longitude, website, icon_url)
+                                IS DISTINCT FROM (SELECT previous FROM previous) AS changed
+                    """, {
+                        'id': cinema['id'],
+                        'name': cinema['name'],
+                        'cinema_chain': cinema['cinema_chain'],
+                        'latitude': cinema['latitude'],
+                        'longitude': cinema['longitude'],
+                        'website': cinema['website'],
+                        'icon_url': cinema.get('icon_url', '')
+                    })
+                    inserted, changed = cur.fetchone()
+                    if inserted or changed:
+                        changes.append({
+                            'type': 'cinema.added' if inserted else 'cinema.changed',
+                            'cinema_id': cinema['id'],
+                            'name': cinema['name']
+                        })
+                self._log_changes(cur, changes)
             conn.commit()
 
-    async def update_movies_and_showtimes(self, cinema_id: str, movies: List[Dict]):
+    async def update_movies_and_showtimes(self, cinema_id: str, movies: List[Dict], prune_missing: bool = False):
+        """Store a cinema's programme.
+
+        With `prune_missing`, `movies` is taken as the cinema's whole current
+        programme and its upcoming showtimes that it no longer lists are
+        deleted; only a live scrape should pass it. Every added, changed or
+        removed showtime and every new movie is appended to catalogue_changes
+        and announced on CHANGES_CHANNEL when the transaction commits.
+        """
         with self._get_connection() as conn:
             with conn.cursor() as cur:
+                changes = []
+                seen = ([], [], [])
                 for movie in movies:
                     # Insert/update movie
-                    cur.execute("""
-                        INSERT INTO movies 
-                        (id, title, genre, duration, language, poster_url)
-                        VALUES (%s, %s, %s, %s, %s, %s)
-                        ON CONFLICT (id) DO UPDATE SET
-                            title = EXCLUDED.title,
-                            genre = EXCLUDED.genre,
-                            duration = EXCLUDED.duration,
-                            language = EXCLUDED.language,
-                            poster_url = EXCLUDED.poster_url,
-                            last_updated = CURRENT_TIMESTAMP
-                    """, (
+                    self.statements.execute(cur, 'upsert_movie', (
                         movie['id'],
                         movie['title'],
                         movie['genre'],
@@ -146,53 +523,95 @@ class DatabaseManager:
                         movie['language'],
                         movie['poster_url']
                     ))
+                    if cur.fetchone()[0]:
+                        changes.append({
+                            'type': 'movie.added', 'movie_id': movie['id'],
+                            'cinema_id': cinema_id, 'title': movie['title']
+                        })
+
+                    # Detail page enrichment
+                    details = movie.get('details')
+                    if details:
+                        self.statements.execute(cur, 'update_movie_details', (
+                            details.get('synopsis'),
+                            details.get('director'),
+                            json.dumps(details['cast']) if details.get('cast') else None,
+                            details.get('runtime'),
+                            details.get('poster_url'),
+                            movie['id']
+                        ))
 
                     # Insert showtimes
                     for showtime in movie['showtimes']:
-                        cur.execute("""
-                            INSERT INTO showtimes 
-                            (movie_id, cinema_id, date, time, booking_link)
-                            VALUES (%s, %s, %s, %s, %s)
-                            ON CONFLICT (movie_id, cinema_id, date, time) DO UPDATE SET
-                                booking_link = EXCLUDED.booking_link,
-                                last_updated = CURRENT_TIMESTAMP
-                        """, (
+                        self.statements.execute(cur, 'upsert_showtime', (
                             movie['id'],
                             cinema_id,
                             showtime['date'],
                             showtime['time'],
                             showtime['booking_link']
                         ))
+                        inserted, changed = cur.fetchone()
+                        if inserted or changed:
+                            changes.append({
+                                'type': 'showtime.added' if inserted else 'showtime.changed',
+                                'movie_id': movie['id'], 'cinema_id': cinema_id,
+                                'date': showtime['date'], 'time': showtime['time'],
+                                'booking_link': showtime['booking_link']
+                            })
+                        seen[0].append(movie['id'])
+                        seen[1].append(showtime['date'])
+                        seen[2].append(showtime['time'])
+
+                # An empty scrape is more likely a broken page than an empty
+                # programme, so it never clears the cinema
+                if prune_missing and movies:
+                    cur.execute(r"""
+                        DELETE FROM showtimes s
+                        WHERE s.cinema_id = %s
+                            AND s.date ~ '^\d{2}-\d{2}-\d{4}$' AND s.time ~ '^\d{1,2}:\d{2}$'
+                            AND to_timestamp(s.date || ' ' || s.time, 'DD-MM-YYYY HH24:MI')::timestamp
+                                >= (now() AT TIME ZONE 'Europe/Rome')
+                            AND NOT EXISTS (
+                                SELECT 1 FROM unnest(%s::text[], %s::text[], %s::text[]) AS listed(movie_id, date, time)
+                                WHERE listed.movie_id = s.movie_id AND listed.date = s.date AND listed.time = s.time
+                            )
+                        RETURNING s.movie_id, s.date, s.time
+                    """, (cinema_id, *seen))
+                    changes.extend(
+                        {'type': 'showtime.removed', 'movie_id': movie_id, 'cinema_id': cinema_id,
+                         'date': day, 'time': hour}
+                        for movie_id, day, hour in cur.fetchall()
+                    )
+
+                # Feeds the last-scrape figures of the stats endpoints
+                self.statements.execute(cur, 'touch_cinema', (cinema_id,))
+                self._log_changes(cur, changes)
             conn.commit()
 
+    def _log_changes(self, cur, changes: List[Dict]):
+        """Append change events to catalogue_changes and queue them for LISTENers.
+
+        Call it last in the transaction: the lock it takes, which keeps
+        sequence numbers committing in order, is held until the commit.
+        """
+        if not changes:
+            return
+        cur.execute("SELECT pg_advisory_xact_lock(%s)", (CHANGE_LOG_LOCK_KEY,))
+        seqs = execute_values(
+            cur, "INSERT INTO catalogue_changes (change) VALUES %s RETURNING seq",
+            [(json.dumps(change),) for change in changes], fetch=True
+        )
+        for change, (seq,) in zip(changes, seqs):
+            change['seq'] = seq
+        # Postgres delivers notifications on commit
+        for payload in change_payloads(changes):
+            cur.execute("SELECT pg_notify(%s, %s)", (CHANGES_CHANNEL, payload))
+
     async def get_all_movies(self):
         try:
-            with self._get_connection() as conn:
-                with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                    cur.execute("""
-                        SELECT DISTINCT m.*,
-                            (
-                                SELECT string_agg(DISTINCT c.name, ', ')
-                                FROM showtimes s
-                                JOIN cinemas c ON s.cinema_id = c.id
-                                WHERE s.movie_id = m.id
-                            ) as cinemas,
-                            (
-                                SELECT jsonb_agg(
-                                    jsonb_build_object(
-                                        'date', s.date,
-                                        'time', s.time,
-                                        'cinema', c.name,
-                                        'booking_link', s.booking_link
-                                    )
-                                )
-                                FROM showtimes s
-                                JOIN cinemas c ON s.cinema_id = c.id
-                                WHERE s.movie_id = m.id
-                            ) as showtimes
-                        FROM movies m
-                        ORDER BY m.title
-                    """)
+            with self._get_connection(readonly=True) as conn:
+                with _dict_cursor(conn) as cur:
+                    self.statements.execute(cur, 'all_movies')
                     return cur.fetchall()
         except Exception as e:
             logger.error(f"Error in get_all_movies: {str(e)}")
@@ -200,8 +619,8 @@ class DatabaseManager:
 
     async def get_movie_showtimes(self, movie_id: str):
         try:
-            with self._get_connection() as conn:
-                with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            with self._get_connection(readonly=True) as conn:
+                with _dict_cursor(conn) as cur:
                     cur.execute("""
                         SELECT s.date, s.time, c.name as cinema_name, s.booking_link
                         FROM showtimes s
@@ -226,48 +645,34 @@ class DatabaseManager:
         return None
 
     async def get_all_cinemas(self):
-        with self._get_connection() as conn:
-            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        with self._get_connection(readonly=True) as conn:
+            with _dict_cursor(conn) as cur:
                 cur.execute("""
                     SELECT * FROM cinemas
                     ORDER BY name
                 """)
                 return cur.fetchall()
 
-    async def get_cinema_by_id(self, cinema_id: str):
-        with self._get_connection() as conn:
-            cursor = conn.execute("""
-                SELECT id, name, cinema_chain, latitude, longitude, website
-                FROM cinemas
-                WHERE id = ?
-            """, (cinema_id,))
-            row = cursor.fetchone()
-            if row:
-                return dict(zip([col[0] for col in cursor.description], row))
-            return None
+    async def get_cinema_by_id(self, cinema_id: str) -> Optional[Dict]:
+        try:
+            with self._get_connection(readonly=True) as conn:
+                with _dict_cursor(conn) as cur:
+                    cur.execute("""
+                        SELECT id, name, cinema_chain, latitude, longitude, website
+                        FROM cinemas
+                        WHERE id = %s
+                    """, (cinema_id,))
+                    return cur.fetchone()
+        except Exception as e:
+            logger.error(f"Database error in get_cinema_by_id: {str(e)}")
+            raise
 
     async def get_cinema_movies(self, cinema_id: str):
         try:
-            with self._get_connection() as conn:
-                with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                    cur.execute("""
-                        SELECT DISTINCT m.*,
-                        (
-                            SELECT jsonb_agg(
-                                jsonb_build_object(
-                                    'date', s.date,
-                                    'time', s.time,
-                                    'booking_link', s.booking_link
-                                )
-                            )
-                            FROM showtimes s
-                            WHERE s.movie_id = m.id AND s.cinema_id = %s
-                        ) as showtimes
-                        FROM movies m
-                        JOIN showtimes s ON m.id = s.movie_id
-                        WHERE s.cinema_id = %s
-                    """, (cinema_id, cinema_id))
-                    
+            with self._get_connection(readonly=True) as conn:
+                with _dict_cursor(conn) as cur:
+                    self.statements.execute(cur, 'cinema_movies', (cinema_id,))
+
                     movies = cur.fetchall()
                     return [dict(movie) for movie in movies]
         except Exception as e:
@@ -277,7 +682,7 @@ class DatabaseManager:
     async def create_user(self, user_data: dict):
         try:
             with self._get_connection() as conn:
-                with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                with _dict_cursor(conn) as cur:
                     cur.execute("""
                         INSERT INTO users (
                             email, password, nome, cognome, 
@@ -304,42 +709,77 @@ class DatabaseManager:
 
     async def get_user_by_email(self, email: str) -> Optional[Dict]:
         try:
-            logger.info(f"Checking database for email: {email}")
-            with self._get_connection() as conn:
-                with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                    cur.execute("SELECT * FROM users WHERE email = %s", (email,))
-                    result = cur.fetchone()
-                    logger.info(f"Database query result: {result is not None}")
-                    if result:
-                        # Log user data (excluding sensitive info)
-                        safe_result = {k: v for k, v in result.items() if k != 'password'}
-                        logger.info(f"User data retrieved: {safe_result}")
-                    return result
+            with self._get_connection(readonly=True, fresh=True) as conn:
+                with _dict_cursor(conn) as cur:
+                    self.statements.execute(cur, 'user_by_email', (email,))
+                    return cur.fetchone()
         except Exception as e:
             logger.error(f"Database error in get_user_by_email: {str(e)}")
             raise
 
-    async def get_all_users(self) -> List[dict]:
+    async def email_exists(self, email: str) -> bool:
         try:
-            with self._get_connection() as conn:
-                with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                    cur.execute("""
-                        SELECT *
+            with self._get_connection(readonly=True, fresh=True) as conn:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1 FROM users WHERE email = %s", (email,))
+                    return cur.fetchone() is not None
+        except Exception as e:
+            logger.error(f"Database error in email_exists: {str(e)}")
+            raise
+
+    async def get_user_emails(self, after_id: int = 0) -> List[tuple]:
+        """(id, email) of every user with id > after_id, in id order"""
+        try:
+            with self._get_connection(readonly=True, fresh=True) as conn:
+                with conn.cursor() as cur:
+                    cur.execute(
+                        "SELECT id, email FROM users WHERE id > %s ORDER BY id",
+                        (after_id,)
+                    )
+                    return cur.fetchall()
+        except Exception as e:
+            logger.error(f"Database error in get_user_emails: {str(e)}")
+            raise
+
+    async def get_users_page(self, after_id: int = 0, limit: int = 100) -> List[dict]:
+        """Up to `limit` users with id > after_id, in id order (keyset pagination)"""
+        try:
+            with self._get_connection(readonly=True) as conn:
+                with _dict_cursor(conn) as cur:
+                    cur.execute(f"""
+                        SELECT {', '.join(USER_COLUMNS)}
                         FROM users
-                    """)
+                        WHERE id > %s
+                        ORDER BY id
+                        LIMIT %s
+                    """, (after_id, limit))
                     return cur.fetchall()
         except Exception as e:
-            logger.error(f"Database error in get_all_users: {str(e)}")
+            logger.error(f"Database error in get_users_page: {str(e)}")
             raise
 
-    async def get_user_by_id(self, user_id: int) -> Optional[dict]:
+    def iter_users(self, batch_size: int = 1000):
+        """Yield every user through a server-side cursor, `batch_size` rows per round trip.
+
+        A plain generator rather than a coroutine: it holds one connection
+        for as long as the consumer keeps iterating, so run it off the event
+        loop (StreamingResponse does so for sync iterators).
+        """
         try:
-            with self._get_connection() as conn:
-                with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                    cur.execute("""
-                        SELECT id, email, nome, cognome, citta, cap, data_nascita, telefono
-                        FROM users WHERE id = %s
-                    """, (user_id,))
+            with self._get_connection(readonly=True) as conn:
+                with _dict_cursor(conn, name='users_export') as cur:
+                    cur.itersize = batch_size
+                    cur.execute(f"SELECT {', '.join(USER_COLUMNS)} FROM users ORDER BY id")
+                    yield from cur
+        except Exception as e:
+            logger.error(f"Database error in iter_users: {str(e)}")
+            raise
+
+    async def get_user_by_id(self, user_id: int, fresh: bool = False) -> Optional[dict]:
+        try:
+            with self._get_connection(readonly=True, fresh=fresh) as conn:
+                with _dict_cursor(conn) as cur:
+                    cur.execute(f"SELECT {', '.join(USER_COLUMNS)} FROM users WHERE id = %s", (user_id,))
                     return cur.fetchone()
         except Exception as e:
             logger.error(f"Database error in get_user_by_id: {str(e)}")
@@ -348,7 +788,7 @@ class DatabaseManager:
     async def update_user(self, user_id: int, user_data: dict) -> Optional[dict]:
         try:
             with self._get_connection() as conn:
-                with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                with _dict_cursor(conn) as cur:
                     cur.execute("""
                         UPDATE users 
                         SET nome = %s, cognome = %s, citta = %s, cap = %s, telefono = %s
@@ -368,23 +808,167 @@ class DatabaseManager:
             logger.error(f"Database error in update_user: {str(e)}")
             raise
 
-    async def get_user_movie_history(self, user_id: int) -> List[dict]:
+    async def get_user_movie_history(self, user_id: int, before: Optional[tuple] = None,
+                                     limit: int = 50) -> List[dict]:
+        """A page of watches, newest first; `before` is the (watch_date, id) of the last one seen"""
+        before_date, before_id = before or (None, None)
         try:
-            with self._get_connection() as conn:
-                with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            with self._get_connection(readonly=True) as conn:
+                with _dict_cursor(conn) as cur:
                     cur.execute("""
-                        SELECT m.id, m.title, w.watch_date, c.name as cinema
+                        SELECT m.id, m.title, w.watch_date, c.name as cinema, w.id AS watch_id
                         FROM movie_watches w
                         JOIN movies m ON w.movie_id = m.id
                         JOIN cinemas c ON w.cinema_id = c.id
-                        WHERE w.user_id = %s
-                        ORDER BY w.watch_date DESC
-                    """, (user_id,))
+                        WHERE w.user_id = %(user_id)s
+                          AND (%(before_date)s::timestamp IS NULL
+                               OR (w.watch_date, w.id) < (%(before_date)s::timestamp, %(before_id)s))
+                        ORDER BY w.watch_date DESC, w.id DESC
+                        LIMIT %(limit)s
+                    """, {'user_id': user_id, 'before_date': before_date, 'before_id': before_id, 'limit': limit})
                     return cur.fetchall()
         except Exception as e:
             logger.error(f"Database error in get_user_movie_history: {str(e)}")
             raise
 
+    async def record_watch(self, user_id: int, movie_id: str, cinema_id: str, watch_date=None) -> Dict:
+        """Add a watch and update the user's aggregates in the same transaction"""
+        try:
+            with self._get_connection() as conn:
+                with _dict_cursor(conn) as cur:
+                    cur.execute("""
+                        INSERT INTO movie_watches (user_id, movie_id, cinema_id, watch_date)
+                        VALUES (%s, %s, %s, COALESCE(%s, CURRENT_TIMESTAMP))
+                        RETURNING id, user_id, movie_id, cinema_id, watch_date
+                    """, (user_id, movie_id, cinema_id, watch_date))
+                    watch = cur.fetchone()
+
+                    cur.execute("""
+                        INSERT INTO user_watch_stats (user_id, total_watches, first_watch, last_watch)
+                        VALUES (%(user_id)s, 1, %(watch_date)s, %(watch_date)s)
+                        ON CONFLICT (user_id) DO UPDATE SET
+                            total_watches = user_watch_stats.total_watches + 1,
+                            first_watch = LEAST(user_watch_stats.first_watch, EXCLUDED.first_watch),
+                            last_watch = GREATEST(user_watch_stats.last_watch, EXCLUDED.last_watch)
+                    """, watch)
+                    cur.execute("""
+                        INSERT INTO user_cinema_watches (user_id, cinema_id, watches)
+                        VALUES (%(user_id)s, %(cinema_id)s, 1)
+                        ON CONFLICT (user_id, cinema_id) DO UPDATE SET
+                            watches = user_cinema_watches.watches + 1
+                    """, watch)
+                    cur.execute("""
+                        INSERT INTO user_genre_watches (user_id, genre, watches)
+                        SELECT DISTINCT %(user_id)s, trim(part), 1
+                        FROM movies m, regexp_split_to_table(m.genre, ',') AS part
+                        WHERE m.id = %(movie_id)s AND trim(part) <> ''
+                        ON CONFLICT (user_id, genre) DO UPDATE SET
+                            watches = user_genre_watches.watches + 1
+                    """, watch)
+                    return watch
+        except Exception as e:
+            logger.error(f"Database error in record_watch: {str(e)}")
+            raise
+
+    async def record_watches(self, events: List[Dict]) -> int:
+        """Store a batch of watches with one statement; returns how many were stored.
+
+        Events naming an unknown user, movie or cinema are skipped rather
+        than failing the whole batch. The per-user aggregates are updated by
+        the same statement. Batches come from the background watch buffer,
+        whose clients were answered before the write, so they do not pin
+        reads to the primary.
+        """
+        if not events:
+            return 0
+        try:
+            with self._get_connection(pins_reads=False) as conn:
+                with conn.cursor() as cur:
+                    rows = execute_values(cur, """
+                        WITH incoming (user_id, movie_id, cinema_id, watch_date) AS (
+                            VALUES %s
+                        ),
+                        inserted AS (
+                            INSERT INTO movie_watches (user_id, movie_id, cinema_id, watch_date)
+                            SELECT i.user_id, i.movie_id, i.cinema_id, COALESCE(i.watch_date, CURRENT_TIMESTAMP)
+                            FROM incoming i
+                            WHERE EXISTS (SELECT 1 FROM users u WHERE u.id = i.user_id)
+                              AND EXISTS (SELECT 1 FROM movies m WHERE m.id = i.movie_id)
+                              AND EXISTS (SELECT 1 FROM cinemas c WHERE c.id = i.cinema_id)
+                            RETURNING user_id, movie_id, cinema_id, watch_date
+                        ),
+                        stats AS (
+                            INSERT INTO user_watch_stats (user_id, total_watches, first_watch, last_watch)
+                            SELECT user_id, COUNT(*), MIN(watch_date), MAX(watch_date)
+                            FROM inserted GROUP BY user_id
+                            ON CONFLICT (user_id) DO UPDATE SET
+                                total_watches = user_watch_stats.total_watches + EXCLUDED.total_watches,
+                                first_watch = LEAST(user_watch_stats.first_watch, EXCLUDED.first_watch),
+                                last_watch = GREATEST(user_watch_stats.last_watch, EXCLUDED.last_watch)
+                        ),
+                        cinema_counts AS (
+                            INSERT INTO user_cinema_watches (user_id, cinema_id, watches)
+                            SELECT user_id, cinema_id, COUNT(*)
+                            FROM inserted GROUP BY user_id, cinema_id
+                            ON CONFLICT (user_id, cinema_id) DO UPDATE SET
+                                watches = user_cinema_watches.watches + EXCLUDED.watches
+                        ),
+                        genre_counts AS (
+                            INSERT INTO user_genre_watches (user_id, genre, watches)
+                            SELECT i.user_id, g.genre, COUNT(*)
+                            FROM inserted i
+                            JOIN movies m ON m.id = i.movie_id
+                            CROSS JOIN LATERAL (
+                                SELECT DISTINCT trim(part) AS genre FROM regexp_split_to_table(m.genre, ',') AS part
+                            ) g
+                            WHERE g.genre <> ''
+                            GROUP BY i.user_id, g.genre
+                            ON CONFLICT (user_id, genre) DO UPDATE SET
+                                watches = user_genre_watches.watches + EXCLUDED.watches
+                        )
+                        SELECT COUNT(*) FROM inserted
+                    """, [
+                        (event['user_id'], event['movie_id'], event['cinema_id'], event.get('watch_date'))
+                        for event in events
+                    ], template="(%s::integer, %s::text, %s::text, %s::timestamp)",
+                        page_size=max(1, len(events)), fetch=True)
+                    return rows[0][0]
+        except Exception as e:
+            logger.error(f"Database error in record_watches: {str(e)}")
+            raise
+
+    async def get_user_watch_stats(self, user_id: int, top: int = 5) -> Dict:
+        """Precomputed totals and favourite cinemas/genres; never scans the history"""
+        try:
+            with self._get_connection(readonly=True) as conn:
+                with _dict_cursor(conn) as cur:
+                    cur.execute("""
+                        SELECT total_watches, first_watch, last_watch
+                        FROM user_watch_stats WHERE user_id = %s
+                    """, (user_id,))
+                    totals = cur.fetchone() or {'total_watches': 0, 'first_watch': None, 'last_watch': None}
+                    cur.execute("""
+                        SELECT u.cinema_id, c.name, u.watches
+                        FROM user_cinema_watches u
+                        LEFT JOIN cinemas c ON c.id = u.cinema_id
+                        WHERE u.user_id = %s
+                        ORDER BY u.watches DESC, u.cinema_id
+                        LIMIT %s
+                    """, (user_id, top))
+                    cinemas = cur.fetchall()
+                    cur.execute("""
+                        SELECT genre, watches
+                        FROM user_genre_watches
+                        WHERE user_id = %s
+                        ORDER BY watches DESC, genre
+                        LIMIT %s
+                    """, (user_id, top))
+                    genres = cur.fetchall()
+                    return {**totals, 'favourite_cinemas': cinemas, 'favourite_genres': genres}
+        except Exception as e:
+            logger.error(f"Database error in get_user_watch_stats: {str(e)}")
+            raise
+
     # async def update_user_profile_picture(self, user_id: int, profile_picture_url: str):
     #     query = """
     #         UPDATE users 
@@ -421,14 +1005,14 @@ class DatabaseManager:
             raise
 
     async def get_cinema(self, cinema_id: str) -> Optional[Dict]:
-        with self._get_connection() as conn:
-            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        with self._get_connection(readonly=True) as conn:
+            with _dict_cursor(conn) as cur:
                 cur.execute("SELECT * FROM cinemas WHERE id = %s", (cinema_id,))
                 return cur.fetchone()
 
     async def get_movies_by_cinema(self, cinema_id: str) -> List[Dict]:
-        with self._get_connection() as conn:
-            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        with self._get_connection(readonly=True) as conn:
+            with _dict_cursor(conn) as cur:
                 cur.execute("""
                     SELECT DISTINCT m.*, 
                            array_agg(json_build_object(
@@ -442,4 +1026,603 @@ class DatabaseManager:
                     GROUP BY m.id
                     ORDER BY m.title
                 """, (cinema_id,))
-                return cur.fetchall()
\ No newline at end of file
+                return cur.fetchall()
+    async def refresh_catalogue(self):
+        """Rebuild the denormalized catalogue read model in a single transaction.
+
+        Readers keep seeing the previous documents until the commit, so the
+        catalogue endpoints never observe a half-built read model. With
+        IMAGE_PROXY_BASE_URL set, poster and icon URLs point at the API's
+        image proxy instead of the cinema sites.
+        """
+        image_base = os.getenv('IMAGE_PROXY_BASE_URL', '').rstrip('/') or None
+        try:
+            with self._get_connection() as conn:
+                with conn.cursor() as cur:
+                    # Read before the scraped tables, so every change up to
+                    # here is in the documents built below (logged changes
+                    # commit in sequence order)
+                    cur.execute("SELECT COALESCE(MAX(seq), 0) FROM catalogue_changes")
+                    changes_through = cur.fetchone()[0]
+
+                    # Images the proxy is allowed to fetch
+                    cur.execute("""
+                        INSERT INTO image_sources (id, url)
+                        SELECT md5(url), url FROM (
+                            SELECT poster_url AS url FROM movies
+                            UNION SELECT icon_url FROM cinemas
+                        ) images
+                        WHERE url ~ '^https?://'
+                        ON CONFLICT (id) DO NOTHING
+                    """)
+                    image_params = {'image_base': image_base}
+
+                    cur.execute("DELETE FROM catalogue_movies")
+                    cur.execute(f"""
+                        WITH {LIVE_SHOWTIMES_CTE}
+                        INSERT INTO catalogue_movies
+                        (movie_id, title, next_showtime, showtime_count, cinema_count, document)
+                        SELECT m.id, m.title, agg.next_showtime,
+                            COALESCE(agg.showtime_count, 0),
+                            COALESCE(agg.cinema_count, 0),
+                            to_jsonb(m) || jsonb_build_object(
+                                'cinemas', agg.cinemas,
+                                'cinema_list', COALESCE(agg.cinema_list, '[]'::jsonb),
+                                'showtimes', COALESCE(agg.showtimes, '[]'::jsonb),
+                                'showtime_count', COALESCE(agg.showtime_count, 0),
+                                'next_showtime', agg.next_showtime,
+                                'poster_url', {_proxied_image('m.poster_url')}
+                            )
+                        FROM movies m
+                        LEFT JOIN (
+                            SELECT s.movie_id,
+                                string_agg(DISTINCT c.name, ', ') AS cinemas,
+                                jsonb_agg(DISTINCT c.name) AS cinema_list,
+                                jsonb_agg(
+                                    jsonb_build_object(
+                                        'date', s.date,
+                                        'time', s.time,
+                                        'cinema', c.name,
+                                        'booking_link', s.booking_link
+                                    ) ORDER BY s.date, s.time
+                                ) AS showtimes,
+                                COUNT(*) AS showtime_count,
+                                COUNT(DISTINCT s.cinema_id) AS cinema_count,
+                                MIN(s.starts_at) FILTER (WHERE s.starts_at >= s.now_local) AS next_showtime
+                            FROM live_showtimes s
+                            JOIN cinemas c ON s.cinema_id = c.id
+                            GROUP BY s.movie_id
+                        ) agg ON agg.movie_id = m.id
+                    """, image_params)
+
+                    cur.execute("DELETE FROM catalogue_cinemas")
+                    cur.execute(f"""
+                        WITH {LIVE_SHOWTIMES_CTE}
+                        INSERT INTO catalogue_cinemas
+                        (cinema_id, name, next_showtime, movie_count, showtime_count, document)
+                        SELECT c.id, c.name, agg.next_showtime,
+                            COALESCE(agg.movie_count, 0),
+                            COALESCE(agg.showtime_count, 0),
+                            to_jsonb(c) || jsonb_build_object(
+                                'currentMovies', COALESCE(agg.movies, '[]'::jsonb),
+                                'movie_count', COALESCE(agg.movie_count, 0),
+                                'showtime_count', COALESCE(agg.showtime_count, 0),
+                                'next_showtime', agg.next_showtime,
+                                'icon_url', {_proxied_image('c.icon_url')}
+                            )
+                        FROM cinemas c
+                        LEFT JOIN (
+                            SELECT cm.cinema_id,
+                                jsonb_agg(
+                                    to_jsonb(m) || jsonb_build_object(
+                                        'showtimes', cm.showtimes,
+                                        'poster_url', {_proxied_image('m.poster_url')}
+                                    )
+                                    ORDER BY m.title
+                                ) AS movies,
+                                COUNT(*) AS movie_count,
+                                SUM(cm.showtime_count)::int AS showtime_count,
+                                MIN(cm.next_showtime) AS next_showtime
+                            FROM (
+                                SELECT s.cinema_id, s.movie_id,
+                                    jsonb_agg(
+                                        jsonb_build_object(
+                                            'date', s.date,
+                                            'time', s.time,
+                                            'booking_link', s.booking_link
+                                        ) ORDER BY s.date, s.time
+                                    ) AS showtimes,
+                                    COUNT(*) AS showtime_count,
+                                    MIN(s.starts_at) FILTER (WHERE s.starts_at >= s.now_local) AS next_showtime
+                                FROM live_showtimes s
+                                GROUP BY s.cinema_id, s.movie_id
+                            ) cm
+                            JOIN movies m ON cm.movie_id = m.id
+                            GROUP BY cm.cinema_id
+                        ) agg ON agg.cinema_id = c.id
+                    """, image_params)
+
+                    cur.execute("""
+                        INSERT INTO catalogue_meta (id, version, refreshed_at, changes_through)
+                        VALUES (1, 1, CURRENT_TIMESTAMP, %s)
+                        ON CONFLICT (id) DO UPDATE SET
+                            version = catalogue_meta.version + 1,
+                            refreshed_at = EXCLUDED.refreshed_at,
+                            changes_through = EXCLUDED.changes_through
+                    """, (changes_through,))
+                conn.commit()
+            logger.info("Catalogue read model refreshed")
+        except Exception as e:
+            logger.error(f"Error refreshing catalogue: {str(e)}")
+            raise
+
+    async def ensure_catalogue(self):
+        """Build the read model if it has never been populated"""
+        with self._get_connection(readonly=True, fresh=True) as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT EXISTS (SELECT 1 FROM catalogue_movies)")
+                populated = cur.fetchone()[0]
+        if not populated:
+            await self.refresh_catalogue()
+
+    async def get_catalogue_movies(self) -> str:
+        """Return the precomputed movie documents as a JSON array string"""
+        try:
+            with self._get_connection(readonly=True) as conn:
+                with conn.cursor() as cur:
+                    cur.execute("""
+                        SELECT document::text
+                        FROM catalogue_movies
+                        ORDER BY title, movie_id
+                    """)
+                    return '[' + ','.join(row[0] for row in cur.fetchall()) + ']'
+        except Exception as e:
+            logger.error(f"Error in get_catalogue_movies: {str(e)}")
+            raise
+
+    async def get_catalogue_movie(self, movie_id: str) -> Optional[str]:
+        try:
+            with self._get_connection(readonly=True) as conn:
+                with conn.cursor() as cur:
+                    cur.execute("""
+                        SELECT document::text
+                        FROM catalogue_movies
+                        WHERE movie_id = %s
+                    """, (movie_id,))
+                    row = cur.fetchone()
+                    return row[0] if row else None
+        except Exception as e:
+            logger.error(f"Error in get_catalogue_movie: {str(e)}")
+            raise
+
+    async def get_catalogue_cinemas(self) -> str:
+        """Return the precomputed cinema documents as a JSON array string"""
+        try:
+            with self._get_connection(readonly=True) as conn:
+                with conn.cursor() as cur:
+                    cur.execute("""
+                        SELECT document::text
+                        FROM catalogue_cinemas
+                        ORDER BY name, cinema_id
+                    """)
+                    return '[' + ','.join(row[0] for row in cur.fetchall()) + ']'
+        except Exception as e:
+            logger.error(f"Error in get_catalogue_cinemas: {str(e)}")
+            raise
+
+    async def get_catalogue_cinema(self, cinema_id: str) -> Optional[str]:
+        try:
+            with self._get_connection(readonly=True) as conn:
+                with conn.cursor() as cur:
+                    cur.execute("""
+                        SELECT document::text
+                        FROM catalogue_cinemas
+                        WHERE cinema_id = %s
+                    """, (cinema_id,))
+                    row = cur.fetchone()
+                    return row[0] if row else None
+        except Exception as e:
+            logger.error(f"Error in get_catalogue_cinema: {str(e)}")
+            raise
+
+    async def get_catalogue_documents(self):
+        """Return (movie docs, cinema docs, catalogue version, changes through) for snapshot export"""
+        try:
+            with self._get_connection(readonly=True) as conn:
+                with conn.cursor() as cur:
+                    # One repeatable-read transaction so the reads agree
+                    cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+                    cur.execute("""
+                        SELECT movie_id, document::text
+                        FROM catalogue_movies
+                        ORDER BY title, movie_id
+                    """)
+                    movies = cur.fetchall()
+                    cur.execute("""
+                        SELECT cinema_id, document::text
+                        FROM catalogue_cinemas
+                        ORDER BY name, cinema_id
+                    """)
+                    cinemas = cur.fetchall()
+                    cur.execute("SELECT version, changes_through FROM catalogue_meta WHERE id = 1")
+                    version, changes_through = cur.fetchone() or (0, 0)
+                    return movies, cinemas, version, changes_through
+        except Exception as e:
+            logger.error(f"Error in get_catalogue_documents: {str(e)}")
+            raise
+
+    async def get_stats_snapshot(self) -> Dict:
+        """Collect table cardinalities and freshness without scanning tables.
+
+        Row counts are the live-tuple estimates kept in pg_stat_user_tables;
+        the rest comes from the small bookkeeping rows maintained at ingest.
+        """
+        try:
+            with self._get_connection(readonly=True) as conn:
+                with _dict_cursor(conn) as cur:
+                    cur.execute("""
+                        SELECT relname, n_live_tup
+                        FROM pg_stat_user_tables
+                        WHERE schemaname = current_schema()
+                          AND relname IN ('cinemas', 'movies', 'showtimes', 'users', 'movie_watches')
+                    """)
+                    counts = {row['relname']: row['n_live_tup'] for row in cur.fetchall()}
+
+                    cur.execute("""
+                        SELECT c.id, c.name, c.last_scraped,
+                               s.last_success, s.last_duration_ms, s.consecutive_failures,
+                               s.last_error, s.next_run
+                        FROM cinemas c
+                        LEFT JOIN scrape_status s ON s.cinema_id = c.id
+                        ORDER BY c.id
+                    """)
+                    last_scrapes = cur.fetchall()
+
+                    cur.execute("SELECT version, refreshed_at FROM catalogue_meta WHERE id = 1")
+                    meta = cur.fetchone()
+
+                    samples = {}
+                    for table in ('cinemas', 'movies', 'showtimes'):
+                        cur.execute(f"SELECT * FROM {table} LIMIT 2")
+                        samples[table] = cur.fetchall()
+
+                    return {
+                        'counts': counts,
+                        'last_scrapes': last_scrapes,
+                        'catalogue_version': meta['version'] if meta else 0,
+                        'catalogue_refreshed_at': meta['refreshed_at'] if meta else None,
+                        'samples': samples
+                    }
+        except Exception as e:
+            logger.error(f"Error in get_stats_snapshot: {str(e)}")
+            raise
+
+    async def get_scrape_schedule(self) -> List[Dict]:
+        """Every cinema with its scrape bookkeeping and next upcoming showtime"""
+        try:
+            with self._get_connection(readonly=True, fresh=True) as conn:
+                with _dict_cursor(conn) as cur:
+                    cur.execute("""
+                        SELECT c.id AS cinema_id, c.name,
+                               s.last_attempt, s.last_success, s.last_duration_ms,
+                               s.last_movie_count, COALESCE(s.consecutive_failures, 0) AS consecutive_failures,
+                               s.last_error, s.next_run,
+                               cc.next_showtime
+                        FROM cinemas c
+                        LEFT JOIN scrape_status s ON s.cinema_id = c.id
+                        LEFT JOIN catalogue_cinemas cc ON cc.cinema_id = c.id
+                        ORDER BY c.id
+                    """)
+                    return cur.fetchall()
+        except Exception as e:
+            logger.error(f"Database error in get_scrape_schedule: {str(e)}")
+            raise
+
+    async def schedule_scrape(self, cinema_id: str, next_run):
+        try:
+            with self._get_connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute("""
+                        INSERT INTO scrape_status (cinema_id, next_run) VALUES (%s, %s)
+                        ON CONFLICT (cinema_id) DO UPDATE SET next_run = EXCLUDED.next_run
+                    """, (cinema_id, next_run))
+        except Exception as e:
+            logger.error(f"Database error in schedule_scrape: {str(e)}")
+            raise
+
+    async def record_scrape_result(self, cinema_id: str, started_at, duration_ms: int, next_run,
+                                   movie_count: Optional[int] = None, error: Optional[str] = None):
+        """Store the outcome of one cinema scrape; failures keep the last success"""
+        try:
+            with self._get_connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute("""
+                        INSERT INTO scrape_status AS s (
+                            cinema_id, last_attempt, last_success, last_duration_ms,
+                            last_movie_count, consecutive_failures, last_error, next_run
+                        ) VALUES (
+                            %(cinema_id)s, %(started_at)s,
+                            CASE WHEN %(error)s::text IS NULL THEN %(started_at)s END,
+                            %(duration_ms)s, %(movie_count)s,
+                            CASE WHEN %(error)s::text IS NULL THEN 0 ELSE 1 END,
+                            %(error)s, %(next_run)s
+                        )
+                        ON CONFLICT (cinema_id) DO UPDATE SET
+                            last_attempt = EXCLUDED.last_attempt,
+                            last_success = COALESCE(EXCLUDED.last_success, s.last_success),
+                            last_duration_ms = EXCLUDED.last_duration_ms,
+                            last_movie_count = COALESCE(EXCLUDED.last_movie_count, s.last_movie_count),
+                            consecutive_failures = CASE WHEN EXCLUDED.last_error IS NULL THEN 0
+                                                        ELSE s.consecutive_failures + 1 END,
+                            last_error = EXCLUDED.last_error,
+                            next_run = EXCLUDED.next_run
+                    """, {
+                        'cinema_id': cinema_id,
+                        'started_at': started_at,
+                        'duration_ms': duration_ms,
+                        'movie_count': movie_count,
+                        'error': error,
+                        'next_run': next_run
+                    })
+        except Exception as e:
+            logger.error(f"Database error in record_scrape_result: {str(e)}")
+            raise
+
+    async def try_advisory_lock(self, key: int):
+        """Take a session-level advisory lock on a dedicated connection.
+
+        Returns the connection holding the lock (close it to release), or
+        None if another session already holds it.
+        """
+        conn = psycopg2.connect(**self.db_config)
+        try:
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute("SELECT pg_try_advisory_lock(%s)", (key,))
+                if cur.fetchone()[0]:
+                    return conn
+        except Exception as e:
+            logger.error(f"Database error in try_advisory_lock: {str(e)}")
+            conn.close()
+            raise
+        conn.close()
+        return None
+
+    async def get_catalogue_changes(self, since: int, limit: int = 1000) -> Dict:
+        """Up to `limit` logged changes after `since`, oldest first.
+
+        Also returns the newest sequence number (`last_seq`), the newest
+        pruned one (`pruned_through`): a client behind it missed changes, and
+        the newest one the catalogue read model reflects (`changes_through`).
+
+        Reads the primary: clients hold sequence numbers from its NOTIFYs,
+        which a lagging replica may not have reached yet.
+        """
+        try:
+            with self._get_connection(readonly=True, fresh=True) as conn:
+                with conn.cursor() as cur:
+                    cur.execute("""
+                        SELECT
+                            COALESCE((SELECT changes_pruned_through FROM catalogue_meta WHERE id = 1), 0),
+                            COALESCE((SELECT MAX(seq) FROM catalogue_changes), 0),
+                            COALESCE((SELECT changes_through FROM catalogue_meta WHERE id = 1), 0)
+                    """)
+                    pruned_through, last_seq, changes_through = cur.fetchone()
+                    last_seq = max(last_seq, pruned_through)
+                    cur.execute("""
+                        SELECT seq, change FROM catalogue_changes
+                        WHERE seq > %s AND seq <= %s
+                        ORDER BY seq
+                        LIMIT %s
+                    """, (since, last_seq, limit))
+                    changes = [dict(change, seq=seq) for seq, change in cur.fetchall()]
+                    return {'last_seq': last_seq, 'pruned_through': pruned_through,
+                            'changes_through': changes_through, 'changes': changes}
+        except Exception as e:
+            logger.error(f"Database error in get_catalogue_changes: {str(e)}")
+            raise
+
+    async def prune_catalogue_changes(self, retention_seconds: float) -> int:
+        """Drop changes older than `retention_seconds`; returns the new pruned_through"""
+        try:
+            with self._get_connection() as conn:
+                with conn.cursor() as cur:
+                    # Always a prefix of the log, whatever order the writers' clocks ran in
+                    cur.execute("""
+                        WITH cutoff AS (
+                            SELECT MAX(seq) AS seq FROM catalogue_changes
+                            WHERE created_at < CURRENT_TIMESTAMP - make_interval(secs => %s)
+                        ),
+                        pruned AS (
+                            DELETE FROM catalogue_changes WHERE seq <= (SELECT seq FROM cutoff)
+                        )
+                        INSERT INTO catalogue_meta (id, changes_pruned_through)
+                        SELECT 1, seq FROM cutoff WHERE seq IS NOT NULL
+                        ON CONFLICT (id) DO UPDATE SET
+                            changes_pruned_through = GREATEST(catalogue_meta.changes_pruned_through,
+                                                              EXCLUDED.changes_pruned_through)
+                    """, (retention_seconds,))
+                    cur.execute("SELECT COALESCE((SELECT changes_pruned_through FROM catalogue_meta WHERE id = 1), 0)")
+                    return cur.fetchone()[0]
+        except Exception as e:
+            logger.error(f"Database error in prune_catalogue_changes: {str(e)}")
+            raise
+
+    def open_change_listener(self):
+        """A dedicated autocommit connection LISTENing on CHANGES_CHANNEL (close it to stop)"""
+        conn = psycopg2.connect(**self.db_config)
+        try:
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute(f"LISTEN {CHANGES_CHANNEL}")
+            return conn
+        except Exception as e:
+            logger.error(f"Database error in open_change_listener: {str(e)}")
+            conn.close()
+            raise
+
+    async def lock_alive(self, conn) -> bool:
+        """Whether the session holding an advisory lock is still connected"""
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            return True
+        except psycopg2.Error:
+            return False
+
+    async def get_image_source(self, image_id: str) -> Optional[str]:
+        try:
+            with self._get_connection(readonly=True) as conn:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT url FROM image_sources WHERE id = %s", (image_id,))
+                    row = cur.fetchone()
+                    return row[0] if row else None
+        except Exception as e:
+            logger.error(f"Database error in get_image_source: {str(e)}")
+            raise
+
+    async def get_watches(self, after_id: int = 0) -> List[tuple]:
+        """(id, user_id, movie_id) of every watch with id > after_id, in id order"""
+        try:
+            with self._get_connection(readonly=True) as conn:
+                with conn.cursor() as cur:
+                    cur.execute(
+                        "SELECT id, user_id, movie_id FROM movie_watches WHERE id > %s ORDER BY id",
+                        (after_id,)
+                    )
+                    return cur.fetchall()
+        except Exception as e:
+            logger.error(f"Database error in get_watches: {str(e)}")
+            raise
+
+    async def get_playing_movie_ids(self) -> List[str]:
+        """Movies with an upcoming showtime as of the last catalogue refresh"""
+        try:
+            with self._get_connection(readonly=True) as conn:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT movie_id FROM catalogue_movies WHERE next_showtime IS NOT NULL")
+                    return [row[0] for row in cur.fetchall()]
+        except Exception as e:
+            logger.error(f"Database error in get_playing_movie_ids: {str(e)}")
+            raise
+
+    async def replace_movie_similar(self, rows: List[tuple]):
+        """Swap in a complete set of (movie_id, similar_id, score, rank) rows"""
+        try:
+            with self._get_connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute("DELETE FROM movie_similar")
+                    execute_values(cur, """
+                        INSERT INTO movie_similar (movie_id, similar_id, score, rank) VALUES %s
+                    """, rows, page_size=1000)
+        except Exception as e:
+            logger.error(f"Database error in replace_movie_similar: {str(e)}")
+            raise
+
+    async def replace_user_recommendations(self, user_ids: Optional[List[int]], rows: List[tuple]):
+        """Replace the (user_id, movie_id, score, rank) rows of `user_ids` (None: every user)"""
+        try:
+            with self._get_connection() as conn:
+                with conn.cursor() as cur:
+                    if user_ids is None:
+                        cur.execute("DELETE FROM user_recommendations")
+                    else:
+                        cur.execute("DELETE FROM user_recommendations WHERE user_id = ANY(%s)", (list(user_ids),))
+                    # Users deleted since their watches were read would fail the foreign key
+                    execute_values(cur, """
+                        INSERT INTO user_recommendations (user_id, movie_id, score, rank)
+                        SELECT v.user_id, v.movie_id, v.score, v.rank
+                        FROM (VALUES %s) AS v (user_id, movie_id, score, rank)
+                        WHERE EXISTS (SELECT 1 FROM users u WHERE u.id = v.user_id)
+                    """, rows, template="(%s::integer, %s::text, %s::real, %s::smallint)", page_size=1000)
+        except Exception as e:
+            logger.error(f"Database error in replace_user_recommendations: {str(e)}")
+            raise
+
+    async def get_similar_movies(self, movie_id: str, limit: int = 10) -> str:
+        """Catalogue documents of the playing movies most watched together with movie_id, as a JSON array"""
+        try:
+            with self._get_connection(readonly=True) as conn:
+                with conn.cursor() as cur:
+                    cur.execute("""
+                        SELECT (c.document || jsonb_build_object('score', s.score))::text
+                        FROM movie_similar s
+                        JOIN catalogue_movies c ON c.movie_id = s.similar_id
+                        WHERE s.movie_id = %s AND c.next_showtime IS NOT NULL
+                        ORDER BY s.rank
+                        LIMIT %s
+                    """, (movie_id, limit))
+                    return '[' + ','.join(row[0] for row in cur.fetchall()) + ']'
+        except Exception as e:
+            logger.error(f"Database error in get_similar_movies: {str(e)}")
+            raise
+
+    async def get_user_recommendations(self, user_id: int, limit: int = 10) -> str:
+        """Catalogue documents of the user's recommended playing movies, as a JSON array"""
+        try:
+            with self._get_connection(readonly=True) as conn:
+                with conn.cursor() as cur:
+                    cur.execute("""
+                        SELECT (c.document || jsonb_build_object('score', r.score))::text
+                        FROM user_recommendations r
+                        JOIN catalogue_movies c ON c.movie_id = r.movie_id
+                        WHERE r.user_id = %s AND c.next_showtime IS NOT NULL
+                        ORDER BY r.rank
+                        LIMIT %s
+                    """, (user_id, limit))
+                    return '[' + ','.join(row[0] for row in cur.fetchall()) + ']'
+        except Exception as e:
+            logger.error(f"Database error in get_user_recommendations: {str(e)}")
+            raise
+
+    async def get_catalogue_version(self) -> tuple:
+        """(version, refreshed_at) of the catalogue read model"""
+        try:
+            with self._get_connection(readonly=True) as conn:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT version, refreshed_at FROM catalogue_meta WHERE id = 1")
+                    return cur.fetchone() or (0, None)
+        except Exception as e:
+            logger.error(f"Database error in get_catalogue_version: {str(e)}")
+            raise
+
+    async def get_calendar_name(self, cinema_id: Optional[str] = None, movie_id: Optional[str] = None) -> Optional[str]:
+        """Display name of a cinema or movie feed, None when it doesn't exist"""
+        try:
+            with self._get_connection(readonly=True) as conn:
+                with conn.cursor() as cur:
+                    if cinema_id is not None:
+                        cur.execute("SELECT name FROM cinemas WHERE id = %s", (cinema_id,))
+                    else:
+                        cur.execute("SELECT title FROM movies WHERE id = %s", (movie_id,))
+                    row = cur.fetchone()
+                    return row[0] if row else None
+        except Exception as e:
+            logger.error(f"Database error in get_calendar_name: {str(e)}")
+            raise
+
+    def iter_calendar_showtimes(self, cinema_id: Optional[str] = None, movie_id: Optional[str] = None):
+        """Upcoming showtimes of one cinema or one movie, from today on, through a server-side cursor.
+
+        A plain generator like iter_users: consume it off the event loop.
+        """
+        try:
+            with self._get_connection(readonly=True) as conn:
+                with _dict_cursor(conn, name='calendar_showtimes') as cur:
+                    cur.itersize = 500
+                    cur.execute(f"""
+                        WITH {LIVE_SHOWTIMES_CTE}
+                        SELECT s.movie_id, s.cinema_id, s.starts_at, s.booking_link,
+                               m.title, m.duration, c.name AS cinema_name, c.latitude, c.longitude
+                        FROM live_showtimes s
+                        JOIN movies m ON m.id = s.movie_id
+                        JOIN cinemas c ON c.id = s.cinema_id
+                        WHERE s.starts_at >= date_trunc('day', s.now_local)
+                          AND (%(cinema_id)s::text IS NULL OR s.cinema_id = %(cinema_id)s)
+                          AND (%(movie_id)s::text IS NULL OR s.movie_id = %(movie_id)s)
+                        ORDER BY s.starts_at, m.title, c.name
+                    """, {'cinema_id': cinema_id, 'movie_id': movie_id})
+                    yield from cur
+        except Exception as e:
+            logger.error(f"Database error in iter_calendar_showtimes: {str(e)}")
+            raise
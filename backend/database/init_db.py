@@ -1,21 +1,33 @@
-import sqlite3
+import asyncio
 import os
+import sys
+
+if __package__:
+    from .sqlite_storage import SQLiteStorage
+else:  # run as a script
+    sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+    from backend.database.sqlite_storage import SQLiteStorage
+
 
 def init_db():
-    # Get the directory of the current file
+    """Create an empty embedded catalogue database, cinema.db, next to this file"""
     current_dir = os.path.dirname(os.path.abspath(__file__))
     db_path = os.path.join(current_dir, 'cinema.db')
-    
+
     # Remove existing database if it exists
-    if os.path.exists(db_path):
-        os.remove(db_path)
-    
-    # Create new database and tables
-    with sqlite3.connect(db_path) as conn:
-        with open(os.path.join(current_dir, 'schema.sql'), 'r') as f:
-            conn.executescript(f.read())
-        
-        print("Database initialized successfully!")
+    for path in (db_path, f"{db_path}-wal", f"{db_path}-shm"):
+        if os.path.exists(path):
+            os.remove(path)
+
+    async def create():
+        storage = SQLiteStorage(db_path)
+        try:
+            await storage._ensure_db_exists()
+        finally:
+            await storage.close_connections()
+
+    asyncio.run(create())
+    print("Database initialized successfully!")
 
 if __name__ == "__main__":
-    init_db()
\ No newline at end of file
+    init_db()
@@ -0,0 +1,268 @@
+"""Read replicas behind DatabaseManager.
+
+Each replica gets its own lazily created connection pool. A daemon thread
+measures every replica's replay lag each `check_interval` seconds; reads
+are spread round-robin over the replicas that answered the last check and
+are no more than `max_lag` seconds behind. A replica whose connection
+fails is taken out until the next successful check. When none qualifies
+the caller falls back to the primary.
+"""
+import asyncio
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+
+from psycopg2.pool import ThreadedConnectionPool
+
+try:
+    from utils.metrics import DB_REPLICA_LAG
+except ImportError:  # imported from the project root (scrapers, scripts)
+    from backend.utils.metrics import DB_REPLICA_LAG
+
+logger = logging.getLogger(__name__)
+
+# Seconds the replica is behind; 0 when it has replayed everything it
+# received (an idle primary does not make a replica "late") or when the
+# server is not in recovery at all.
+LAG_QUERY = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+
+
+def connection_pool(size: int, db_config: Dict) -> ThreadedConnectionPool:
+    """A pool that opens connections on demand and keeps up to `size` idle.
+
+    psycopg2 closes returned connections beyond `minconn`, so a pool built
+    with minconn=0 never reuses a session; raising minconn after
+    construction keeps them without opening any upfront.
+    """
+    pool = ThreadedConnectionPool(0, size, **db_config)
+    pool.minconn = size
+    return pool
+
+
+class _ThreadWaiter:
+    def __init__(self):
+        self.granted = False
+        self.event = threading.Event()
+
+    def grant(self) -> bool:
+        self.granted = True
+        self.event.set()
+        return True
+
+
+class _TaskWaiter:
+    def __init__(self, loop):
+        self.granted = False
+        self.loop = loop
+        self.future = loop.create_future()
+
+    def _wake(self):
+        if not self.future.done():
+            self.future.set_result(None)
+
+    def grant(self) -> bool:
+        try:
+            self.loop.call_soon_threadsafe(self._wake)
+        except RuntimeError:  # its loop has been closed
+            return False
+        self.granted = True
+        return True
+
+
+class ConnectionSlots:
+    """A bounded semaphore that threads and coroutines can both wait on.
+
+    Threads block in `acquire` as with threading.BoundedSemaphore;
+    coroutines await `acquire_async`, which never blocks their event loop.
+    A released slot goes straight to the longest waiting thread or
+    coroutine.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._free = size
+        self._lock = threading.Lock()
+        self._waiters = deque()
+
+    def _take(self, waiter=None) -> bool:
+        # Called with the lock held
+        if self._free and not self._waiters:
+            self._free -= 1
+            return True
+        if waiter is not None:
+            self._waiters.append(waiter)
+        return False
+
+    def _withdraw(self, waiter) -> bool:
+        """Stop waiting; True when the slot was granted meanwhile"""
+        with self._lock:
+            if waiter.granted:
+                return True
+            self._waiters.remove(waiter)
+            return False
+
+    def acquire(self, blocking: bool = True, timeout: Optional[float] = None) -> bool:
+        waiter = _ThreadWaiter() if blocking else None
+        with self._lock:
+            if self._take(waiter):
+                return True
+        if waiter is None:
+            return False
+        return waiter.event.wait(timeout) or self._withdraw(waiter)
+
+    async def acquire_async(self, timeout: Optional[float] = None) -> bool:
+        waiter = _TaskWaiter(asyncio.get_running_loop())
+        with self._lock:
+            if self._take(waiter):
+                return True
+        try:
+            await asyncio.wait_for(waiter.future, timeout)
+            return True
+        except asyncio.TimeoutError:
+            if self._withdraw(waiter):
+                self.release()
+            return False
+        except asyncio.CancelledError:
+            if self._withdraw(waiter):
+                self.release()
+            raise
+
+    def release(self):
+        with self._lock:
+            while self._waiters:
+                if self._waiters.popleft().grant():
+                    return
+            if self._free >= self.size:
+                raise ValueError("ConnectionSlots released too many times")
+            self._free += 1
+
+
+def parse_database_url(url: str) -> Dict:
+    result = urlparse(url)
+    return {
+        'dbname': result.path[1:],
+        'user': result.username,
+        'password': result.password,
+        'host': result.hostname,
+        'port': result.port
+    }
+
+
+class Replica:
+    def __init__(self, db_config: Dict, pool_size: int, connect_timeout: int = 3):
+        # A dead replica must not hold a request (or the checker) for long
+        self.db_config = {**db_config, 'connect_timeout': connect_timeout}
+        self.name = f"{db_config['host']}:{db_config['port']}"
+        self.pool_size = pool_size
+        self.pool = None
+        self.slots = ConnectionSlots(pool_size)
+        self.healthy = False
+        self.lag: Optional[float] = None
+        self.checked_at: Optional[float] = None
+        self._pool_lock = threading.Lock()
+
+    def get_pool(self) -> ThreadedConnectionPool:
+        if self.pool is None:
+            with self._pool_lock:
+                if self.pool is None:
+                    self.pool = connection_pool(self.pool_size, self.db_config)
+                    logger.info(f"Opened connection pool to replica {self.name}")
+        return self.pool
+
+    def measure_lag(self) -> float:
+        pool = self.get_pool()
+        conn = pool.getconn()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(LAG_QUERY)
+                lag = float(cur.fetchone()[0])
+            conn.rollback()
+            return lag
+        finally:
+            pool.putconn(conn, close=bool(conn.closed))
+
+    def check(self):
+        try:
+            self.lag = self.measure_lag()
+            if not self.healthy:
+                logger.info(f"Replica {self.name} is available (lag {self.lag:.1f}s)")
+            self.healthy = True
+            DB_REPLICA_LAG.labels(replica=self.name).set(self.lag)
+        except Exception as e:
+            self.mark_down(e)
+        self.checked_at = time.monotonic()
+
+    def mark_down(self, error: Exception):
+        if self.healthy:
+            logger.error(f"Replica {self.name} unavailable: {str(error)}")
+        self.healthy = False
+        self.lag = None
+        # Drop connections that may point at a dead server
+        with self._pool_lock:
+            if self.pool is not None:
+                self.pool.closeall()
+                self.pool = None
+
+    def close(self):
+        with self._pool_lock:
+            if self.pool is not None:
+                self.pool.closeall()
+                self.pool = None
+
+
+class ReplicaSet:
+    def __init__(self, urls: List[str], pool_size: int, max_lag: float = 5.0, check_interval: float = 5.0):
+        self.replicas = [Replica(parse_database_url(url), pool_size) for url in urls]
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._turn = itertools.count()
+        self._monitor: Optional[threading.Thread] = None
+        self._monitor_lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def check_all(self):
+        for replica in self.replicas:
+            replica.check()
+
+    def _watch(self):
+        while not self._stopped.is_set():
+            self.check_all()
+            self._stopped.wait(self.check_interval)
+
+    def _ensure_monitor(self):
+        # Started on first use so importing the API never waits on a replica
+        if self._monitor is None:
+            with self._monitor_lock:
+                if self._monitor is None:
+                    self._stopped.clear()
+                    self._monitor = threading.Thread(target=self._watch, name='replica-monitor', daemon=True)
+                    self._monitor.start()
+
+    def available(self) -> List[Replica]:
+        return [r for r in self.replicas if r.healthy and r.lag is not None and r.lag <= self.max_lag]
+
+    def choose(self) -> Optional[Replica]:
+        """A replica fit to serve a read, or None to use the primary"""
+        self._ensure_monitor()
+        candidates = self.available()
+        if not candidates:
+            return None
+        return candidates[next(self._turn) % len(candidates)]
+
+    def close(self):
+        self._stopped.set()
+        if self._monitor is not None:
+            self._monitor.join(timeout=self.check_interval + 5)
+            self._monitor = None
+        for replica in self.replicas:
+            replica.close()
@@ -56,4 +56,156 @@ CREATE TABLE IF NOT EXISTS movie_watches (
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
     FOREIGN KEY (movie_id) REFERENCES movies(id),
     FOREIGN KEY (cinema_id) REFERENCES cinemas(id)
-);
\ No newline at end of file
+);
+
+CREATE INDEX IF NOT EXISTS idx_showtimes_cinema ON showtimes(cinema_id);
+
+-- Denormalized catalogue read model, rebuilt at the end of each scrape
+CREATE TABLE IF NOT EXISTS catalogue_movies (
+    movie_id TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    next_showtime TIMESTAMP,
+    showtime_count INTEGER NOT NULL DEFAULT 0,
+    cinema_count INTEGER NOT NULL DEFAULT 0,
+    document JSONB NOT NULL,
+    refreshed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_catalogue_movies_title ON catalogue_movies(title, movie_id);
+
+CREATE TABLE IF NOT EXISTS catalogue_cinemas (
+    cinema_id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    next_showtime TIMESTAMP,
+    movie_count INTEGER NOT NULL DEFAULT 0,
+    showtime_count INTEGER NOT NULL DEFAULT 0,
+    document JSONB NOT NULL,
+    refreshed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_catalogue_cinemas_name ON catalogue_cinemas(name, cinema_id);
+
+-- Bookkeeping for the cached stats endpoints
+ALTER TABLE cinemas ADD COLUMN IF NOT EXISTS last_scraped TIMESTAMP;
+
+CREATE TABLE IF NOT EXISTS catalogue_meta (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version BIGINT NOT NULL DEFAULT 0,
+    refreshed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Per-cinema bookkeeping of the scrape scheduler
+CREATE TABLE IF NOT EXISTS scrape_status (
+    cinema_id TEXT PRIMARY KEY REFERENCES cinemas(id) ON DELETE CASCADE,
+    last_attempt TIMESTAMP,
+    last_success TIMESTAMP,
+    last_duration_ms INTEGER,
+    last_movie_count INTEGER,
+    consecutive_failures INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    next_run TIMESTAMP
+);
+
+-- Filled from the movie detail pages
+ALTER TABLE movies ADD COLUMN IF NOT EXISTS synopsis TEXT;
+ALTER TABLE movies ADD COLUMN IF NOT EXISTS director TEXT;
+ALTER TABLE movies ADD COLUMN IF NOT EXISTS cast_members JSONB;
+ALTER TABLE movies ADD COLUMN IF NOT EXISTS details_updated TIMESTAMP;
+
+-- Original image URLs the image proxy may fetch, keyed by md5(url)
+CREATE TABLE IF NOT EXISTS image_sources (
+    id TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Watch history pages are read newest first, by (watch_date, id)
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = 'movie_watches'
+          AND column_name = 'watch_date' AND is_nullable = 'YES'
+    ) THEN
+        UPDATE movie_watches SET watch_date = CURRENT_TIMESTAMP WHERE watch_date IS NULL;
+        ALTER TABLE movie_watches ALTER COLUMN watch_date SET NOT NULL;
+    END IF;
+END $$;
+CREATE INDEX IF NOT EXISTS idx_movie_watches_user_date ON movie_watches(user_id, watch_date DESC, id DESC);
+
+-- Per-user watch aggregates, updated in the same transaction as each watch
+CREATE TABLE IF NOT EXISTS user_watch_stats (
+    user_id INTEGER PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+    total_watches INTEGER NOT NULL DEFAULT 0,
+    first_watch TIMESTAMP,
+    last_watch TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS user_cinema_watches (
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    cinema_id TEXT NOT NULL,
+    watches INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, cinema_id)
+);
+
+CREATE TABLE IF NOT EXISTS user_genre_watches (
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    genre TEXT NOT NULL,
+    watches INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, genre)
+);
+
+-- One-off backfill from existing history; skipped once the aggregates exist
+INSERT INTO user_watch_stats (user_id, total_watches, first_watch, last_watch)
+SELECT user_id, COUNT(*), MIN(watch_date), MAX(watch_date)
+FROM movie_watches
+WHERE NOT EXISTS (SELECT 1 FROM user_watch_stats)
+GROUP BY user_id;
+
+INSERT INTO user_cinema_watches (user_id, cinema_id, watches)
+SELECT user_id, cinema_id, COUNT(*)
+FROM movie_watches
+WHERE NOT EXISTS (SELECT 1 FROM user_cinema_watches)
+GROUP BY user_id, cinema_id;
+
+INSERT INTO user_genre_watches (user_id, genre, watches)
+SELECT w.user_id, g.genre, COUNT(*)
+FROM movie_watches w
+JOIN movies m ON m.id = w.movie_id
+CROSS JOIN LATERAL (
+    SELECT DISTINCT trim(part) AS genre FROM regexp_split_to_table(m.genre, ',') AS part
+) g
+WHERE g.genre <> '' AND NOT EXISTS (SELECT 1 FROM user_genre_watches)
+GROUP BY w.user_id, g.genre;
+
+-- Precomputed top-K recommendations, written by scripts/build_recommendations.py
+CREATE TABLE IF NOT EXISTS movie_similar (
+    movie_id TEXT NOT NULL,
+    rank SMALLINT NOT NULL,
+    similar_id TEXT NOT NULL,
+    score REAL NOT NULL,
+    PRIMARY KEY (movie_id, rank)
+);
+
+CREATE TABLE IF NOT EXISTS user_recommendations (
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    rank SMALLINT NOT NULL,
+    movie_id TEXT NOT NULL,
+    score REAL NOT NULL,
+    PRIMARY KEY (user_id, rank)
+);
+
+-- Append-only log of catalogue changes behind GET /api/catalogue/changes.
+-- Sequence numbers are handed out under an advisory lock held until commit,
+-- so they become visible in order.
+CREATE TABLE IF NOT EXISTS catalogue_changes (
+    seq BIGSERIAL PRIMARY KEY,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    change JSONB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_catalogue_changes_created ON catalogue_changes(created_at);
+-- Clients that synced before this sequence number must download everything again
+ALTER TABLE catalogue_meta ADD COLUMN IF NOT EXISTS changes_pruned_through BIGINT NOT NULL DEFAULT 0;
+-- Newest change already reflected in the read model: where a client that
+-- downloaded the full catalogue continues from
+ALTER TABLE catalogue_meta ADD COLUMN IF NOT EXISTS changes_through BIGINT NOT NULL DEFAULT 0;
@@ -0,0 +1,83 @@
+-- Embedded counterpart of schema.sql for SQLiteStorage, limited to the
+-- catalogue tables. Same tables and columns; JSON documents are stored as
+-- TEXT and timestamps as ISO 8601 strings.
+CREATE TABLE IF NOT EXISTS cinemas (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    cinema_chain TEXT NOT NULL,
+    latitude FLOAT,
+    longitude FLOAT,
+    website TEXT,
+    icon_url TEXT,
+    last_updated TIMESTAMP,
+    last_scraped TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS movies (
+    id TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    genre TEXT,
+    duration INTEGER,
+    language TEXT,
+    poster_url TEXT,
+    last_updated TIMESTAMP,
+    synopsis TEXT,
+    director TEXT,
+    cast_members TEXT,
+    details_updated TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS showtimes (
+    id INTEGER PRIMARY KEY,
+    movie_id TEXT REFERENCES movies(id),
+    cinema_id TEXT REFERENCES cinemas(id),
+    date TEXT NOT NULL,
+    time TEXT NOT NULL,
+    booking_link TEXT,
+    last_updated TIMESTAMP,
+    UNIQUE(movie_id, cinema_id, date, time)
+);
+
+CREATE INDEX IF NOT EXISTS idx_showtimes_cinema ON showtimes(cinema_id);
+
+-- Denormalized catalogue read model, rebuilt at the end of each scrape
+CREATE TABLE IF NOT EXISTS catalogue_movies (
+    movie_id TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    next_showtime TIMESTAMP,
+    showtime_count INTEGER NOT NULL DEFAULT 0,
+    cinema_count INTEGER NOT NULL DEFAULT 0,
+    document TEXT NOT NULL,
+    refreshed_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_catalogue_movies_title ON catalogue_movies(title, movie_id);
+
+CREATE TABLE IF NOT EXISTS catalogue_cinemas (
+    cinema_id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    next_showtime TIMESTAMP,
+    movie_count INTEGER NOT NULL DEFAULT 0,
+    showtime_count INTEGER NOT NULL DEFAULT 0,
+    document TEXT NOT NULL,
+    refreshed_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_catalogue_cinemas_name ON catalogue_cinemas(name, cinema_id);
+
+CREATE TABLE IF NOT EXISTS catalogue_meta (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version BIGINT NOT NULL DEFAULT 0,
+    refreshed_at TIMESTAMP,
+    changes_pruned_through BIGINT NOT NULL DEFAULT 0,
+    -- Newest catalogue_changes sequence number the read model reflects. There
+    -- is no change log here, so a rebuild keeps the value it finds.
+    changes_through BIGINT NOT NULL DEFAULT 0
+);
+
+-- Original image URLs the image proxy may fetch, keyed by md5(url)
+CREATE TABLE IF NOT EXISTS image_sources (
+    id TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    created_at TIMESTAMP
+);
@@ -0,0 +1,354 @@
+"""Embedded SQLite implementation of CatalogueStorage.
+
+It stores the same catalogue tables as the Postgres schema (see
+schema_sqlite.sql) behind the same methods, and builds the same read model
+documents, so tests and benchmarks can run the ingestion and catalogue paths
+in-process against a file or `:memory:`. Catalogue change events (NOTIFY and
+the catalogue_changes log) are Postgres-only and not produced here, so
+catalogue_meta.changes_through never advances: a snapshot published from
+this storage tells delta-sync clients to resync from sequence 0 (or from
+whatever value the file was given).
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from .storage import CatalogueStorage
+
+logger = logging.getLogger(__name__)
+
+LOCAL_TZ = ZoneInfo('Europe/Rome')
+_DATE = re.compile(r'^\d{2}-\d{2}-\d{4}$')
+_TIME = re.compile(r'^\d{1,2}:\d{2}$')
+
+
+def _now() -> str:
+    return datetime.utcnow().isoformat()
+
+
+def _starts_at(date: str, time: str) -> Optional[datetime]:
+    """The showtime start, parsed the way LIVE_SHOWTIMES_CTE does"""
+    if not (_DATE.match(date or '') and _TIME.match(time or '')):
+        return None
+    return datetime.strptime(f"{date} {time}", '%d-%m-%Y %H:%M')
+
+
+def _proxied_image(url: Optional[str], image_base: Optional[str]) -> Optional[str]:
+    if image_base and url and re.match(r'^https?://', url):
+        return f"{image_base}/{hashlib.md5(url.encode('utf-8')).hexdigest()}"
+    return url
+
+
+def _movie_row(row: sqlite3.Row) -> Dict:
+    movie = dict(row)
+    if movie.get('cast_members'):
+        movie['cast_members'] = json.loads(movie['cast_members'])
+    return movie
+
+
+class SQLiteStorage(CatalogueStorage):
+    def __init__(self, path: str, readonly: bool = False):
+        self.path = path
+        self.readonly = readonly
+        self._conn: Optional[sqlite3.Connection] = None
+        # One connection, used by one caller at a time
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if self.readonly:
+                conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+            else:
+                conn = sqlite3.connect(self.path, check_same_thread=False)
+                if self.path != ':memory:':
+                    conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA foreign_keys=ON")
+            conn.row_factory = sqlite3.Row
+            self._conn = conn
+        return self._conn
+
+    @contextmanager
+    def _get_connection(self, readonly: bool = False, fresh: bool = False):
+        """Same contract as DatabaseManager._get_connection: commit on success, roll back on error"""
+        with self._lock:
+            conn = self._connect()
+            try:
+                yield conn
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    async def _ensure_db_exists(self):
+        try:
+            with self._get_connection() as conn:
+                with open(os.path.join(os.path.dirname(__file__), 'schema_sqlite.sql'), 'r') as f:
+                    conn.executescript(f.read())
+                # Files created before catalogue_meta.changes_through existed
+                meta_columns = {row['name'] for row in conn.execute("PRAGMA table_info(catalogue_meta)")}
+                if 'changes_through' not in meta_columns:
+                    conn.execute("ALTER TABLE catalogue_meta ADD COLUMN changes_through BIGINT NOT NULL DEFAULT 0")
+            logger.info(f"SQLite tables verified/created in {self.path}")
+        except Exception as e:
+            logger.error(f"Error ensuring database exists: {e}")
+            raise
+
+    async def test_connection(self):
+        with self._get_connection(readonly=True) as conn:
+            version = conn.execute("SELECT sqlite_version()").fetchone()[0]
+            logger.info(f"Successfully opened SQLite {version}: {self.path}")
+            return True
+
+    async def close_connections(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+        return True
+
+    async def update_cinemas(self, cinemas: List[Dict]):
+        with self._get_connection() as conn:
+            conn.executemany("""
+                INSERT INTO cinemas
+                (id, name, cinema_chain, latitude, longitude, website, icon_url, last_updated)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (id) DO UPDATE SET
+                    name = excluded.name,
+                    cinema_chain = excluded.cinema_chain,
+                    latitude = excluded.latitude,
+                    longitude = excluded.longitude,
+                    website = excluded.website,
+                    icon_url = excluded.icon_url,
+                    last_updated = excluded.last_updated
+            """, [(
+                cinema['id'],
+                cinema['name'],
+                cinema['cinema_chain'],
+                cinema['latitude'],
+                cinema['longitude'],
+                cinema['website'],
+                cinema.get('icon_url', ''),
+                _now()
+            ) for cinema in cinemas])
+
+    async def update_movies_and_showtimes(self, cinema_id: str, movies: List[Dict], prune_missing: bool = False):
+        """Store a cinema's programme; with `prune_missing`, drop its upcoming showtimes no longer listed"""
+        now = _now()
+        with self._get_connection() as conn:
+            listed = set()
+            for movie in movies:
+                conn.execute("""
+                    INSERT INTO movies
+                    (id, title, genre, duration, language, poster_url, last_updated)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (id) DO UPDATE SET
+                        title = excluded.title,
+                        genre = excluded.genre,
+                        duration = excluded.duration,
+                        language = excluded.language,
+                        poster_url = excluded.poster_url,
+                        last_updated = excluded.last_updated
+                """, (movie['id'], movie['title'], movie['genre'], movie['duration'],
+                      movie['language'], movie['poster_url'], now))
+
+                details = movie.get('details')
+                if details:
+                    conn.execute("""
+                        UPDATE movies SET
+                            synopsis = COALESCE(?, synopsis),
+                            director = COALESCE(?, director),
+                            cast_members = COALESCE(?, cast_members),
+                            duration = CASE WHEN COALESCE(duration, 0) = 0 THEN ? ELSE duration END,
+                            poster_url = COALESCE(NULLIF(poster_url, ''), ?),
+                            details_updated = ?
+                        WHERE id = ?
+                    """, (
+                        details.get('synopsis'),
+                        details.get('director'),
+                        json.dumps(details['cast']) if details.get('cast') else None,
+                        details.get('runtime'),
+                        details.get('poster_url'),
+                        now,
+                        movie['id']
+                    ))
+
+                conn.executemany("""
+                    INSERT INTO showtimes
+                    (movie_id, cinema_id, date, time, booking_link, last_updated)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (movie_id, cinema_id, date, time) DO UPDATE SET
+                        booking_link = excluded.booking_link,
+                        last_updated = excluded.last_updated
+                """, [(movie['id'], cinema_id, showtime['date'], showtime['time'], showtime['booking_link'], now)
+                      for showtime in movie['showtimes']])
+                listed.update((movie['id'], showtime['date'], showtime['time']) for showtime in movie['showtimes'])
+
+            # As on Postgres, an empty scrape never clears the cinema
+            if prune_missing and movies:
+                local_now = datetime.now(LOCAL_TZ).replace(tzinfo=None)
+                stale = [
+                    row['id'] for row in conn.execute(
+                        "SELECT id, movie_id, date, time FROM showtimes WHERE cinema_id = ?", (cinema_id,)
+                    )
+                    if (row['movie_id'], row['date'], row['time']) not in listed
+                    and (_starts_at(row['date'], row['time']) or datetime.min) >= local_now
+                ]
+                conn.executemany("DELETE FROM showtimes WHERE id = ?", [(showtime_id,) for showtime_id in stale])
+
+            conn.execute("UPDATE cinemas SET last_scraped = ? WHERE id = ?", (now, cinema_id))
+
+    async def refresh_catalogue(self):
+        """Rebuild the catalogue read model, with the same documents as the Postgres one"""
+        image_base = os.getenv('IMAGE_PROXY_BASE_URL', '').rstrip('/') or None
+        now = _now()
+        local_now = datetime.now(LOCAL_TZ).replace(tzinfo=None)
+        try:
+            with self._get_connection() as conn:
+                movies = {row['id']: _movie_row(row) for row in conn.execute("SELECT * FROM movies")}
+                cinemas = {row['id']: dict(row) for row in conn.execute("SELECT * FROM cinemas")}
+
+                conn.executemany(
+                    "INSERT INTO image_sources (id, url, created_at) VALUES (?, ?, ?) ON CONFLICT (id) DO NOTHING",
+                    [(hashlib.md5(url.encode('utf-8')).hexdigest(), url, now)
+                     for url in {m['poster_url'] for m in movies.values()} | {c['icon_url'] for c in cinemas.values()}
+                     if url and re.match(r'^https?://', url)]
+                )
+
+                by_movie: Dict[str, List[sqlite3.Row]] = {}
+                by_cinema: Dict[str, Dict[str, List[sqlite3.Row]]] = {}
+                for row in conn.execute("SELECT * FROM showtimes WHERE cinema_id IN (SELECT id FROM cinemas) "
+                                        "ORDER BY date, time"):
+                    by_movie.setdefault(row['movie_id'], []).append(row)
+                    by_cinema.setdefault(row['cinema_id'], {}).setdefault(row['movie_id'], []).append(row)
+
+                def next_showtime(rows) -> Optional[str]:
+                    upcoming = [start for start in (_starts_at(r['date'], r['time']) for r in rows)
+                                if start is not None and start >= local_now]
+                    return min(upcoming).isoformat() if upcoming else None
+
+                movie_rows = []
+                for movie_id, movie in movies.items():
+                    showtimes = by_movie.get(movie_id, [])
+                    names = sorted({cinemas[s['cinema_id']]['name'] for s in showtimes})
+                    upcoming = next_showtime(showtimes)
+                    document = dict(movie, **{
+                        'cinemas': ', '.join(names) if names else None,
+                        'cinema_list': names,
+                        'showtimes': [{
+                            'date': s['date'], 'time': s['time'],
+                            'cinema': cinemas[s['cinema_id']]['name'], 'booking_link': s['booking_link']
+                        } for s in showtimes],
+                        'showtime_count': len(showtimes),
+                        'next_showtime': upcoming,
+                        'poster_url': _proxied_image(movie['poster_url'], image_base)
+                    })
+                    movie_rows.append((movie_id, movie['title'], upcoming, len(showtimes),
+                                       len({s['cinema_id'] for s in showtimes}), json.dumps(document), now))
+
+                cinema_rows = []
+                for cinema_id, cinema in cinemas.items():
+                    programme = by_cinema.get(cinema_id, {})
+                    current = sorted((
+                        dict(movies[movie_id], **{
+                            'showtimes': [{'date': s['date'], 'time': s['time'], 'booking_link': s['booking_link']}
+                                          for s in showtimes],
+                            'poster_url': _proxied_image(movies[movie_id]['poster_url'], image_base)
+                        })
+                        for movie_id, showtimes in programme.items() if movie_id in movies
+                    ), key=lambda movie: movie['title'])
+                    showtime_count = sum(len(showtimes) for showtimes in programme.values())
+                    upcoming = next_showtime([s for showtimes in programme.values() for s in showtimes])
+                    document = dict(cinema, **{
+                        'currentMovies': current,
+                        'movie_count': len(current),
+                        'showtime_count': showtime_count,
+                        'next_showtime': upcoming,
+                        'icon_url': _proxied_image(cinema['icon_url'], image_base)
+                    })
+                    cinema_rows.append((cinema_id, cinema['name'], upcoming, len(current), showtime_count,
+                                        json.dumps(document), now))
+
+                conn.execute("DELETE FROM catalogue_movies")
+                conn.executemany("""
+                    INSERT INTO catalogue_movies
+                    (movie_id, title, next_showtime, showtime_count, cinema_count, document, refreshed_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                """, movie_rows)
+                conn.execute("DELETE FROM catalogue_cinemas")
+                conn.executemany("""
+                    INSERT INTO catalogue_cinemas
+                    (cinema_id, name, next_showtime, movie_count, showtime_count, document, refreshed_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                """, cinema_rows)
+                conn.execute("""
+                    INSERT INTO catalogue_meta (id, version, refreshed_at)
+                    VALUES (1, 1, ?)
+                    ON CONFLICT (id) DO UPDATE SET
+                        version = catalogue_meta.version + 1,
+                        refreshed_at = excluded.refreshed_at
+                """, (now,))
+            logger.info("Catalogue read model refreshed")
+        except Exception as e:
+            logger.error(f"Error refreshing catalogue: {str(e)}")
+            raise
+
+    async def ensure_catalogue(self):
+        with self._get_connection(readonly=True) as conn:
+            populated = conn.execute("SELECT EXISTS (SELECT 1 FROM catalogue_movies)").fetchone()[0]
+        if not populated:
+            await self.refresh_catalogue()
+
+    async def get_catalogue_movies(self) -> str:
+        with self._get_connection(readonly=True) as conn:
+            rows = conn.execute("SELECT document FROM catalogue_movies ORDER BY title, movie_id").fetchall()
+        return '[' + ','.join(row[0] for row in rows) + ']'
+
+    async def get_catalogue_movie(self, movie_id: str) -> Optional[str]:
+        with self._get_connection(readonly=True) as conn:
+            row = conn.execute("SELECT document FROM catalogue_movies WHERE movie_id = ?", (movie_id,)).fetchone()
+        return row[0] if row else None
+
+    async def get_catalogue_cinemas(self) -> str:
+        with self._get_connection(readonly=True) as conn:
+            rows = conn.execute("SELECT document FROM catalogue_cinemas ORDER BY name, cinema_id").fetchall()
+        return '[' + ','.join(row[0] for row in rows) + ']'
+
+    async def get_catalogue_cinema(self, cinema_id: str) -> Optional[str]:
+        with self._get_connection(readonly=True) as conn:
+            row = conn.execute("SELECT document FROM catalogue_cinemas WHERE cinema_id = ?", (cinema_id,)).fetchone()
+        return row[0] if row else None
+
+    async def get_catalogue_documents(self):
+        # A single locked connection, so the reads agree
+        with self._get_connection(readonly=True) as conn:
+            movies = [tuple(row) for row in conn.execute(
+                "SELECT movie_id, document FROM catalogue_movies ORDER BY title, movie_id")]
+            cinemas = [tuple(row) for row in conn.execute(
+                "SELECT cinema_id, document FROM catalogue_cinemas ORDER BY name, cinema_id")]
+            row = conn.execute("SELECT version, changes_through FROM catalogue_meta WHERE id = 1").fetchone()
+        version, changes_through = tuple(row) if row else (0, 0)
+        return movies, cinemas, version, changes_through
+
+    async def get_catalogue_version(self) -> Tuple:
+        with self._get_connection(readonly=True) as conn:
+            row = conn.execute("SELECT version, refreshed_at FROM catalogue_meta WHERE id = 1").fetchone()
+        if row is None:
+            return 0, None
+        return row[0], datetime.fromisoformat(row[1]) if row[1] else None
+
+    async def get_cinema_by_id(self, cinema_id: str) -> Optional[Dict]:
+        with self._get_connection(readonly=True) as conn:
+            row = conn.execute("""
+                SELECT id, name, cinema_chain, latitude, longitude, website
+                FROM cinemas
+                WHERE id = ?
+            """, (cinema_id,)).fetchone()
+        return dict(row) if row else None
@@ -0,0 +1,194 @@
+"""Server-side prepared statements for DatabaseManager's hottest queries.
+
+Each statement is PREPAREd the first time it runs on a pooled connection and
+EXECUTEd by name afterwards, so Postgres parses and analyses it once per
+connection and can reuse its cached plan instead of re-planning every call.
+Prepared statements belong to the session, so DB_PREPARED_STATEMENTS=false
+turns them off behind poolers that share sessions between clients (e.g.
+PgBouncer in transaction mode); the same SQL is then sent inline.
+
+Statements list their result columns rather than selecting `*`, so adding a
+column (the schema is applied while workers already serve requests) does not
+invalidate them. A prepared statement whose result type changes anyway fails
+with "cached plan must not change result type"; the registry then drops
+every statement of that session, and reads are retried once.
+"""
+import re
+import threading
+import time
+import weakref
+from typing import Dict, Sequence
+
+from psycopg2.errors import FeatureNotSupported
+
+try:
+    from utils.metrics import DB_STATEMENT_DURATION
+except ImportError:  # imported from the project root (scrapers, scripts)
+    from backend.utils.metrics import DB_STATEMENT_DURATION
+
+MOVIE_COLUMNS = """m.id, m.title, m.genre, m.duration, m.language, m.poster_url, m.last_updated,
+        m.synopsis, m.director, m.cast_members, m.details_updated"""
+
+# Written with $n placeholders, as PREPARE expects
+STATEMENTS = {
+    'all_movies': f"""
+        SELECT DISTINCT {MOVIE_COLUMNS},
+            (
+                SELECT string_agg(DISTINCT c.name, ', ')
+                FROM showtimes s
+                JOIN cinemas c ON s.cinema_id = c.id
+                WHERE s.movie_id = m.id
+            ) as cinemas,
+            (
+                SELECT jsonb_agg(
+                    jsonb_build_object(
+                        'date', s.date,
+                        'time', s.time,
+                        'cinema', c.name,
+                        'booking_link', s.booking_link
+                    )
+                )
+                FROM showtimes s
+                JOIN cinemas c ON s.cinema_id = c.id
+                WHERE s.movie_id = m.id
+            ) as showtimes
+        FROM movies m
+        ORDER BY m.title
+    """,
+    'cinema_movies': f"""
+        SELECT DISTINCT {MOVIE_COLUMNS},
+        (
+            SELECT jsonb_agg(
+                jsonb_build_object(
+                    'date', s.date,
+                    'time', s.time,
+                    'booking_link', s.booking_link
+                )
+            )
+            FROM showtimes s
+            WHERE s.movie_id = m.id AND s.cinema_id = $1
+        ) as showtimes
+        FROM movies m
+        JOIN showtimes s ON m.id = s.movie_id
+        WHERE s.cinema_id = $1
+    """,
+    'user_by_email': """
+        SELECT id, email, password, nome, cognome, citta, cap, data_nascita, telefono,
+            created_at, profile_picture, email_verified
+        FROM users WHERE email = $1
+    """,
+    'upsert_movie': """
+        INSERT INTO movies
+        (id, title, genre, duration, language, poster_url)
+        VALUES ($1, $2, $3, $4, $5, $6)
+        ON CONFLICT (id) DO UPDATE SET
+            title = EXCLUDED.title,
+            genre = EXCLUDED.genre,
+            duration = EXCLUDED.duration,
+            language = EXCLUDED.language,
+            poster_url = EXCLUDED.poster_url,
+            last_updated = CURRENT_TIMESTAMP
+        RETURNING (xmax = 0) AS inserted
+    """,
+    # The programme page wins for runtime and poster when it has them
+    'update_movie_details': """
+        UPDATE movies SET
+            synopsis = COALESCE($1, synopsis),
+            director = COALESCE($2, director),
+            cast_members = COALESCE($3::jsonb, cast_members),
+            duration = CASE WHEN COALESCE(duration, 0) = 0 THEN $4 ELSE duration END,
+            poster_url = COALESCE(NULLIF(poster_url, ''), $5),
+            details_updated = CURRENT_TIMESTAMP
+        WHERE id = $6
+    """,
+    # The CTE reads the row as it was before the upsert, to tell a changed
+    # booking link from a showtime that was merely seen again
+    'upsert_showtime': """
+        WITH previous AS (
+            SELECT booking_link FROM showtimes
+            WHERE movie_id = $1 AND cinema_id = $2 AND date = $3 AND time = $4
+        )
+        INSERT INTO showtimes
+        (movie_id, cinema_id, date, time, booking_link)
+        VALUES ($1, $2, $3, $4, $5)
+        ON CONFLICT (movie_id, cinema_id, date, time) DO UPDATE SET
+            booking_link = EXCLUDED.booking_link,
+            last_updated = CURRENT_TIMESTAMP
+        RETURNING (xmax = 0) AS inserted,
+            booking_link IS DISTINCT FROM (SELECT booking_link FROM previous) AS changed
+    """,
+    'touch_cinema': "UPDATE cinemas SET last_scraped = CURRENT_TIMESTAMP WHERE id = $1",
+}
+
+# Read-only statements, run under a savepoint so that a failed EXECUTE can be
+# retried in the same transaction
+READS = {'all_movies', 'cinema_movies', 'user_by_email'}
+
+_PLACEHOLDER = re.compile(r'\$(\d+)')
+
+
+def _param_count(sql: str) -> int:
+    return max((int(n) for n in _PLACEHOLDER.findall(sql)), default=0)
+
+
+def _inline_sql(sql: str) -> str:
+    """The statement in psycopg2 pyformat, for running it unprepared"""
+    return _PLACEHOLDER.sub(lambda m: f"%(p{m.group(1)})s", sql.replace('%', '%%'))
+
+
+class StatementRegistry:
+    def __init__(self, statements: Dict[str, str] = STATEMENTS, enabled: bool = True):
+        self.statements = statements
+        self.enabled = enabled
+        self._param_counts = {name: _param_count(sql) for name, sql in statements.items()}
+        self._inline = {name: _inline_sql(sql) for name, sql in statements.items()}
+        # Statement names prepared on each live connection
+        self._prepared = weakref.WeakKeyDictionary()
+        # Connections whose prepared statements must all be dropped
+        self._stale = weakref.WeakSet()
+        self._lock = threading.Lock()
+
+    def prepared_on(self, conn) -> set:
+        with self._lock:
+            return self._prepared.setdefault(conn, set())
+
+    def execute(self, cur, name: str, params: Sequence = (), retry: bool = True):
+        """Run a registered statement on `cur`, preparing it on first use"""
+        params = tuple(params)
+        if len(params) != self._param_counts[name]:
+            raise ValueError(f"Statement {name} takes {self._param_counts[name]} parameters, got {len(params)}")
+
+        if not self.enabled:
+            started = time.perf_counter()
+            cur.execute(self._inline[name], {f"p{i}": value for i, value in enumerate(params, 1)})
+            DB_STATEMENT_DURATION.labels(statement=name, phase='inline').observe(time.perf_counter() - started)
+            return cur
+
+        prepared = self.prepared_on(cur.connection)
+        if cur.connection in self._stale:
+            cur.execute("DEALLOCATE ALL")
+            self._stale.discard(cur.connection)
+        if name not in prepared:
+            started = time.perf_counter()
+            cur.execute(f"PREPARE {name} AS {self.statements[name]}")
+            DB_STATEMENT_DURATION.labels(statement=name, phase='prepare').observe(time.perf_counter() - started)
+            # PREPARE is not transactional: the statement outlives a rollback
+            prepared.add(name)
+
+        started = time.perf_counter()
+        sql = f"EXECUTE {name} ({', '.join(['%s'] * len(params))})" if params else f"EXECUTE {name}"
+        savepoint = retry and name in READS
+        try:
+            # One round trip: the result is the EXECUTE's
+            cur.execute(f"SAVEPOINT {name}; {sql}" if savepoint else sql, params or None)
+        except FeatureNotSupported:
+            # The schema changed under this session's prepared statements
+            with self._lock:
+                prepared.clear()
+                self._stale.add(cur.connection)
+            if not savepoint:
+                raise
+            cur.execute(f"ROLLBACK TO SAVEPOINT {name}")
+            return self.execute(cur, name, params, retry=False)
+        DB_STATEMENT_DURATION.labels(statement=name, phase='execute').observe(time.perf_counter() - started)
+        return cur
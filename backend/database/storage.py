@@ -0,0 +1,93 @@
+"""Storage backends behind the catalogue.
+
+`CatalogueStorage` is the query interface the scrapers, the scheduler, the
+snapshot publisher and the catalogue endpoints rely on. DatabaseManager
+implements it (and everything else the API needs) on Postgres;
+SQLiteStorage implements it on an embedded SQLite file, for tests, local
+benchmarks and development without a database server.
+"""
+import os
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+
+class CatalogueStorage(ABC):
+    @abstractmethod
+    async def _ensure_db_exists(self):
+        """Create or migrate the schema"""
+
+    @abstractmethod
+    async def test_connection(self):
+        ...
+
+    @abstractmethod
+    async def close_connections(self):
+        ...
+
+    @abstractmethod
+    async def update_cinemas(self, cinemas: List[Dict]):
+        ...
+
+    @abstractmethod
+    async def update_movies_and_showtimes(self, cinema_id: str, movies: List[Dict], prune_missing: bool = False):
+        """Store a cinema's programme; `prune_missing` treats it as the whole current programme"""
+
+    @abstractmethod
+    async def refresh_catalogue(self):
+        """Rebuild the catalogue read model from the scraped tables"""
+
+    @abstractmethod
+    async def ensure_catalogue(self):
+        ...
+
+    @abstractmethod
+    async def get_catalogue_movies(self) -> str:
+        ...
+
+    @abstractmethod
+    async def get_catalogue_movie(self, movie_id: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    async def get_catalogue_cinemas(self) -> str:
+        ...
+
+    @abstractmethod
+    async def get_catalogue_cinema(self, cinema_id: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    async def get_catalogue_documents(self):
+        """(movie docs, cinema docs, catalogue version, newest logged change they reflect), read consistently"""
+
+    @abstractmethod
+    async def get_catalogue_version(self) -> Tuple:
+        ...
+
+    @abstractmethod
+    async def get_cinema_by_id(self, cinema_id: str) -> Optional[Dict]:
+        ...
+
+
+def sqlite_location(url: str) -> Tuple[str, bool]:
+    """(file path, read-only) of a sqlite:///relative.db or sqlite:////absolute.db URL"""
+    parsed = urlparse(url)
+    path = parsed.path[1:] if parsed.path.startswith('/') else parsed.path
+    if not path:
+        raise ValueError(f"No database file in {url}")
+    readonly = parse_qs(parsed.query).get('mode') == ['ro']
+    return path, readonly
+
+
+def open_storage(url: Optional[str] = None) -> CatalogueStorage:
+    """The backend for `url` (default STORAGE_URL): SQLite for sqlite:// URLs, Postgres otherwise"""
+    url = url if url is not None else os.getenv('STORAGE_URL', '')
+    if url.startswith('sqlite:'):
+        from .sqlite_storage import SQLiteStorage
+        path, readonly = sqlite_location(url)
+        return SQLiteStorage(path, readonly=readonly)
+
+    # Postgres is configured through DATABASE_URL / LOCAL_DATABASE_URL
+    from .db_manager import DatabaseManager
+    return DatabaseManager()
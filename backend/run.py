@@ -1,9 +1,51 @@
+import argparse
 import uvicorn
 import os
+import shutil
 import sys
+import tempfile
 
 # Add the project root to Python path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+def run_production(workers: int):
+    """Serve with several worker processes sharing one catalogue snapshot.
+
+    Workers read the catalogue from CATALOGUE_SNAPSHOT_PATH (published by the
+    scraper) and Prometheus metrics are aggregated across processes.
+    """
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+
+    # Must be set before any worker imports prometheus_client
+    metrics_dir = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if not metrics_dir:
+        metrics_dir = os.path.join(tempfile.gettempdir(), "stacco-metrics")
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = metrics_dir
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir, exist_ok=True)
+
+    if not os.getenv("CATALOGUE_SNAPSHOT_PATH"):
+        print("CATALOGUE_SNAPSHOT_PATH is not set: every worker will read the catalogue from Postgres")
+
+    uvicorn.run(
+        "api.main:app",
+        host="0.0.0.0",
+        port=int(os.getenv("PORT", 8000)),
+        workers=workers,
+        proxy_headers=True,
+        forwarded_allow_ips="*"
+    )
+
 if __name__ == "__main__":
-    uvicorn.run("backend.api.main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Run the Stacco API")
+    parser.add_argument(
+        "--workers", type=int,
+        help="Production mode with this many worker processes (0 = one per CPU)"
+    )
+    args = parser.parse_args()
+
+    if args.workers is None:
+        uvicorn.run("backend.api.main:app", host="0.0.0.0", port=8000, reload=True)
+    else:
+        run_production(args.workers)
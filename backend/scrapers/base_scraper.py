@@ -1,3 +1,7 @@
+class PageNotFound(Exception):
+    """The site answered 404; retrying will not help"""
+
+
 class BaseScraper:
     def __init__(self):
         pass
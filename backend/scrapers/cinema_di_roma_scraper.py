@@ -1,26 +1,56 @@
 import aiohttp
 from bs4 import BeautifulSoup
 from typing import List, Dict
-from backend.scrapers.base_scraper import BaseScraper
+from backend.scrapers.base_scraper import BaseScraper, PageNotFound
 import re
 from urllib.parse import urljoin
 from backend.database.db_manager import DatabaseManager
+from backend.scrapers.html_archive import HtmlArchive
+from backend.scrapers.movie_details import DetailCache, MovieDetailFetcher
 import asyncio
+import os
 from aiohttp import ClientTimeout
 from aiohttp.client_exceptions import ClientError
+from backend.utils.metrics import (
+    SCRAPER_BYTES_FETCHED,
+    SCRAPER_PAGES_FETCHED,
+    SCRAPER_PARSE_DURATION,
+    SCRAPER_RETRIES,
+    SCRAPER_ROWS_UPSERTED,
+)
 
+SCRAPER_LABEL = 'cinema_di_roma'
 class CinemaDiRomaScraper(BaseScraper):
-    def __init__(self):
+    def __init__(self, base_url: str = "https://www.cinemadiroma.it", db=None, archive=None,
+                 parse_only: bool = False):
         super().__init__()
         self.cinema_chain_name = "Cinema di Roma"
-        self.base_url = "https://www.cinemadiroma.it"
+        self.base_url = base_url.rstrip('/')
         self.cinemas = {}  # Will be populated dynamically
         self.session = None
-        self.db = DatabaseManager()
+        self.db = None if parse_only else db if db is not None else DatabaseManager()
         # Add timeout settings
         self.timeout = ClientTimeout(total=30, connect=10)
         self.max_retries = 3
         self.retry_delay = 2
+        # Pause after each programme page to avoid overwhelming the server
+        self.request_delay = 1
+        # Raw copy of every fetched page, for offline replay
+        if archive is None and not parse_only and os.getenv('HTML_ARCHIVE_DIR'):
+            archive = HtmlArchive(os.getenv('HTML_ARCHIVE_DIR'))
+        self.archive = archive
+        # Detail page enrichment (synopsis, cast, ...) of every scraped movie
+        self.details = None
+        if not parse_only and os.getenv('MOVIE_DETAILS_ENABLED', 'false').lower() == 'true':
+            self.details = MovieDetailFetcher(
+                self, DetailCache(os.getenv('MOVIE_DETAILS_CACHE')),
+                concurrency=int(os.getenv('MOVIE_DETAILS_CONCURRENCY', '4'))
+            )
+
+    @classmethod
+    def parser(cls, base_url: str = "https://www.cinemadiroma.it") -> 'CinemaDiRomaScraper':
+        """An instance that only parses pages: no database, archive or detail fetching"""
+        return cls(base_url=base_url, parse_only=True)
 
     async def _get_session(self):
         """Get or create an aiohttp session with timeout"""
@@ -34,100 +64,137 @@ class CinemaDiRomaScraper(BaseScraper):
             session = await self._get_session()
             async with session.get(url) as response:
                 if response.status == 200:
+                    body = await response.read()
+                    SCRAPER_PAGES_FETCHED.labels(scraper=SCRAPER_LABEL).inc()
+                    SCRAPER_BYTES_FETCHED.labels(scraper=SCRAPER_LABEL).inc(len(body))
+                    if self.archive:
+                        await self._archive_page(url, body, response)
                     return await response.text()
+                elif response.status == 404:
+                    raise PageNotFound(f"HTTP 404 for {url}")
                 else:
                     raise aiohttp.ClientError(f"HTTP {response.status}")
+        except PageNotFound:
+            raise
         except Exception as e:
             if retry_count < self.max_retries:
+                SCRAPER_RETRIES.labels(scraper=SCRAPER_LABEL).inc()
                 print(f"Request failed, retrying in {self.retry_delay} seconds... ({retry_count + 1}/{self.max_retries})")
                 await asyncio.sleep(self.retry_delay)
                 return await self._make_request(url, retry_count + 1)
             raise Exception(f"Failed after {self.max_retries} retries: {str(e)}")
 
+    async def _archive_page(self, url: str, body: bytes, response):
+        try:
+            await asyncio.to_thread(
+                self.archive.store, url, body, SCRAPER_LABEL,
+                status=response.status,
+                encoding=response.get_encoding(),
+                headers={k: v for k, v in response.headers.items() if k.lower() in ('etag', 'last-modified', 'content-type')}
+            )
+        except Exception as e:
+            # Archiving must never fail a scrape
+            print(f"Error archiving {url}: {str(e)}")
+
     async def _initialize_cinemas(self):
         """Fetch cinema URLs and icons from the main page"""
         if self.cinemas:  # Already initialized
             return
         
-        session = await self._get_session()
-        async with session.get(self.base_url) as response:
-            if response.status != 200:
-                return
+        try:
+            html = await self._make_request(self.base_url)
+        except Exception as e:
+            print(f"Error fetching cinema list: {str(e)}")
+            return
+
+        with SCRAPER_PARSE_DURATION.labels(scraper=SCRAPER_LABEL).time():
+            self.cinemas = self.parse_cinemas(html)
+
+    def parse_cinemas(self, html: str) -> Dict[str, Dict]:
+        """Extract the known cinemas and their icons from the main page HTML"""
+        cinemas = {}
+        soup = BeautifulSoup(html, 'html.parser')
+        
+        # Find all cinema blocks
+        cinema_blocks = soup.find_all('div', class_='singleService')
+        
+        for block in cinema_blocks:
+            # Find the image element
+            img = block.find('img')
+            if not img:
+                continue
+                
+            # Extract cinema ID from alt text or image filename
+            alt_text = img['alt']
+            cinema_id = alt_text.lower().replace('cinema', '').strip()
             
-            html = await response.text()
-            soup = BeautifulSoup(html, 'html.parser')
+            # Get the icon URL
+            icon_url = urljoin(self.base_url, img['src'])
             
-            # Find all cinema blocks
-            cinema_blocks = soup.find_all('div', class_='singleService')
+            # Map to full names
+            cinema_names = {
+                'intrastevere': 'Cinema Intrastevere',
+                'lux': 'Multisala Lux',
+                'odeon': 'Multisala Odeon',
+                'tibur': 'Cinema Tibur'
+            }
             
-            for block in cinema_blocks:
-                # Find the image element
-                img = block.find('img')
-                if not img:
-                    continue
-                    
-                # Extract cinema ID from alt text or image filename
-                alt_text = img['alt']
-                cinema_id = alt_text.lower().replace('cinema', '').strip()
-                
-                # Get the icon URL
-                icon_url = urljoin(self.base_url, img['src'])
-                
-                # Map to full names
-                cinema_names = {
-                    'intrastevere': 'Cinema Intrastevere',
-                    'lux': 'Multisala Lux',
-                    'odeon': 'Multisala Odeon',
-                    'tibur': 'Cinema Tibur'
+            # Map to URL paths
+            cinema_urls = {
+                'intrastevere': 'programmazione-cinema-intrastevere',
+                'lux': 'programmazione-multisala-lux',
+                'odeon': 'programmazione-multisala-odeon',
+                'tibur': 'programmazione-cinema-tibur'
+            }
+            
+            if cinema_id in cinema_names:
+                cinemas[cinema_id] = {
+                    'name': cinema_names[cinema_id],
+                    'url_path': cinema_urls[cinema_id],
+                    'icon_url': icon_url
                 }
-                
-                # Map to URL paths
-                cinema_urls = {
-                    'intrastevere': 'programmazione-cinema-intrastevere',
-                    'lux': 'programmazione-multisala-lux',
-                    'odeon': 'programmazione-multisala-odeon',
-                    'tibur': 'programmazione-cinema-tibur'
+
+        return cinemas
+
+    def cinema_records(self) -> List[Dict]:
+        """Rows for the cinemas table built from the parsed main page"""
+        cinemas_data = []
+        
+        # Cinema coordinates
+        cinema_locations = {
+            'intrastevere': {'lat': 41.8891, 'lon': 12.4697},
+            'lux': {'lat': 41.8819, 'lon': 12.4987},
+            'odeon': {'lat': 41.9009, 'lon': 12.4833},
+            'tibur': {'lat': 41.8937, 'lon': 12.5240}
+        }
+
+        for cinema_id, cinema_info in self.cinemas.items():
+            try:
+                cinema_data = {
+                    'id': cinema_id,
+                    'name': cinema_info['name'],
+                    'cinema_chain': self.cinema_chain_name,
+                    'latitude': cinema_locations[cinema_id]['lat'],
+                    'longitude': cinema_locations[cinema_id]['lon'],
+                    'website': f"{self.base_url}/{cinema_info['url_path']}",
+                    'icon_url': cinema_info['icon_url']
                 }
-                
-                if cinema_id in cinema_names:
-                    self.cinemas[cinema_id] = {
-                        'name': cinema_names[cinema_id],
-                        'url_path': cinema_urls[cinema_id],
-                        'icon_url': icon_url
-                    }
+                cinemas_data.append(cinema_data)
+            except Exception as e:
+                print(f"Error fetching cinema {cinema_info['name']}: {str(e)}")
+
+        return cinemas_data
 
     async def get_cinemas(self) -> List[Dict]:
         """Get all cinemas from Cinema di Roma chain"""
         try:
             await self._initialize_cinemas()
-            cinemas_data = []
-            
-            # Cinema coordinates
-            cinema_locations = {
-                'intrastevere': {'lat': 41.8891, 'lon': 12.4697},
-                'lux': {'lat': 41.8819, 'lon': 12.4987},
-                'odeon': {'lat': 41.9009, 'lon': 12.4833},
-                'tibur': {'lat': 41.8937, 'lon': 12.5240}
-            }
-
-            for cinema_id, cinema_info in self.cinemas.items():
-                try:
-                    cinema_data = {
-                        'id': cinema_id,
-                        'name': cinema_info['name'],
-                        'cinema_chain': self.cinema_chain_name,
-                        'latitude': cinema_locations[cinema_id]['lat'],
-                        'longitude': cinema_locations[cinema_id]['lon'],
-                        'website': f"{self.base_url}/{cinema_info['url_path']}",
-                        'icon_url': cinema_info['icon_url']
-                    }
-                    cinemas_data.append(cinema_data)
-                except Exception as e:
-                    print(f"Error fetching cinema {cinema_info['name']}: {str(e)}")
+            cinemas_data = self.cinema_records()
 
             # Save to database with error handling
             try:
                 await self.db.update_cinemas(cinemas_data)
+                SCRAPER_ROWS_UPSERTED.labels(scraper=SCRAPER_LABEL, table='cinemas').inc(len(cinemas_data))
             except Exception as e:
                 print(f"Error saving cinemas to database: {str(e)}")
             
@@ -138,129 +205,131 @@ class CinemaDiRomaScraper(BaseScraper):
 
     async def get_showtimes(self, cinema_id: str) -> List[Dict]:
         """Get showtimes for a specific cinema"""
+        try:
+            return await self.scrape_cinema(cinema_id)
+        except Exception as e:
+            print(f"Error fetching showtimes for {cinema_id}: {str(e)}")
+            return []
+
+    async def scrape_cinema(self, cinema_id: str) -> List[Dict]:
+        """Fetch, parse and store one cinema's programme, raising on failure"""
         await self._initialize_cinemas()
         
         if cinema_id not in self.cinemas:
-            print(f"Unknown cinema ID: {cinema_id}")
-            return []
+            raise ValueError(f"Unknown cinema ID: {cinema_id}")
             
         url = f"{self.base_url}/{self.cinemas[cinema_id]['url_path']}"
         print(f"Fetching showtimes from: {url}\n")
         
-        try:
-            html = await self._make_request(url)
-            soup = BeautifulSoup(html, 'html.parser')
-            movies_dict = {}
+        html = await self._make_request(url)
+        with SCRAPER_PARSE_DURATION.labels(scraper=SCRAPER_LABEL).time():
+            movies = self.parse_showtimes(html, cinema_id)
+        if movies and self.details is not None:
+            await self.details.enrich(movies)
+        if movies:
+            # A live scrape is the cinema's current programme
+            await self.db.update_movies_and_showtimes(cinema_id, movies, prune_missing=True)
+            SCRAPER_ROWS_UPSERTED.labels(scraper=SCRAPER_LABEL, table='movies').inc(len(movies))
+            SCRAPER_ROWS_UPSERTED.labels(scraper=SCRAPER_LABEL, table='showtimes').inc(
+                sum(len(movie['showtimes']) for movie in movies)
+            )
+        # Add delay between requests to avoid overwhelming the server
+        await asyncio.sleep(self.request_delay)
+        
+        return movies
+
+    def parse_showtimes(self, html: str, cinema_id: str) -> List[Dict]:
+        """Extract movies and their showtimes from a cinema programme page"""
+        cinema_name = self.cinemas[cinema_id]['name']
+        soup = BeautifulSoup(html, 'html.parser')
+        movies_dict = {}
+        
+        # Find all movie blocks
+        movie_blocks = soup.find_all('div', class_='row-fluid')
+        
+        for block in movie_blocks:
+            title_tag = block.find('h1', class_='borderLine')
+            if not title_tag:
+                continue
+                
+            title = title_tag.find('span', class_='bg').text.strip()
             
-            # Find all movie blocks
-            movie_blocks = soup.find_all('div', class_='row-fluid')
+            # Generate a consistent ID from the title
+            movie_id = title.lower().replace(' ', '-').replace("'", '')
             
-            for block in movie_blocks:
-                title_tag = block.find('h1', class_='borderLine')
-                if not title_tag:
-                    continue
-                    
-                title = title_tag.find('span', class_='bg').text.strip()
-                
-                # Generate a consistent ID from the title
-                movie_id = title.lower().replace(' ', '-').replace("'", '')
-                
-                details = block.find('div', class_='span8')
-                if not details:
-                    continue
-                    
-                info_text = details.find('p').text.strip()
-                
-                # Extract movie details
-                movie_details = {
-                    'id': movie_id,
-                    'title': title,
-                    'genre': '',
-                    'duration': '',
-                    'language': '',
-                    'poster_url': '',  # We'll add this later
-                    'showtimes': []
-                }
-                
-                # Parse movie info
-                if 'Genere:' in info_text:
-                    movie_details['genre'] = info_text.split('Genere:')[1].split('-')[0].strip()
-                if 'Durata:' in info_text:
-                    duration_text = info_text.split('Durata:')[1].split('min.')[0].strip()
-                    try:
-                        movie_details['duration'] = int(duration_text)
-                    except ValueError:
-                        movie_details['duration'] = 0
-                if 'Lingua:' in info_text:
-                    movie_details['language'] = info_text.split('Lingua:')[1].strip()
-                
-                # Try to find poster image
-                poster_p = block.find('p', class_='icon190')
-                if poster_p:
-                    poster_img = poster_p.find('img')
-                    if poster_img and 'src' in poster_img.attrs:
-                        movie_details['poster_url'] = poster_img['src']
-                
-                # Get showtimes
-                date_blocks = details.find_all('span', style=lambda x: x and 'text-align:left; display: block;' in x)
+            details = block.find('div', class_='span8')
+            if not details:
+                continue
                 
-                # Use a set to store unique showtimes
-                unique_showtimes = set()
-
-                for date_block in date_blocks:
-                    date = date_block.find('b').text.strip().rstrip(':')
-                    showtime_links = date_block.find_next_siblings('a', class_='btn')
-                    
-                    for link in showtime_links:
-                        if not isinstance(link, str):  # Make sure it's a valid link element
-                            time = link.text.strip()
-                            if time:
-                                # Create a unique key for this showtime
-                                showtime_key = f"{date}-{time}-{self.cinemas[cinema_id]['name']}"
-                                if showtime_key not in unique_showtimes:
-                                    unique_showtimes.add(showtime_key)
-                                    showtime = {
-                                        'date': date,
-                                        'time': time,
-                                        'cinema': self.cinemas[cinema_id]['name'],
-                                        'booking_link': urljoin(self.base_url, link['href'])
-                                    }
-                                    movie_details['showtimes'].append(showtime)
-                
-                # Store in movies dictionary
-                movies_dict[movie_id] = movie_details
+            info_text = details.find('p').text.strip()
             
-            # Convert to list and sort by title
-            movies = sorted(movies_dict.values(), key=lambda x: x['title'])
-            if movies:
-                await self.db.update_movies_and_showtimes(cinema_id, movies)
-            # Add delay between requests to avoid overwhelming the server
-            await asyncio.sleep(1)
+            # Extract movie details
+            movie_details = {
+                'id': movie_id,
+                'title': title,
+                'genre': '',
+                'duration': '',
+                'language': '',
+                'poster_url': '',  # We'll add this later
+                'showtimes': []
+            }
+            
+            # Parse movie info
+            if 'Genere:' in info_text:
+                movie_details['genre'] = info_text.split('Genere:')[1].split('-')[0].strip()
+            if 'Durata:' in info_text:
+                duration_text = info_text.split('Durata:')[1].split('min.')[0].strip()
+                try:
+                    movie_details['duration'] = int(duration_text)
+                except ValueError:
+                    movie_details['duration'] = 0
+            if 'Lingua:' in info_text:
+                movie_details['language'] = info_text.split('Lingua:')[1].strip()
             
-            return movies
+            # Try to find poster image
+            poster_p = block.find('p', class_='icon190')
+            if poster_p:
+                poster_img = poster_p.find('img')
+                if poster_img and 'src' in poster_img.attrs:
+                    movie_details['poster_url'] = poster_img['src']
+            
+            # Get showtimes
+            date_blocks = details.find_all('span', style=lambda x: x and 'text-align:left; display: block;' in x)
+            
+            # Use a set to store unique showtimes
+            unique_showtimes = set()
 
-        except Exception as e:
-            print(f"Error fetching showtimes for {cinema_id}: {str(e)}")
-            return []
+            for date_block in date_blocks:
+                date = date_block.find('b').text.strip().rstrip(':')
+                showtime_links = date_block.find_next_siblings('a', class_='btn')
+                
+                for link in showtime_links:
+                    if not isinstance(link, str):  # Make sure it's a valid link element
+                        time = link.text.strip()
+                        if time:
+                            # Create a unique key for this showtime
+                            showtime_key = f"{date}-{time}-{cinema_name}"
+                            if showtime_key not in unique_showtimes:
+                                unique_showtimes.add(showtime_key)
+                                showtime = {
+                                    'date': date,
+                                    'time': time,
+                                    'cinema': cinema_name,
+                                    'booking_link': urljoin(self.base_url, link['href'])
+                                }
+                                movie_details['showtimes'].append(showtime)
+            
+            # Store in movies dictionary
+            movies_dict[movie_id] = movie_details
+        
+        # Convert to list and sort by title
+        return sorted(movies_dict.values(), key=lambda x: x['title'])
 
     async def get_movie_details(self, movie_id: str) -> Dict:
-        """Get detailed information about a specific movie"""
-        movie_details = {}
-        
-        async with aiohttp.ClientSession() as session:
-            try:
-                url = f"{self.base_url}/schede-film/in-sala/{movie_id}"
-                async with session.get(url) as response:
-                    if response.status == 200:
-                        html = await response.text()
-                        soup = BeautifulSoup(html, 'html.parser')
-                        
-                        # Implementation needed based on actual HTML structure
-                        
-            except Exception as e:
-                print(f"Error fetching movie details for {movie_id}: {str(e)}")
-        
-        return movie_details
+        """Get detailed information about a specific movie (cached, deduplicated)"""
+        if self.details is None:
+            self.details = MovieDetailFetcher(self)
+        return await self.details.get(movie_id)
 
     async def _parse_showtime_page(self, html: str) -> List[Dict]:
         """Helper method to parse the showtime page HTML"""
@@ -273,4 +342,6 @@ class CinemaDiRomaScraper(BaseScraper):
         """Close the session when done"""
         if self.session:
             await self.session.close()
-            self.session = None
\ No newline at end of file
+            self.session = None
+        if self.details is not None:
+            self.details.close()
\ No newline at end of file
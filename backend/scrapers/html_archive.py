@@ -0,0 +1,87 @@
+"""Content-addressed archive of the raw pages fetched by the scrapers.
+
+Pages are stored gzip-compressed under objects/<sha256[:2]>/<sha256>.html.gz,
+so an unchanged page is stored once however often it is fetched. Every fetch
+appends one JSON line to index.jsonl with the URL, the time, the content hash
+and the response metadata, which lets scripts/replay_archive.py rebuild the
+data offline from any point in time.
+"""
+import gzip
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+from typing import Dict, Iterator, Optional
+
+INDEX_FILE = 'index.jsonl'
+
+
+class HtmlArchive:
+    def __init__(self, root: str, compresslevel: int = 6):
+        self.root = root
+        self.compresslevel = compresslevel
+        self.index_path = os.path.join(root, INDEX_FILE)
+        self._index_lock = threading.Lock()
+        os.makedirs(os.path.join(root, 'objects'), exist_ok=True)
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.root, 'objects', digest[:2], f"{digest}.html.gz")
+
+    def store(self, url: str, body: bytes, scraper: str, status: int = 200,
+              encoding: Optional[str] = None, headers: Optional[Dict[str, str]] = None,
+              fetched_at: Optional[datetime] = None) -> Dict:
+        """Archive one fetched page and return its index entry"""
+        digest = hashlib.sha256(body).hexdigest()
+        path = self._object_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(gzip.compress(body, compresslevel=self.compresslevel))
+            os.replace(tmp_path, path)
+
+        entry = {
+            'url': url,
+            'fetched_at': (fetched_at or datetime.utcnow()).isoformat(),
+            'sha256': digest,
+            'size': len(body),
+            'status': status,
+            'encoding': encoding,
+            'scraper': scraper,
+            'headers': headers or {}
+        }
+        line = json.dumps(entry, ensure_ascii=False) + '\n'
+        with self._index_lock:
+            with open(self.index_path, 'a', encoding='utf-8') as f:
+                f.write(line)
+        return entry
+
+    def entries(self) -> Iterator[Dict]:
+        if not os.path.exists(self.index_path):
+            return
+        with open(self.index_path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    def latest(self, scraper: Optional[str] = None, at: Optional[datetime] = None) -> Dict[str, Dict]:
+        """The newest capture of every URL, optionally as of time `at`"""
+        cutoff = at.isoformat() if at else None
+        latest = {}
+        for entry in self.entries():
+            if scraper and entry['scraper'] != scraper:
+                continue
+            if cutoff and entry['fetched_at'] > cutoff:
+                continue
+            current = latest.get(entry['url'])
+            if current is None or entry['fetched_at'] >= current['fetched_at']:
+                latest[entry['url']] = entry
+        return latest
+
+    def load(self, digest: str) -> bytes:
+        with open(self._object_path(digest), 'rb') as f:
+            return gzip.decompress(f.read())
+
+    def load_text(self, entry: Dict) -> str:
+        return self.load(entry['sha256']).decode(entry.get('encoding') or 'utf-8', errors='replace')
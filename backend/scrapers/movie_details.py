@@ -0,0 +1,184 @@
+"""Movie detail enrichment for the Cinema di Roma scraper.
+
+Detail pages (/schede-film/in-sala/<movie_id>) add the synopsis, director,
+cast, runtime and poster that programme pages lack. The same film usually
+plays in several cinemas, so lookups are deduplicated: concurrent requests
+for one movie share a single in-flight fetch, fetches run through the
+scraper's session with bounded concurrency, and results (including "no
+detail page") are kept in a cache with a TTL. With a cache path the cache
+is a small SQLite file that survives restarts.
+"""
+import asyncio
+import json
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+from urllib.parse import urljoin
+
+from bs4 import BeautifulSoup
+
+from backend.scrapers.base_scraper import PageNotFound
+
+DETAIL_TTL = 7 * 86400
+MISSING_TTL = 86400
+ERROR_TTL = 3600
+
+
+class DetailCache:
+    """Movie details keyed by movie id, in memory or in a SQLite file"""
+
+    def __init__(self, path: Optional[str] = None):
+        self._memory: Dict[str, tuple] = {}
+        self._db = None
+        self._lock = threading.Lock()
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS movie_details (
+                    movie_id TEXT PRIMARY KEY,
+                    details TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            """)
+            self._db.commit()
+
+    def get(self, movie_id: str) -> Optional[Dict]:
+        now = time.time()
+        cached = self._memory.get(movie_id)
+        if cached is None and self._db is not None:
+            with self._lock:
+                row = self._db.execute(
+                    "SELECT details, expires_at FROM movie_details WHERE movie_id = ?", (movie_id,)
+                ).fetchone()
+            if row:
+                cached = (json.loads(row[0]), row[1])
+                self._memory[movie_id] = cached
+        if cached is None or cached[1] <= now:
+            return None
+        return cached[0]
+
+    def set(self, movie_id: str, details: Dict, ttl: float):
+        expires_at = time.time() + ttl
+        self._memory[movie_id] = (details, expires_at)
+        if self._db is not None:
+            with self._lock:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO movie_details (movie_id, details, expires_at) VALUES (?, ?, ?)",
+                    (movie_id, json.dumps(details), expires_at)
+                )
+                self._db.commit()
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+def _labelled_value(soup, *labels: str) -> Optional[str]:
+    """Text following a bold 'Label:' in the details block"""
+    for label in labels:
+        tag = soup.find('b', string=re.compile(rf'^\s*{label}\s*:?\s*$', re.I))
+        if tag is None:
+            continue
+        parts = []
+        for sibling in tag.next_siblings:
+            if getattr(sibling, 'name', None) == 'b':
+                break
+            parts.append(sibling.get_text() if hasattr(sibling, 'get_text') else str(sibling))
+        value = ''.join(parts).strip(' \n\t-:')
+        if value:
+            return value
+    return None
+
+
+def parse_movie_details(html: str, base_url: str) -> Dict:
+    """Extract synopsis, director, cast, runtime and poster from a detail page"""
+    soup = BeautifulSoup(html, 'html.parser')
+    details = {}
+
+    synopsis = soup.find(class_='trama')
+    if synopsis is not None:
+        details['synopsis'] = synopsis.get_text(' ', strip=True)
+    else:
+        meta = soup.find('meta', attrs={'name': 'description'})
+        if meta and meta.get('content'):
+            details['synopsis'] = meta['content'].strip()
+
+    director = _labelled_value(soup, 'Regia')
+    if director:
+        details['director'] = director
+    cast = _labelled_value(soup, 'Cast', 'Interpreti')
+    if cast:
+        details['cast'] = [name.strip() for name in cast.split(',') if name.strip()]
+    runtime = _labelled_value(soup, 'Durata')
+    if runtime:
+        match = re.search(r'\d+', runtime)
+        if match:
+            details['runtime'] = int(match.group())
+    genre = _labelled_value(soup, 'Genere')
+    if genre:
+        details['genre'] = genre
+
+    poster = soup.select_one('p.icon190 img') or soup.find('meta', property='og:image')
+    if poster is not None:
+        src = poster.get('src') or poster.get('content')
+        if src:
+            details['poster_url'] = urljoin(base_url, src)
+
+    return details
+
+
+class MovieDetailFetcher:
+    def __init__(self, scraper, cache: Optional[DetailCache] = None, concurrency: int = 4,
+                 ttl: float = DETAIL_TTL, missing_ttl: float = MISSING_TTL, error_ttl: float = ERROR_TTL):
+        self.scraper = scraper
+        self.cache = cache or DetailCache()
+        self.ttl = ttl
+        self.missing_ttl = missing_ttl
+        self.error_ttl = error_ttl
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self.fetches = 0
+
+    def detail_url(self, movie_id: str) -> str:
+        return f"{self.scraper.base_url}/schede-film/in-sala/{movie_id}"
+
+    async def _fetch(self, movie_id: str) -> Dict:
+        async with self._semaphore:
+            self.fetches += 1
+            try:
+                html = await self.scraper._make_request(self.detail_url(movie_id))
+            except Exception as e:
+                # A missing page stays missing for a while; anything else is retried sooner
+                missing = isinstance(e, PageNotFound)
+                print(f"No details for {movie_id}: {str(e)}")
+                self.cache.set(movie_id, {}, self.missing_ttl if missing else self.error_ttl)
+                return {}
+        details = parse_movie_details(html, self.scraper.base_url)
+        self.cache.set(movie_id, details, self.ttl if details else self.missing_ttl)
+        return details
+
+    async def get(self, movie_id: str) -> Dict:
+        cached = self.cache.get(movie_id)
+        if cached is not None:
+            return cached
+
+        future = self._in_flight.get(movie_id)
+        if future is None:
+            future = asyncio.ensure_future(self._fetch(movie_id))
+            self._in_flight[movie_id] = future
+            future.add_done_callback(lambda _: self._in_flight.pop(movie_id, None))
+        # shield: one caller being cancelled must not cancel the shared fetch
+        return await asyncio.shield(future)
+
+    async def enrich(self, movies: List[Dict]) -> List[Dict]:
+        """Attach a 'details' dict to every parsed movie"""
+        details = await asyncio.gather(*[self.get(movie['id']) for movie in movies])
+        for movie, movie_details in zip(movies, details):
+            movie['details'] = movie_details
+        return movies
+
+    def close(self):
+        self.cache.close()
@@ -0,0 +1,194 @@
+"""Background scrape scheduler.
+
+Each cinema is re-scraped on its own timer, recorded in scrape_status:
+cinemas with showtimes in the next day are refreshed every `min_interval`,
+cinemas whose next showtime is `horizon` or further away (or that have none)
+every `max_interval`, and linearly in between. Failures retry with
+exponential backoff. New cinemas are spread evenly over one `min_interval`
+so they never all come due together, and the catalogue read model is
+rebuilt (and the catalogue change log pruned) once per batch of scrapes
+rather than once per cinema.
+
+Only the instance holding a Postgres advisory lock scrapes; the others wait
+and take over if it goes away.
+"""
+import asyncio
+import logging
+import os
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from zoneinfo import ZoneInfo
+
+from backend.database.catalogue_snapshot import publish_catalogue_snapshot
+
+logger = logging.getLogger(__name__)
+
+# pg_advisory_lock key shared by every scheduler instance
+SCHEDULER_LOCK_KEY = 0x53544143  # 'STAC'
+
+LOCAL_TZ = ZoneInfo('Europe/Rome')
+
+
+def local_now() -> datetime:
+    """Naive Europe/Rome time, comparable with the scraped showtimes"""
+    return datetime.now(LOCAL_TZ).replace(tzinfo=None)
+
+
+def next_showtime(movies: List[Dict], now: datetime) -> Optional[datetime]:
+    """Earliest upcoming showtime of a parsed programme"""
+    upcoming = []
+    for movie in movies:
+        for showtime in movie['showtimes']:
+            try:
+                starts_at = datetime.strptime(f"{showtime['date']} {showtime['time']}", '%d-%m-%Y %H:%M')
+            except ValueError:
+                continue
+            if starts_at >= now:
+                upcoming.append(starts_at)
+    return min(upcoming, default=None)
+
+
+def scrape_interval(upcoming: Optional[datetime], now: datetime, min_interval: float = 1800,
+                    max_interval: float = 21600, horizon: float = 3 * 86400) -> float:
+    """Seconds until the next scrape of a cinema whose next showtime is `upcoming`"""
+    if upcoming is None:
+        return max_interval
+    lead_time = (upcoming - now).total_seconds()
+    if lead_time <= 86400:
+        return min_interval
+    if lead_time >= horizon:
+        return max_interval
+    share = (lead_time - 86400) / (horizon - 86400)
+    return min_interval + share * (max_interval - min_interval)
+
+
+def retry_interval(failures: int, retry_delay: float = 300, max_interval: float = 21600) -> float:
+    return min(max_interval, retry_delay * 2 ** max(0, failures - 1))
+
+
+class ScrapeScheduler:
+    def __init__(self, scraper, db=None, min_interval: float = 1800, max_interval: float = 21600,
+                 horizon: float = 3 * 86400, retry_delay: float = 300, jitter: float = 0.1,
+                 cinema_list_interval: float = 86400, poll_interval: float = 60,
+                 snapshot_path: Optional[str] = None, change_retention: float = 7 * 86400):
+        self.scraper = scraper
+        self.db = db if db is not None else scraper.db
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.horizon = horizon
+        self.retry_delay = retry_delay
+        self.jitter = jitter
+        self.cinema_list_interval = cinema_list_interval
+        self.poll_interval = poll_interval
+        self.snapshot_path = snapshot_path
+        self.change_retention = change_retention
+        self._cinemas_refreshed_at: Optional[float] = None
+
+    def _jittered(self, seconds: float) -> float:
+        return seconds * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    async def _refresh_cinema_list(self):
+        if (self._cinemas_refreshed_at is not None
+                and time.monotonic() - self._cinemas_refreshed_at < self.cinema_list_interval):
+            return
+        # Re-read the cinema list from the main page
+        self.scraper.cinemas = {}
+        cinemas = await self.scraper.get_cinemas()
+        if cinemas:
+            self._cinemas_refreshed_at = time.monotonic()
+            logger.info(f"Cinema list refreshed: {len(cinemas)} cinemas")
+
+    async def _scrape(self, cinema: Dict) -> bool:
+        cinema_id = cinema['cinema_id']
+        started_at = datetime.utcnow()
+        started = time.perf_counter()
+        try:
+            movies = await self.scraper.scrape_cinema(cinema_id)
+        except Exception as e:
+            duration_ms = int((time.perf_counter() - started) * 1000)
+            failures = cinema['consecutive_failures'] + 1
+            delay = self._jittered(retry_interval(failures, self.retry_delay, self.max_interval))
+            logger.error(f"Scrape of {cinema_id} failed ({failures} in a row), retrying in {delay:.0f}s: {str(e)}")
+            await self.db.record_scrape_result(
+                cinema_id, started_at, duration_ms, started_at + timedelta(seconds=delay), error=str(e)
+            )
+            return False
+
+        duration_ms = int((time.perf_counter() - started) * 1000)
+        now = local_now()
+        delay = self._jittered(scrape_interval(
+            next_showtime(movies, now), now, self.min_interval, self.max_interval, self.horizon
+        ))
+        await self.db.record_scrape_result(
+            cinema_id, started_at, duration_ms, started_at + timedelta(seconds=delay), movie_count=len(movies)
+        )
+        logger.info(f"Scraped {cinema_id}: {len(movies)} movies in {duration_ms}ms, next in {delay / 60:.0f}min")
+        return True
+
+    async def run_once(self) -> List[str]:
+        """Scrape every cinema that is due; returns the ids scraped successfully"""
+        await self._refresh_cinema_list()
+        schedule = await self.db.get_scrape_schedule()
+        now = datetime.utcnow()
+
+        # Cinemas never seen before: first one now, the rest staggered
+        unscheduled = [c for c in schedule if c['next_run'] is None]
+        if unscheduled:
+            spacing = self.min_interval / len(unscheduled)
+            for index, cinema in enumerate(unscheduled):
+                cinema['next_run'] = now + timedelta(seconds=index * spacing)
+                await self.db.schedule_scrape(cinema['cinema_id'], cinema['next_run'])
+
+        due = sorted((c for c in schedule if c['next_run'] <= now), key=lambda c: c['next_run'])
+        scraped = [cinema['cinema_id'] for cinema in due if await self._scrape(cinema)]
+
+        if scraped:
+            await self.db.refresh_catalogue()
+            await self.db.prune_catalogue_changes(self.change_retention)
+            if self.snapshot_path:
+                info = await publish_catalogue_snapshot(self.db, self.snapshot_path)
+                logger.info(f"Published catalogue snapshot v{info['catalogue_version']}")
+        return scraped
+
+    async def _seconds_until_next_run(self) -> float:
+        schedule = await self.db.get_scrape_schedule()
+        pending = [c['next_run'] for c in schedule if c['next_run'] is not None]
+        if not pending:
+            return self.poll_interval
+        wait = (min(pending) - datetime.utcnow()).total_seconds()
+        return max(1.0, min(self.poll_interval, wait))
+
+    async def run_forever(self):
+        while True:
+            lock = await self.db.try_advisory_lock(SCHEDULER_LOCK_KEY)
+            if lock is None:
+                logger.info("Another scheduler holds the lock, standing by")
+                await asyncio.sleep(self.poll_interval)
+                continue
+
+            logger.info("Scheduler lock acquired")
+            try:
+                while await self.db.lock_alive(lock):
+                    try:
+                        await self.run_once()
+                        wait = await self._seconds_until_next_run()
+                    except Exception as e:
+                        logger.error(f"Scheduler iteration failed: {str(e)}")
+                        wait = self.poll_interval
+                    await asyncio.sleep(wait)
+                logger.error("Lost the scheduler lock connection")
+            finally:
+                lock.close()
+
+
+def scheduler_from_env(scraper) -> ScrapeScheduler:
+    return ScrapeScheduler(
+        scraper,
+        min_interval=float(os.getenv('SCRAPE_MIN_INTERVAL_SECONDS', '1800')),
+        max_interval=float(os.getenv('SCRAPE_MAX_INTERVAL_SECONDS', '21600')),
+        retry_delay=float(os.getenv('SCRAPE_RETRY_DELAY_SECONDS', '300')),
+        snapshot_path=os.getenv('CATALOGUE_SNAPSHOT_PATH'),
+        change_retention=float(os.getenv('CATALOGUE_CHANGES_RETENTION_SECONDS', str(7 * 86400)))
+    )
@@ -0,0 +1,63 @@
+"""Precompute movie and user recommendations from movie_watches.
+
+Run as a separate long-lived process next to the API, e.g.
+
+    python backend/scripts/build_recommendations.py          # keep them up to date
+    python backend/scripts/build_recommendations.py --once   # full rebuild and exit
+
+The API only reads the resulting top-K tables; all the matrix work happens
+here.
+"""
+import argparse
+import asyncio
+import logging
+import sys
+import os
+from dotenv import load_dotenv
+
+# Add the backend directory to Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+backend_dir = os.path.dirname(current_dir)
+sys.path.append(backend_dir)
+
+from database.db_manager import DatabaseManager
+from utils.recommender import RECOMMENDER_LOCK_KEY, RecommendationBuilder
+
+async def main(once: bool):
+    # Load environment variables
+    load_dotenv()
+
+    db = DatabaseManager()
+    builder = RecommendationBuilder(
+        db,
+        k=int(os.getenv('RECOMMENDATIONS_TOP_K', '20')),
+        full_interval=float(os.getenv('RECOMMENDATIONS_FULL_REBUILD_SECONDS', '21600')),
+        poll_interval=float(os.getenv('RECOMMENDATIONS_POLL_SECONDS', '60')),
+        rescan_window=int(os.getenv('RECOMMENDATIONS_RESCAN_WATCH_IDS', '10000'))
+    )
+    try:
+        await db._ensure_db_exists()
+        if not once:
+            await builder.run_forever()
+            return
+
+        lock = await db.try_advisory_lock(RECOMMENDER_LOCK_KEY)
+        if lock is None:
+            print("Another recommendation builder is running, nothing to do")
+            return
+        try:
+            result = await builder.run_once()
+            print(f"Built recommendations from {result['watches']} watches: "
+                  f"{result['movies']} movies, {result['users']} users")
+        finally:
+            lock.close()
+    finally:
+        await db.close_connections()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build precomputed recommendations")
+    parser.add_argument('--once', action='store_true', help="Rebuild everything once and exit")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main(args.once))
@@ -0,0 +1,56 @@
+"""Export the catalogue read model to a snapshot file.
+
+The snapshot holds the movie and cinema documents (with their showtimes) as
+served by the catalogue endpoints, indexed by id, plus the catalogue version.
+Ship it to read-only API instances started with SNAPSHOT_ONLY=true and
+CATALOGUE_SNAPSHOT_PATH pointing at it; they pick up a replaced file without
+restarting.
+
+Usage:
+    python backend/scripts/export_snapshot.py --output /data/catalogue.snap
+    python backend/scripts/export_snapshot.py --output /data/catalogue.snap --refresh
+    STORAGE_URL=sqlite:///catalogue.db python backend/scripts/export_snapshot.py --output catalogue.snap
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from dotenv import load_dotenv
+
+# Add the backend directory and the project root to Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+backend_dir = os.path.dirname(current_dir)
+sys.path.append(backend_dir)
+sys.path.append(os.path.dirname(backend_dir))
+
+from backend.database.catalogue_snapshot import publish_catalogue_snapshot
+from backend.database.storage import open_storage
+
+
+async def main(args) -> dict:
+    db = open_storage()
+    try:
+        started = time.perf_counter()
+        if args.refresh:
+            await db.refresh_catalogue()
+        info = await publish_catalogue_snapshot(db, args.output)
+    finally:
+        await db.close_connections()
+
+    size = os.path.getsize(args.output)
+    print(f"Wrote catalogue v{info['catalogue_version']} to {args.output} "
+          f"({size / 1024:.0f} KiB) in {time.perf_counter() - started:.2f}s")
+    return info
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Export the catalogue to a snapshot file")
+    parser.add_argument('--output', default=os.getenv('CATALOGUE_SNAPSHOT_PATH'),
+                        help="Snapshot file to write (default: CATALOGUE_SNAPSHOT_PATH)")
+    parser.add_argument('--refresh', action='store_true', help="Rebuild the read model before exporting")
+    args = parser.parse_args()
+    if not args.output:
+        parser.error("--output or CATALOGUE_SNAPSHOT_PATH is required")
+    asyncio.run(main(args))
@@ -9,6 +9,7 @@ backend_dir = os.path.dirname(current_dir)
 sys.path.append(backend_dir)
 
 from scrapers.cinema_di_roma_scraper import CinemaDiRomaScraper
+from database.catalogue_snapshot import publish_catalogue_snapshot
 
 async def main():
     # Load environment variables
@@ -33,6 +34,15 @@ async def main():
             except Exception as e:
                 print(f"  Error fetching showtimes for {cinema['name']}: {str(e)}")
                 continue
+
+        print("\nRefreshing catalogue read model...")
+        await scraper.db.refresh_catalogue()
+
+        # Publish the snapshot read by multi-worker API deployments
+        snapshot_path = os.getenv('CATALOGUE_SNAPSHOT_PATH')
+        if snapshot_path:
+            info = await publish_catalogue_snapshot(scraper.db, snapshot_path)
+            print(f"Published catalogue snapshot v{info['catalogue_version']} to {snapshot_path}")
                 
     except Exception as e:
         print(f"Error: {str(e)}")
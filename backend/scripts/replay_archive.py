@@ -0,0 +1,134 @@
+"""Rebuild the catalogue from the raw HTML archive, without network access.
+
+Takes the newest archived capture of every Cinema di Roma page (or the
+newest as of --at), re-parses them in parallel worker processes with the
+current parser and ingests the result, then refreshes the catalogue read
+model. Use it after parser changes or to backfill a fresh database.
+With STORAGE_URL=sqlite:///catalogue.db it fills an embedded SQLite file
+instead of Postgres. When CATALOGUE_SNAPSHOT_PATH is set, the catalogue
+snapshot is republished afterwards. SQLite keeps no catalogue change log,
+so a snapshot published from it carries changes_through 0 and clients
+resyncing from it fetch the API's change log from the start.
+
+Usage:
+    python backend/scripts/replay_archive.py --archive /data/html-archive
+    python backend/scripts/replay_archive.py --archive /data/html-archive --at 2024-11-01T00:00 --dry-run
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+from dotenv import load_dotenv
+
+# Add the backend directory and the project root to Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+backend_dir = os.path.dirname(current_dir)
+sys.path.append(backend_dir)
+sys.path.append(os.path.dirname(backend_dir))
+
+from backend.database.catalogue_snapshot import publish_catalogue_snapshot
+from backend.scrapers.cinema_di_roma_scraper import SCRAPER_LABEL, CinemaDiRomaScraper
+from backend.scrapers.html_archive import HtmlArchive
+
+_parser: Optional[CinemaDiRomaScraper] = None
+
+
+def _init_worker(base_url: str, cinemas: Dict):
+    global _parser
+    # Parsing only: the worker never touches the database
+    _parser = CinemaDiRomaScraper.parser(base_url)
+    _parser.cinemas = cinemas
+
+
+def _parse_programme(archive_root: str, entry: Dict, cinema_id: str) -> Tuple[str, List[Dict]]:
+    html = HtmlArchive(archive_root).load_text(entry)
+    return cinema_id, _parser.parse_showtimes(html, cinema_id)
+
+
+def select_pages(archive: HtmlArchive, at: Optional[datetime]) -> Tuple[Dict, Dict[str, Dict]]:
+    """Split the latest captures into the main page and the programme pages by path"""
+    latest = archive.latest(scraper=SCRAPER_LABEL, at=at)
+    index_entry = None
+    programmes = {}
+    for url, entry in latest.items():
+        path = urlparse(url).path.strip('/')
+        if path:
+            programmes[path] = entry
+        elif index_entry is None or entry['fetched_at'] > index_entry['fetched_at']:
+            index_entry = entry
+    if index_entry is None:
+        raise ValueError("The archive has no capture of the main page")
+    return index_entry, programmes
+
+
+async def replay(args) -> Dict:
+    archive = HtmlArchive(args.archive)
+    at = datetime.fromisoformat(args.at) if args.at else None
+    index_entry, programmes = select_pages(archive, at)
+
+    scraper = CinemaDiRomaScraper.parser(args.base_url)
+    scraper.cinemas = scraper.parse_cinemas(archive.load_text(index_entry))
+    jobs = []
+    for cinema_id, info in scraper.cinemas.items():
+        entry = programmes.get(info['url_path'])
+        if entry is None:
+            print(f"No archived programme for {cinema_id}, skipping")
+            continue
+        jobs.append((entry, cinema_id))
+
+    started = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker,
+                             initargs=(args.base_url, scraper.cinemas)) as pool:
+        parsed = await asyncio.gather(*[
+            loop.run_in_executor(pool, _parse_programme, args.archive, entry, cinema_id)
+            for entry, cinema_id in jobs
+        ])
+    parse_time = time.perf_counter() - started
+
+    showtime_count = sum(len(movie['showtimes']) for _, movies in parsed for movie in movies)
+    print(f"Parsed {len(parsed)} programme pages ({showtime_count} showtimes) in {parse_time:.2f}s")
+
+    if not args.dry_run:
+        from backend.database.storage import open_storage
+        db = open_storage()
+        try:
+            await db._ensure_db_exists()
+            await db.update_cinemas(scraper.cinema_records())
+            for cinema_id, movies in parsed:
+                if movies:
+                    # Archived pages are not the current programme: never
+                    # delete showtimes they don't list
+                    await db.update_movies_and_showtimes(cinema_id, movies, prune_missing=False)
+            await db.refresh_catalogue()
+
+            # Snapshot-serving workers would otherwise keep the old catalogue.
+            # From SQLite its changes_through stays 0 (no change log there).
+            snapshot_path = os.getenv('CATALOGUE_SNAPSHOT_PATH')
+            if snapshot_path:
+                info = await publish_catalogue_snapshot(db, snapshot_path)
+                print(f"Published catalogue snapshot v{info['catalogue_version']} to {snapshot_path}")
+        finally:
+            await db.close_connections()
+        print(f"Ingested and refreshed the catalogue in {time.perf_counter() - started:.2f}s")
+
+    return {'pages': len(parsed), 'showtimes': showtime_count}
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Replay archived pages into the database")
+    parser.add_argument('--archive', default=os.getenv('HTML_ARCHIVE_DIR'), help="Archive directory (default: HTML_ARCHIVE_DIR)")
+    parser.add_argument('--at', help="Replay the captures as of this ISO timestamp (UTC)")
+    parser.add_argument('--base-url', default="https://www.cinemadiroma.it")
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--dry-run', action='store_true', help="Parse only, do not write to the database")
+    args = parser.parse_args()
+    if not args.archive:
+        parser.error("--archive or HTML_ARCHIVE_DIR is required")
+    asyncio.run(replay(args))
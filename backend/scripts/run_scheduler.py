@@ -0,0 +1,57 @@
+"""Keep the catalogue fresh by scraping each cinema on its own schedule.
+
+Run as a separate long-lived process next to the API, e.g.
+
+    python backend/scripts/run_scheduler.py          # run forever
+    python backend/scripts/run_scheduler.py --once   # scrape whatever is due and exit
+
+Several instances can run safely: only the one holding the scheduler lock
+scrapes, the others take over if it stops.
+"""
+import argparse
+import asyncio
+import logging
+import sys
+import os
+from dotenv import load_dotenv
+
+# Add the backend directory to Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+backend_dir = os.path.dirname(current_dir)
+sys.path.append(backend_dir)
+
+from scrapers.cinema_di_roma_scraper import CinemaDiRomaScraper
+from scrapers.scheduler import SCHEDULER_LOCK_KEY, scheduler_from_env
+
+async def main(once: bool):
+    # Load environment variables
+    load_dotenv()
+
+    scraper = CinemaDiRomaScraper()
+    scheduler = scheduler_from_env(scraper)
+    try:
+        await scraper.db._ensure_db_exists()
+        if not once:
+            await scheduler.run_forever()
+            return
+
+        lock = await scraper.db.try_advisory_lock(SCHEDULER_LOCK_KEY)
+        if lock is None:
+            print("Another scheduler is running, nothing to do")
+            return
+        try:
+            scraped = await scheduler.run_once()
+            print(f"Scraped {len(scraped)} cinemas: {', '.join(scraped) or '-'}")
+        finally:
+            lock.close()
+    finally:
+        await scraper.close()
+        await scraper.db.close_connections()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scheduled cinema scraping")
+    parser.add_argument('--once', action='store_true', help="Run one scheduling pass and exit")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main(args.once))
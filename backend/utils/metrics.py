@@ -0,0 +1,243 @@
+"""Prometheus collectors shared by the API, DatabaseManager and the scrapers.
+
+Everything here is a plain in-process counter or histogram update, cheap
+enough to stay enabled in production. The collectors are exposed by the
+API at /metrics.
+"""
+import contextvars
+import inspect
+import os
+import time
+from functools import wraps
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from starlette.routing import Match
+
+# Tuned for sub-second API and database calls
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _collector(cls, name, documentation, labelnames=(), **kwargs):
+    # This module is imported as both `utils.metrics` (API) and
+    # `backend.utils.metrics` (scrapers); reuse whatever the other copy
+    # registered instead of failing on a duplicate name.
+    existing = REGISTRY._names_to_collectors.get(name)
+    if existing is not None:
+        return existing
+    return cls(name, documentation, labelnames, **kwargs)
+
+
+HTTP_REQUEST_DURATION = _collector(
+    Histogram, 'stacco_http_request_duration_seconds',
+    'HTTP request latency by route template', ['method', 'route', 'status'],
+    buckets=LATENCY_BUCKETS
+)
+HTTP_REQUESTS_IN_FLIGHT = _collector(
+    Gauge, 'stacco_http_requests_in_flight',
+    'HTTP requests currently being served', ['method', 'route'],
+    multiprocess_mode='livesum'
+)
+
+DB_QUERY_DURATION = _collector(
+    Histogram, 'stacco_db_query_duration_seconds',
+    'DatabaseManager call duration (the _count series is the call count)', ['method'],
+    buckets=LATENCY_BUCKETS
+)
+DB_QUERY_ERRORS = _collector(
+    Counter, 'stacco_db_query_errors',
+    'DatabaseManager calls that raised', ['method']
+)
+DB_CONNECTION_WAIT = _collector(
+    Histogram, 'stacco_db_connection_acquire_seconds',
+    'Time spent obtaining a database connection',
+    buckets=LATENCY_BUCKETS
+)
+DB_STATEMENT_DURATION = _collector(
+    Histogram, 'stacco_db_statement_seconds',
+    'Registered statements: one-off PREPARE time versus EXECUTE time', ['statement', 'phase'],
+    buckets=LATENCY_BUCKETS
+)
+DB_POOL_TIMEOUTS = _collector(
+    Counter, 'stacco_db_pool_timeouts',
+    'Connection requests that gave up waiting for a free pooled connection', ['target']
+)
+DB_READS_ROUTED = _collector(
+    Counter, 'stacco_db_reads_routed',
+    'Replica-eligible reads by the server that answered them', ['target']
+)
+DB_REPLICA_LAG = _collector(
+    Gauge, 'stacco_db_replica_lag_seconds',
+    'Replay lag of each read replica at its last health check', ['replica'],
+    multiprocess_mode='max'
+)
+
+SCRAPER_PAGES_FETCHED = _collector(
+    Counter, 'stacco_scraper_pages_fetched',
+    'Pages successfully fetched by the scrapers', ['scraper']
+)
+SCRAPER_BYTES_FETCHED = _collector(
+    Counter, 'stacco_scraper_bytes_fetched',
+    'Response bytes downloaded by the scrapers', ['scraper']
+)
+SCRAPER_PARSE_DURATION = _collector(
+    Histogram, 'stacco_scraper_parse_seconds',
+    'Time spent parsing fetched pages', ['scraper'],
+    buckets=LATENCY_BUCKETS
+)
+SCRAPER_ROWS_UPSERTED = _collector(
+    Counter, 'stacco_scraper_rows_upserted',
+    'Rows written by scraper ingestion', ['scraper', 'table']
+)
+SCRAPER_RETRIES = _collector(
+    Counter, 'stacco_scraper_retries',
+    'HTTP retries performed by the scrapers', ['scraper']
+)
+
+RATE_LIMITED = _collector(
+    Counter, 'stacco_rate_limited_requests',
+    'Requests rejected by the rate limiter', ['route', 'scope']
+)
+
+EMAIL_PREFILTER_RESULTS = _collector(
+    Counter, 'stacco_email_prefilter_lookups',
+    'check_email lookups by outcome (filtered ones never reach Postgres)', ['result']
+)
+
+WATCH_EVENTS = _collector(
+    Counter, 'stacco_watch_events',
+    'Watch events by outcome: accepted/rejected by the buffer, stored/invalid at flush', ['outcome']
+)
+WATCH_BUFFER_PENDING = _collector(
+    Gauge, 'stacco_watch_buffer_pending',
+    'Watch events waiting in the write-behind buffer',
+    multiprocess_mode='livesum'
+)
+
+REQUESTS_SHED = _collector(
+    Counter, 'stacco_requests_shed',
+    'Requests answered 503 by the load shedder, by route priority', ['priority']
+)
+EVENT_LOOP_LAG = _collector(
+    Gauge, 'stacco_event_loop_lag_seconds',
+    'How late the event loop ran its last scheduled check',
+    multiprocess_mode='max'
+)
+
+CHANGE_SUBSCRIBERS = _collector(
+    Gauge, 'stacco_change_subscribers',
+    'Clients connected to the catalogue change stream',
+    multiprocess_mode='livesum'
+)
+CHANGE_EVENTS = _collector(
+    Counter, 'stacco_change_events',
+    'Catalogue change events per subscriber: delivered, or dropped when its queue overflowed', ['outcome']
+)
+
+
+# Name of the instrumented DatabaseManager method running in this context
+current_db_method = contextvars.ContextVar('current_db_method', default=None)
+
+
+def instrument_db_methods(cls):
+    """Class decorator timing every public coroutine method of a DatabaseManager.
+
+    While a method runs, its name is available from `current_db_method`.
+    """
+    for name, method in list(vars(cls).items()):
+        if name.startswith('_') or not inspect.iscoroutinefunction(method):
+            continue
+        setattr(cls, name, _timed_db_method(name, method))
+    return cls
+
+
+def _timed_db_method(name, method):
+    histogram = DB_QUERY_DURATION.labels(method=name)
+    errors = DB_QUERY_ERRORS.labels(method=name)
+
+    @wraps(method)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        token = current_db_method.set(name)
+        try:
+            return await method(*args, **kwargs)
+        except Exception:
+            errors.inc()
+            raise
+        finally:
+            current_db_method.reset(token)
+            histogram.observe(time.perf_counter() - started)
+
+    return wrapper
+
+
+class PrometheusMiddleware:
+    """ASGI middleware recording per-route latency and in-flight requests.
+
+    Requests are labelled with the route template (e.g. /api/movies/{movie_id})
+    so label cardinality stays bounded by the number of routes.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    def _route_template(self, scope) -> str:
+        router = scope['app'].router
+        for route in router.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return route.path
+        return 'unmatched'
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        method = scope['method']
+        route = self._route_template(scope)
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+            await send(message)
+
+        in_flight = HTTP_REQUESTS_IN_FLIGHT.labels(method=method, route=route)
+        in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            in_flight.dec()
+            HTTP_REQUEST_DURATION.labels(method=method, route=route, status=str(status_code)).observe(
+                time.perf_counter() - started
+            )
+
+
+def render_latest():
+    """Return the exposition payload and its content type.
+
+    Under `run.py --workers` every worker writes to PROMETHEUS_MULTIPROC_DIR
+    and the payload aggregates all of them.
+    """
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+def mark_worker_exit():
+    """Drop this worker's live gauges from the multiprocess aggregate"""
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        multiprocess.mark_process_dead(os.getpid())
@@ -0,0 +1,209 @@
+"""Item-to-item recommendations from movie_watches.
+
+Users and movies form a binary watch matrix A (users x movies). The movie
+co-occurrence matrix C = A.T @ A counts the users who watched both movies of
+each pair, and its diagonal how many watched each movie; cosine similarity
+is C[i, j] / sqrt(C[i, i] * C[j, j]).
+
+C is kept up to date incrementally: a batch of new watches only changes the
+rows of A for the users involved, so C += A_new.T @ A_new - A_old.T @ A_old
+over those users alone. Similarities and top-K lists are recomputed from C,
+which has one row per movie and stays small whatever the number of users.
+Only movies that currently have showtimes are ever recommended.
+"""
+import asyncio
+import logging
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from scipy import sparse
+
+logger = logging.getLogger(__name__)
+
+# pg_advisory_lock key shared by every builder instance
+RECOMMENDER_LOCK_KEY = 0x53544144  # 'STAD'
+
+
+def top_k_rows(matrix: sparse.csr_matrix, k: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """(column indexes, values) of the k largest positive entries of every row, best first"""
+    matrix = matrix.tocsr()
+    result = []
+    for row in range(matrix.shape[0]):
+        start, end = matrix.indptr[row], matrix.indptr[row + 1]
+        values = matrix.data[start:end]
+        columns = matrix.indices[start:end]
+        positive = values > 0
+        values, columns = values[positive], columns[positive]
+        if len(values) > k:
+            keep = np.argpartition(-values, k - 1)[:k]
+            values, columns = values[keep], columns[keep]
+        # Highest score first, ties by column for stable output
+        order = np.lexsort((columns, -values))
+        result.append((columns[order], values[order]))
+    return result
+
+
+class CooccurrenceModel:
+    def __init__(self):
+        self.movie_ids: List[str] = []
+        self.movie_index: Dict[str, int] = {}
+        self.user_movies: Dict[int, Set[int]] = {}
+        self.counts = sparse.csr_matrix((0, 0), dtype=np.int64)
+        self.last_watch_id = 0
+
+    def _column(self, movie_id: str) -> int:
+        column = self.movie_index.get(movie_id)
+        if column is None:
+            column = self.movie_index[movie_id] = len(self.movie_ids)
+            self.movie_ids.append(movie_id)
+        return column
+
+    def _user_rows(self, users: Sequence[int]) -> sparse.csr_matrix:
+        """Binary watch matrix restricted to `users`, in that order"""
+        indptr = [0]
+        indices = []
+        for user_id in users:
+            watched = self.user_movies.get(user_id, ())
+            indices.extend(sorted(watched))
+            indptr.append(len(indices))
+        data = np.ones(len(indices), dtype=np.int64)
+        return sparse.csr_matrix((data, np.array(indices, dtype=np.int64), np.array(indptr)),
+                                 shape=(len(users), len(self.movie_ids)))
+
+    def add_watches(self, watches: Iterable[Tuple[int, int, str]]) -> Set[int]:
+        """Fold (watch_id, user_id, movie_id) rows into the counts; returns the users whose watches changed"""
+        new_movies: Dict[int, Set[int]] = {}
+        for watch_id, user_id, movie_id in watches:
+            column = self._column(movie_id)
+            if column not in self.user_movies.get(user_id, ()):
+                new_movies.setdefault(user_id, set()).add(column)
+            self.last_watch_id = max(self.last_watch_id, watch_id)
+        if not new_movies:
+            return set()
+
+        users = list(new_movies)
+        size = len(self.movie_ids)
+        before = self._user_rows(users)
+        for user_id, columns in new_movies.items():
+            self.user_movies.setdefault(user_id, set()).update(columns)
+        after = self._user_rows(users)
+
+        self.counts.resize((size, size))
+        self.counts = (self.counts + (after.T @ after) - (before.T @ before)).tocsr()
+        self.counts.eliminate_zeros()
+        return set(users)
+
+    def similarity(self) -> sparse.csr_matrix:
+        """Cosine similarity between movies, without the diagonal"""
+        counts = self.counts.tocoo()
+        totals = self.counts.diagonal().astype(np.float64)
+        off_diagonal = counts.row != counts.col
+        rows, cols = counts.row[off_diagonal], counts.col[off_diagonal]
+        scores = counts.data[off_diagonal] / np.sqrt(totals[rows] * totals[cols])
+        return sparse.csr_matrix((scores, (rows, cols)), shape=self.counts.shape)
+
+    def _playing_mask(self, playing: Set[str]) -> np.ndarray:
+        return np.array([movie_id in playing for movie_id in self.movie_ids], dtype=bool)
+
+    def similar_movies(self, playing: Set[str], k: int = 20,
+                       similarity: Optional[sparse.csr_matrix] = None) -> List[Tuple[str, str, float, int]]:
+        """(movie_id, similar_id, score, rank) for every movie, recommending only playing movies"""
+        similarity = self.similarity() if similarity is None else similarity
+        keep = sparse.diags(self._playing_mask(playing).astype(np.float64))
+        rows = []
+        for movie, (columns, scores) in enumerate(top_k_rows(similarity @ keep, k)):
+            for rank, (column, score) in enumerate(zip(columns, scores), start=1):
+                rows.append((self.movie_ids[movie], self.movie_ids[column], float(score), rank))
+        return rows
+
+    def recommend_users(self, users: Sequence[int], playing: Set[str], k: int = 20,
+                        similarity: Optional[sparse.csr_matrix] = None) -> List[Tuple[int, str, float, int]]:
+        """(user_id, movie_id, score, rank): playing movies most similar to what each user watched"""
+        similarity = self.similarity() if similarity is None else similarity
+        watched = self._user_rows(users)
+        candidates = self._playing_mask(playing).astype(np.float64)
+        scores = (watched.astype(np.float64) @ similarity) @ sparse.diags(candidates)
+        # Never recommend something already watched
+        scores = scores - scores.multiply(watched > 0)
+        rows = []
+        for position, (columns, values) in enumerate(top_k_rows(sparse.csr_matrix(scores), k)):
+            for rank, (column, score) in enumerate(zip(columns, values), start=1):
+                rows.append((users[position], self.movie_ids[column], float(score), rank))
+        return rows
+
+
+class RecommendationBuilder:
+    """Keeps movie_similar and user_recommendations in step with movie_watches.
+
+    Each pass folds the watches added since the previous one into the model.
+    Watch ids are handed out before their transactions commit, so a lower id
+    can show up after a higher one was read: every pass re-reads the last
+    `rescan_window` ids too, which the binary watch matrix absorbs for free.
+    Movie lists are rewritten whenever the watches or the set of playing
+    movies changed; user lists only for the users with new watches, except
+    every `full_interval` seconds (and on the first pass). Those passes
+    rebuild the model from all of movie_watches, picking up watches even the
+    window missed and dropping deleted users, and recompute every user so
+    their lists follow the changing programme.
+    """
+
+    def __init__(self, db, k: int = 20, full_interval: float = 6 * 3600, poll_interval: float = 60,
+                 rescan_window: int = 10000):
+        self.db = db
+        self.k = k
+        self.full_interval = full_interval
+        self.poll_interval = poll_interval
+        self.rescan_window = rescan_window
+        self.model = CooccurrenceModel()
+        self._playing: Optional[Set[str]] = None
+        self._full_at: Optional[float] = None
+
+    async def run_once(self) -> Dict[str, int]:
+        full = self._full_at is None or time.monotonic() - self._full_at >= self.full_interval
+        if full:
+            model = CooccurrenceModel()
+            watches = await self.db.get_watches()
+        else:
+            model = self.model
+            watches = await self.db.get_watches(after_id=max(0, model.last_watch_id - self.rescan_window))
+        changed_users = model.add_watches(watches)
+        self.model = model
+        playing = set(await self.db.get_playing_movie_ids())
+
+        if not changed_users and playing == self._playing and not full:
+            return {'watches': 0, 'movies': 0, 'users': 0}
+
+        similarity = self.model.similarity()
+        movie_rows = self.model.similar_movies(playing, self.k, similarity)
+        await self.db.replace_movie_similar(movie_rows)
+
+        users = sorted(self.model.user_movies) if full else sorted(changed_users)
+        user_rows = self.model.recommend_users(users, playing, self.k, similarity)
+        await self.db.replace_user_recommendations(None if full else users, user_rows)
+
+        self._playing = playing
+        if full:
+            self._full_at = time.monotonic()
+        return {'watches': len(watches), 'movies': len(self.model.movie_ids), 'users': len(users)}
+
+    async def run_forever(self):
+        while True:
+            lock = await self.db.try_advisory_lock(RECOMMENDER_LOCK_KEY)
+            if lock is None:
+                logger.info("Another recommendation builder holds the lock, standing by")
+                await asyncio.sleep(self.poll_interval)
+                continue
+
+            try:
+                while await self.db.lock_alive(lock):
+                    try:
+                        result = await self.run_once()
+                        if result['users'] or result['movies']:
+                            logger.info(f"Recommendations updated: {result}")
+                    except Exception as e:
+                        logger.error(f"Recommendation pass failed: {str(e)}")
+                    await asyncio.sleep(self.poll_interval)
+                logger.error("Lost the recommendation builder lock connection")
+            finally:
+                lock.close()
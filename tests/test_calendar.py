@@ -0,0 +1,76 @@
+from datetime import datetime
+
+import pytest
+
+from backend.api.calendar import CalendarCache, escape_text, fold, not_modified, render_calendar
+
+STAMP = datetime(2030, 1, 10, 8, 0)
+
+
+def showtime(hour, duration=100, **extra):
+    return {
+        'movie_id': 'conclave', 'cinema_id': 'lux', 'starts_at': datetime(2030, 1, 10, hour, 30),
+        'booking_link': 'https://example.com/book', 'title': 'Conclave', 'duration': duration,
+        'cinema_name': 'Multisala Lux', 'latitude': 41.9, 'longitude': 12.5, **extra
+    }
+
+
+def test_lines_are_folded_at_75_octets_on_character_boundaries():
+    line = 'SUMMARY:' + 'è' * 60
+    folded = fold(line)
+    parts = folded.rstrip('\r\n').split('\r\n ')
+    assert all(len(part.encode('utf-8')) <= 75 for part in parts)
+    assert ''.join(parts) == line
+    assert escape_text('a,b;c\\d\ne') == 'a\\,b\\;c\\\\d\\ne'
+
+
+def test_calendar_has_one_event_per_showtime():
+    rows = [showtime(18), showtime(21, duration=0, booking_link=None)]
+    text = ''.join(render_calendar('Multisala Lux', iter(rows), STAMP, chunk_events=1))
+
+    assert text.startswith('BEGIN:VCALENDAR\r\n') and text.endswith('END:VCALENDAR\r\n')
+    assert text.count('BEGIN:VEVENT') == 2
+    assert 'DTSTART;TZID=Europe/Rome:20300110T183000' in text
+    assert 'DTEND;TZID=Europe/Rome:20300110T201000' in text
+    # Unknown runtime falls back to two hours
+    assert 'DTEND;TZID=Europe/Rome:20300110T233000' in text
+    assert text.count('URL:') == 1
+    assert 'UID:conclave-lux-20300110T183000@stacco' in text
+
+
+class FakeCatalogue:
+    def __init__(self):
+        self.version = 7
+        self.reads = 0
+
+    async def get_catalogue_version(self):
+        self.reads += 1
+        return self.version, STAMP
+
+
+@pytest.mark.asyncio
+async def test_renders_are_cached_per_catalogue_version():
+    db = FakeCatalogue()
+    cache = CalendarCache(db, max_entries=2, version_ttl=60)
+
+    version, _ = await cache.version()
+    assert list(cache.tee(('cinema', 'lux'), version, iter(['a', 'b']))) == [b'a', b'b']
+    assert cache.get(('cinema', 'lux'), version) == b'ab'
+
+    db.version = 8
+    await cache.version()
+    assert db.reads == 1  # still within the TTL
+
+    assert cache.get(('cinema', 'lux'), 8) is None
+    cache.put(('movie', 'a'), 8, b'1')
+    cache.put(('movie', 'b'), 8, b'2')
+    assert cache.get(('cinema', 'lux'), version) is None  # evicted
+
+
+def test_if_none_match():
+    etag = CalendarCache.etag(7)
+    assert not_modified(etag, etag)
+    assert not_modified(f'"other", W/{etag}', etag)
+    assert not_modified('*', etag)
+    assert not not_modified(CalendarCache.etag(8), etag)
+    assert not not_modified(None, etag)
@@ -0,0 +1,40 @@
+import json
+import os
+
+from backend.database.catalogue_snapshot import CatalogueSnapshot, write_snapshot
+
+MOVIES = [('dune', '{"id": "dune", "title": "Dune"}'), ('up', '{"id": "up", "title": "Up è"}')]
+CINEMAS = [('lux', '{"id": "lux", "name": "Multisala Lux"}')]
+
+
+def test_snapshot_round_trip(tmp_path):
+    path = str(tmp_path / 'catalogue.snap')
+    meta = write_snapshot(path, MOVIES, CINEMAS, catalogue_version=7, changes_through=42)
+    assert meta['catalogue_version'] == 7
+
+    snapshot = CatalogueSnapshot(path)
+    assert snapshot.available and snapshot.header['changes_through'] == 42
+    assert [m['id'] for m in json.loads(snapshot.movies())] == ['dune', 'up']
+    assert json.loads(snapshot.cinemas()) == [{'id': 'lux', 'name': 'Multisala Lux'}]
+    assert json.loads(snapshot.movie('up'))['title'] == 'Up è'
+    assert json.loads(snapshot.cinema('lux'))['name'] == 'Multisala Lux'
+    assert snapshot.movie('missing') is None
+    snapshot.close()
+
+
+def test_snapshot_follows_new_publication(tmp_path):
+    path = str(tmp_path / 'catalogue.snap')
+    snapshot = CatalogueSnapshot(path, check_interval=0)
+    assert not snapshot.available
+
+    write_snapshot(path, MOVIES, CINEMAS, catalogue_version=1)
+    assert snapshot.available
+    assert snapshot.header['catalogue_version'] == 1
+
+    write_snapshot(path, MOVIES[:1], [], catalogue_version=2)
+    assert snapshot.available
+    assert snapshot.header['catalogue_version'] == 2
+    assert json.loads(snapshot.movies()) == [{'id': 'dune', 'title': 'Dune'}]
+    assert json.loads(snapshot.cinemas()) == []
+    assert [name for name in os.listdir(tmp_path)] == ['catalogue.snap']
+    snapshot.close()
@@ -0,0 +1,95 @@
+import json
+
+import pytest
+
+from backend.api.events import RESYNC, ChangeBroker, compact_changes, format_event
+from backend.database.db_manager import change_payloads
+
+
+def showtime(cinema_id, movie_id='conclave', kind='showtime.added'):
+    return {'type': kind, 'cinema_id': cinema_id, 'movie_id': movie_id, 'date': '10-01-2030', 'time': '21:00'}
+
+
+async def never_disconnected():
+    return False
+
+
+def drain(subscription):
+    items = []
+    while not subscription.queue.empty():
+        items.append(subscription.queue.get_nowait())
+    return items
+
+
+@pytest.mark.asyncio
+async def test_changes_reach_matching_subscribers_only():
+    broker = ChangeBroker(db=None)
+    everything = broker.subscribe()
+    lux = broker.subscribe(cinemas=['lux'])
+    dune = broker.subscribe(movies=['dune'])
+
+    broker.publish([showtime('lux'), showtime('nuovo', movie_id='dune')])
+
+    assert len(drain(everything)) == 2
+    assert [change['cinema_id'] for change in drain(lux)] == ['lux']
+    assert [change['movie_id'] for change in drain(dune)] == ['dune']
+
+
+@pytest.mark.asyncio
+async def test_slow_subscriber_gets_a_resync_instead_of_its_backlog():
+    broker = ChangeBroker(db=None, queue_size=3)
+    slow = broker.subscribe()
+
+    broker.publish([showtime('lux', movie_id=str(i)) for i in range(5)])
+
+    assert drain(slow) == [RESYNC, showtime('lux', movie_id='4')]
+
+
+@pytest.mark.asyncio
+async def test_stream_sends_events_and_heartbeats_until_stopped():
+    broker = ChangeBroker(db=None, heartbeat=0.05)
+    subscription = broker.subscribe()
+    stream = broker.stream(subscription, never_disconnected)
+
+    assert (await stream.__anext__()).startswith('retry:')
+    assert await stream.__anext__() == ': keep-alive\n\n'
+
+    broker.publish([showtime('lux')])
+    event = await stream.__anext__()
+    assert event.startswith('event: showtime.added\ndata: ')
+    assert json.loads(event.split('data: ')[1]) == showtime('lux')
+
+    await broker.stop()
+    with pytest.raises(StopAsyncIteration):
+        await stream.__anext__()
+    assert broker.subscribers == 0
+
+
+def test_payloads_fit_in_a_notify():
+    changes = [dict(showtime('lux'), booking_link='x' * 500) for _ in range(40)]
+    payloads = change_payloads(changes, limit=2000)
+
+    assert all(len(payload.encode('utf-8')) <= 2000 for payload in payloads)
+    assert [change for payload in payloads for change in json.loads(payload)] == changes
+
+
+def test_compaction_keeps_the_net_effect_per_showtime():
+    changes = [
+        dict(showtime('lux'), seq=1, booking_link='a'),
+        dict(showtime('lux', movie_id='dune'), seq=2),
+        dict(showtime('lux'), seq=3, type='showtime.changed', booking_link='b'),
+        dict(showtime('lux', movie_id='dune'), seq=4, type='showtime.removed'),
+        dict(showtime('nuovo'), seq=5, type='showtime.changed', booking_link='c'),
+        {'type': 'movie.added', 'movie_id': 'conclave', 'seq': 6},
+    ]
+
+    assert compact_changes(changes) == [
+        # Added since the client's cursor, so still an addition, with the latest link
+        dict(showtime('lux'), seq=3, booking_link='b'),
+        dict(showtime('nuovo'), seq=5, type='showtime.changed', booking_link='c'),
+        {'type': 'movie.added', 'movie_id': 'conclave', 'seq': 6},
+    ]
+
+
+def test_logged_changes_carry_their_sequence_number_as_event_id():
+    assert format_event(dict(showtime('lux'), seq=42)).startswith('id: 42\nevent: showtime.added\n')
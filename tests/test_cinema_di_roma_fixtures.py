@@ -0,0 +1,60 @@
+import os
+
+import pytest
+
+from backend.benchmarks.fixture_server import DEFAULT_CORPUS_DIR, FixtureServer
+from backend.benchmarks.scraper_benchmark import InMemorySink
+from backend.scrapers.cinema_di_roma_scraper import CinemaDiRomaScraper
+
+
+def read_fixture(name):
+    with open(os.path.join(DEFAULT_CORPUS_DIR, f"{name}.html"), encoding='utf-8') as f:
+        return f.read()
+
+
+def test_parse_cinemas_from_fixture():
+    scraper = CinemaDiRomaScraper(base_url="http://fixture", db=InMemorySink())
+    cinemas = scraper.parse_cinemas(read_fixture('index'))
+    assert set(cinemas) == {'intrastevere', 'lux', 'odeon', 'tibur'}
+    assert cinemas['lux']['url_path'] == 'programmazione-multisala-lux'
+    assert cinemas['lux']['icon_url'] == "http://fixture/images/cinema/lux.png"
+
+
+def test_parse_showtimes_from_fixture():
+    scraper = CinemaDiRomaScraper(base_url="http://fixture", db=InMemorySink())
+    scraper.cinemas = scraper.parse_cinemas(read_fixture('index'))
+    movies = scraper.parse_showtimes(read_fixture('programmazione-multisala-lux'), 'lux')
+
+    assert movies
+    assert [movie['title'] for movie in movies] == sorted(movie['title'] for movie in movies)
+    for movie in movies:
+        assert movie['genre']
+        assert isinstance(movie['duration'], int) and movie['duration'] > 0
+        assert movie['language']
+        assert movie['poster_url'].startswith('http')
+        assert movie['showtimes']
+        keys = [(s['date'], s['time']) for s in movie['showtimes']]
+        assert len(keys) == len(set(keys))
+        for showtime in movie['showtimes']:
+            assert showtime['cinema'] == 'Multisala Lux'
+            assert showtime['booking_link'].startswith("http://fixture/acquista-biglietto")
+
+
+@pytest.mark.asyncio
+async def test_scrape_against_fixture_server_with_injected_errors():
+    sink = InMemorySink()
+    async with FixtureServer(error_rate=0.3, seed=1) as server:
+        scraper = CinemaDiRomaScraper(base_url=server.base_url, db=sink)
+        scraper.retry_delay = 0
+        scraper.request_delay = 0
+        try:
+            cinemas = await scraper.get_cinemas()
+            for cinema in cinemas:
+                await scraper.get_showtimes(cinema['id'])
+        finally:
+            await scraper.close()
+
+    assert len(cinemas) == 4
+    assert set(sink.cinemas) == {'intrastevere', 'lux', 'odeon', 'tibur'}
+    assert {cinema_id for _, cinema_id, _, _ in sink.showtimes} == set(sink.cinemas)
+    assert server.errors > 0
@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+
+from backend.api.email_filter import CountingBloomFilter, EmailPrefilter
+
+
+class FakeUsers:
+    def __init__(self, emails):
+        self.rows = [(i + 1, email) for i, email in enumerate(emails)]
+        self.lookups = 0
+        self.scans = 0
+
+    async def get_user_emails(self, after_id=0):
+        self.scans += 1
+        return [row for row in self.rows if row[0] > after_id]
+
+    async def email_exists(self, email):
+        self.lookups += 1
+        return any(existing == email for _, existing in self.rows)
+
+
+def test_counting_bloom_filter_has_no_false_negatives():
+    bloom = CountingBloomFilter(2000, error_rate=0.01)
+    members = [f"user{i}@example.com" for i in range(2000)]
+    for member in members:
+        bloom.add(member)
+    assert all(member in bloom for member in members)
+
+    false_positives = sum(f"other{i}@example.com" in bloom for i in range(10000))
+    assert false_positives < 300
+
+    bloom.remove(members[0])
+    assert members[0] not in bloom
+    assert all(member in bloom for member in members[1:])
+
+
+@pytest.mark.asyncio
+async def test_prefilter_answers_new_addresses_without_database():
+    db = FakeUsers(['mario@example.com', 'luigi@example.com'])
+    prefilter = EmailPrefilter(db)
+
+    # Not built yet: everything goes to the database
+    assert await prefilter.email_exists('new@example.com') is False
+    assert db.lookups == 1
+
+    await prefilter.rebuild()
+    db.scans = 0
+    for i in range(100):
+        assert await prefilter.email_exists(f"new{i}@example.com") is False
+    assert db.lookups < 5
+    assert db.scans == 0
+    assert await prefilter.email_exists('Mario@Example.com') is False  # exact match in the DB
+    assert await prefilter.email_exists('mario@example.com') is True
+
+
+@pytest.mark.asyncio
+async def test_prefilter_tracks_created_and_deleted_users():
+    db = FakeUsers(['mario@example.com'])
+    prefilter = EmailPrefilter(db)
+    await prefilter.rebuild()
+
+    # Registered through another worker, picked up by the next sync
+    db.rows.append((2, 'peach@example.com'))
+    assert not prefilter.might_exist('peach@example.com')
+    await prefilter.sync()
+    assert prefilter.might_exist('peach@example.com')
+
+    # Registered through another worker since the last sync: found once
+    # the recheck interval has passed, with one query for all lookups
+    db.rows.append((3, 'daisy@example.com'))
+    prefilter.synced_at -= prefilter.recheck_interval
+    db.scans = 0
+    found = await asyncio.gather(*(prefilter.email_exists('daisy@example.com') for _ in range(10)))
+    assert all(found)
+    assert prefilter.synced_id == 3
+    assert db.scans == 1
+
+    db.rows = [row for row in db.rows if row[0] != 1]
+    prefilter.remove('mario@example.com', 1)
+    assert not prefilter.might_exist('mario@example.com')
+
+    # Never synced, so removing it must not touch the counters
+    prefilter.remove('toad@example.com', 99)
+    assert prefilter.might_exist('peach@example.com')
@@ -0,0 +1,57 @@
+import argparse
+import json
+import os
+
+import pytest
+
+from backend.benchmarks.fixture_server import FixtureServer
+from backend.benchmarks.scraper_benchmark import InMemorySink
+from backend.database.catalogue_snapshot import CatalogueSnapshot
+from backend.scrapers.cinema_di_roma_scraper import CinemaDiRomaScraper
+from backend.scrapers.html_archive import HtmlArchive
+from backend.scripts.replay_archive import replay
+
+
+def test_archive_deduplicates_identical_pages(tmp_path):
+    archive = HtmlArchive(str(tmp_path))
+    first = archive.store("http://site/a", b"<html>a</html>", 'test')
+    archive.store("http://site/b", b"<html>a</html>", 'test')
+    archive.store("http://site/a", "<html>à</html>".encode('utf-8'), 'test', encoding='utf-8')
+
+    objects = [name for _, _, files in os.walk(tmp_path / 'objects') for name in files]
+    assert len(objects) == 2
+    assert len(list(archive.entries())) == 3
+    assert archive.load(first['sha256']) == b"<html>a</html>"
+
+    latest = archive.latest(scraper='test')
+    assert archive.load_text(latest["http://site/a"]) == "<html>à</html>"
+    assert archive.latest(scraper='other') == {}
+
+
+@pytest.mark.asyncio
+async def test_replay_reproduces_the_live_scrape(tmp_path, monkeypatch):
+    sink = InMemorySink()
+    async with FixtureServer() as server:
+        scraper = CinemaDiRomaScraper(base_url=server.base_url, db=sink, archive=HtmlArchive(str(tmp_path)))
+        scraper.request_delay = 0
+        try:
+            for cinema in await scraper.get_cinemas():
+                await scraper.get_showtimes(cinema['id'])
+        finally:
+            await scraper.close()
+
+        args = argparse.Namespace(archive=str(tmp_path), at=None, base_url=server.base_url,
+                                  workers=2, dry_run=True)
+        result = await replay(args)
+
+        # Ingest into SQLite and republish the snapshot
+        snapshot_path = str(tmp_path / 'catalogue.snap')
+        monkeypatch.setenv('STORAGE_URL', f"sqlite:///{tmp_path / 'catalogue.db'}")
+        monkeypatch.setenv('CATALOGUE_SNAPSHOT_PATH', snapshot_path)
+        args.dry_run = False
+        await replay(args)
+
+    assert result == {'pages': 4, 'showtimes': len(sink.showtimes)}
+    snapshot = CatalogueSnapshot(snapshot_path)
+    assert snapshot.available and len(json.loads(snapshot.cinemas())) == 4
+    snapshot.close()
@@ -0,0 +1,111 @@
+import asyncio
+import hashlib
+import io
+import os
+
+import pytest
+import pytest_asyncio
+from aiohttp import web
+
+from backend.api.images import IMAGE_WIDTHS, ImageProxy
+
+Image = pytest.importorskip('PIL.Image')
+
+
+def png_bytes(width=800, height=1200):
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height), (200, 30, 30)).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+class FakeSources:
+    def __init__(self, urls):
+        self.urls = {hashlib.md5(url.encode()).hexdigest(): url for url in urls}
+
+    async def get_image_source(self, image_id):
+        return self.urls.get(image_id)
+
+
+@pytest_asyncio.fixture
+async def origin():
+    hits = {'count': 0}
+    body = png_bytes()
+
+    async def poster(request):
+        hits['count'] += 1
+        await asyncio.sleep(0.05)
+        return web.Response(body=body, content_type='image/png')
+
+    app = web.Application()
+    app.router.add_get('/poster.png', poster)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    yield f"http://127.0.0.1:{port}/poster.png", hits
+    await runner.cleanup()
+
+
+def test_width_and_format_negotiation():
+    assert ImageProxy.pick_width(None) == 320
+    assert ImageProxy.pick_width(200) == 320
+    assert ImageProxy.pick_width(5000) == IMAGE_WIDTHS[-1]
+    assert ImageProxy.pick_format(None, 'image/avif,image/webp,*/*') == 'webp'
+    assert ImageProxy.pick_format(None, 'image/png,*/*') == 'jpeg'
+    assert ImageProxy.pick_format('jpeg', 'image/webp') == 'jpeg'
+    assert not ImageProxy.valid_id('../../etc/passwd')
+
+
+@pytest.mark.asyncio
+async def test_original_fetched_once_and_variants_rendered(origin, tmp_path):
+    url, hits = origin
+    image_id = hashlib.md5(url.encode()).hexdigest()
+    proxy = ImageProxy(FakeSources([url]), str(tmp_path), workers=1)
+    try:
+        paths = await asyncio.gather(*[proxy.variant(image_id, 320, 'webp') for _ in range(5)])
+        assert hits['count'] == 1
+        assert len(set(paths)) == 1
+        with Image.open(paths[0]) as variant:
+            assert variant.format == 'WEBP' and variant.size == (320, 480)
+
+        # Every variant was rendered together, so other sizes need no work
+        jpeg = await proxy.variant(image_id, 640, 'jpeg')
+        with Image.open(jpeg) as variant:
+            assert variant.format == 'JPEG' and variant.width == 640
+        assert hits['count'] == 1
+
+        assert await proxy.variant('0' * 32, 320, 'webp') is None
+    finally:
+        await proxy.close()
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    proxy = ImageProxy(FakeSources([]), str(tmp_path), max_bytes=3000)
+    directory = tmp_path / 'variants' / 'ab'
+    directory.mkdir(parents=True)
+    for age, name in enumerate(['newest', 'recent', 'old', 'oldest']):
+        path = directory / f"{name}.webp"
+        path.write_bytes(b'x' * 1000)
+        os.utime(path, (1000 - age, 1000 - age))
+
+    proxy._evict()
+    assert sorted(os.listdir(directory)) == ['newest.webp', 'recent.webp']
+    assert proxy._cache_bytes == 2000
+
+
+def test_originals_count_towards_the_budget(tmp_path):
+    proxy = ImageProxy(FakeSources([]), str(tmp_path), max_bytes=4000)
+    originals = tmp_path / 'originals' / 'cd'
+    variants = tmp_path / 'variants' / 'cd'
+    originals.mkdir(parents=True)
+    variants.mkdir(parents=True)
+    for age, (path, size) in enumerate([(variants / 'cd_320.webp', 1000), (originals / 'cd', 2000),
+                                        (originals / 'cdrendering', 2000)]):
+        path.write_bytes(b'x' * size)
+        os.utime(path, (1000 - age, 1000 - age))
+
+    proxy._evict(keep=frozenset({'cdrendering'}))
+    assert os.listdir(originals) == ['cdrendering']
+    assert os.listdir(variants) == ['cd_320.webp']
+    assert proxy._cache_bytes == 3000
@@ -0,0 +1,69 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend.api.load_shedding import LoadShedder, LoadSheddingMiddleware, route_priority
+from backend.database.db_manager import parse_statement_timeouts
+
+
+def busy_app(shedder):
+    app = FastAPI()
+    app.add_middleware(LoadSheddingMiddleware, shedder=shedder)
+
+    @app.get("/health")
+    async def health():
+        return {"status": "healthy"}
+
+    @app.get("/api/movies")
+    async def movies():
+        return []
+
+    @app.get("/api/users/{user_id}/recommendations")
+    async def recommendations(user_id: int):
+        return {"in_flight": shedder.in_flight}
+
+    @app.get("/api/users/export")
+    async def export():
+        return []
+
+    return app
+
+
+def test_route_priorities():
+    assert route_priority('/health')[0] == 'critical'
+    assert route_priority('/api/movies/dune')[0] == 'catalogue'
+    assert route_priority('/api/catalogue/changes')[0] == 'catalogue'
+    assert route_priority('/api/movies/dune/calendar.ics')[0] == 'heavy'
+    assert route_priority('/api/users')[0] == 'heavy'
+    assert route_priority('/api/users/1')[0] == 'normal'
+
+
+def test_heavy_routes_are_shed_first():
+    shedder = LoadShedder(max_in_flight=10, max_lag=0.5, retry_after=3)
+    client = TestClient(busy_app(shedder))
+
+    # Load 0.6 from event loop lag
+    shedder.lag = 0.3
+    response = client.get('/api/users/export')
+    assert response.status_code == 503 and response.headers['retry-after'] == '3'
+    assert client.get('/api/users/1/recommendations').json() == {"in_flight": 1}
+
+    # Load 1.2 from requests in flight
+    shedder.lag = 0.0
+    shedder.in_flight = 12
+    assert client.get('/api/users/1/recommendations').status_code == 503
+    assert client.get('/api/movies').status_code == 200
+
+    shedder.in_flight = 20
+    assert client.get('/api/movies').status_code == 503
+    assert client.get('/health').status_code == 200
+    assert shedder.in_flight == 20
+
+
+def test_statement_timeout_overrides():
+    assert parse_statement_timeouts('') == {}
+    assert parse_statement_timeouts('get_watches=0, refresh_catalogue=300000') == {
+        'get_watches': 0, 'refresh_catalogue': 300000
+    }
+    with pytest.raises(ValueError):
+        parse_statement_timeouts('refresh_catalogue')
@@ -0,0 +1,74 @@
+import asyncio
+import os
+
+import pytest
+
+from backend.benchmarks.fixture_server import DEFAULT_CORPUS_DIR, FixtureServer
+from backend.benchmarks.scraper_benchmark import InMemorySink
+from backend.scrapers.cinema_di_roma_scraper import CinemaDiRomaScraper
+from backend.scrapers.movie_details import DetailCache, MovieDetailFetcher, parse_movie_details
+
+
+def test_parse_detail_page_fixture():
+    with open(os.path.join(DEFAULT_CORPUS_DIR, 'schede-film', 'in-sala', 'parthenope.html'), encoding='utf-8') as f:
+        details = parse_movie_details(f.read(), "http://fixture")
+
+    assert details['director'] == 'Paolo Sorrentino'
+    assert details['cast'][:2] == ['Celeste Dalla Porta', 'Stefania Sandrelli']
+    assert details['runtime'] == 136
+    assert details['genre'] == 'Drammatico'
+    assert details['poster_url'] == "http://fixture/images/locandine/parthenope.jpg"
+    assert details['synopsis'].startswith('La vita di Parthenope')
+
+
+async def scrape_all_cinemas(scraper):
+    await scraper.get_cinemas()
+    return await asyncio.gather(*[scraper.scrape_cinema(cinema_id) for cinema_id in scraper.cinemas])
+
+
+@pytest.mark.asyncio
+async def test_details_fetched_once_per_movie_across_cinemas(tmp_path):
+    cache_path = str(tmp_path / 'details.sqlite')
+    sink = InMemorySink()
+    async with FixtureServer(latency=0.01) as server:
+        scraper = CinemaDiRomaScraper(base_url=server.base_url, db=sink)
+        scraper.request_delay = 0
+        scraper.details = MovieDetailFetcher(scraper, DetailCache(cache_path), concurrency=3)
+        try:
+            await scrape_all_cinemas(scraper)
+        finally:
+            await scraper.close()
+
+        detail_requests = {path: count for path, count in server.requests_by_path.items()
+                           if path.startswith('/schede-film/')}
+        # Parthenope plays in three cinemas but is fetched once; missing pages are not retried
+        assert detail_requests['/schede-film/in-sala/parthenope'] == 1
+        assert set(detail_requests.values()) == {1}
+        assert sink.movies['parthenope']['details']['director'] == 'Paolo Sorrentino'
+        assert sink.movies['anora']['details'] == {}
+
+        # A restarted scraper answers everything from the persistent cache
+        requests_before = server.requests
+        scraper = CinemaDiRomaScraper(base_url=server.base_url, db=InMemorySink())
+        scraper.request_delay = 0
+        scraper.details = MovieDetailFetcher(scraper, DetailCache(cache_path))
+        try:
+            await scrape_all_cinemas(scraper)
+        finally:
+            await scraper.close()
+        assert scraper.details.fetches == 0
+        assert server.requests - requests_before == 5  # main page + 4 programmes
+
+
+@pytest.mark.asyncio
+async def test_expired_details_are_fetched_again():
+    async with FixtureServer() as server:
+        scraper = CinemaDiRomaScraper(base_url=server.base_url, db=InMemorySink())
+        fetcher = MovieDetailFetcher(scraper, ttl=0)
+        try:
+            first, second = await asyncio.gather(fetcher.get('wicked'), fetcher.get('wicked'))
+            assert first == second and fetcher.fetches == 1
+            await fetcher.get('wicked')
+            assert fetcher.fetches == 2
+        finally:
+            await scraper.close()
@@ -0,0 +1,18 @@
+from datetime import datetime
+
+import pytest
+
+from backend.api.pagination import history_cursor, parse_history_cursor
+
+
+def test_history_cursor_round_trips():
+    watch_date = datetime(2024, 11, 2, 21, 15, 30, 125000)
+    token = history_cursor(watch_date, 42)
+    assert '=' not in token
+    assert parse_history_cursor(token) == (watch_date, 42)
+
+
+@pytest.mark.parametrize('token', ['', 'not-base64!', history_cursor(datetime(2024, 1, 1), 1)[:-3], 'WyJ4IiwxXQ'])
+def test_malformed_history_cursor_is_rejected(token):
+    with pytest.raises(ValueError):
+        parse_history_cursor(token)
@@ -0,0 +1,89 @@
+import pytest
+from psycopg2.errors import FeatureNotSupported
+
+from backend.database.statements import STATEMENTS, StatementRegistry
+
+
+class FakeConnection:
+    pass
+
+
+class FakeCursor:
+    def __init__(self, connection, failures=0):
+        self.connection = connection
+        self.executed = []
+        self.failures = failures
+
+    def execute(self, sql, params=None):
+        self.executed.append((sql, params))
+        if self.failures and 'EXECUTE' in sql:
+            self.failures -= 1
+            raise FeatureNotSupported('cached plan must not change result type')
+
+
+def test_statement_is_prepared_once_per_connection():
+    registry = StatementRegistry()
+    first = FakeCursor(FakeConnection())
+
+    registry.execute(first, 'user_by_email', ('a@example.com',))
+    registry.execute(first, 'user_by_email', ('b@example.com',))
+    assert first.executed == [
+        (f"PREPARE user_by_email AS {STATEMENTS['user_by_email']}", None),
+        ("SAVEPOINT user_by_email; EXECUTE user_by_email (%s)", ('a@example.com',)),
+        ("SAVEPOINT user_by_email; EXECUTE user_by_email (%s)", ('b@example.com',)),
+    ]
+
+    # Another pooled connection has its own session
+    second = FakeCursor(FakeConnection())
+    registry.execute(second, 'all_movies')
+    registry.execute(second, 'user_by_email', ('c@example.com',))
+    assert [sql.split(' AS ')[0] for sql, _ in second.executed] == [
+        'PREPARE all_movies', 'SAVEPOINT all_movies; EXECUTE all_movies',
+        'PREPARE user_by_email', 'SAVEPOINT user_by_email; EXECUTE user_by_email (%s)'
+    ]
+
+
+def test_disabled_registry_sends_statements_inline():
+    registry = StatementRegistry(enabled=False)
+    cur = FakeCursor(FakeConnection())
+
+    registry.execute(cur, 'cinema_movies', ('barberini',))
+    sql, params = cur.executed[0]
+    assert 'PREPARE' not in sql and '$1' not in sql
+    assert sql.count('%(p1)s') == 2
+    assert params == {'p1': 'barberini'}
+
+
+def test_wrong_parameter_count_is_rejected():
+    registry = StatementRegistry()
+    with pytest.raises(ValueError):
+        registry.execute(FakeCursor(FakeConnection()), 'upsert_showtime', ('movie', 'cinema'))
+
+
+def test_statements_invalidated_by_a_schema_change_are_prepared_again():
+    registry = StatementRegistry()
+    cur = FakeCursor(FakeConnection())
+    registry.execute(cur, 'touch_cinema', ('lux',))
+    registry.execute(cur, 'all_movies')
+
+    cur.failures = 1
+    cur.executed = []
+    registry.execute(cur, 'all_movies')
+    assert [sql.split(' AS ')[0] for sql, _ in cur.executed] == [
+        'SAVEPOINT all_movies; EXECUTE all_movies', 'ROLLBACK TO SAVEPOINT all_movies',
+        'DEALLOCATE ALL', 'PREPARE all_movies', 'EXECUTE all_movies'
+    ]
+    # The other statements are prepared again on their next use
+    cur.executed = []
+    registry.execute(cur, 'touch_cinema', ('lux',))
+    assert cur.executed[0][0].startswith('PREPARE touch_cinema')
+
+    # Writes are not retried, but leave the session clean
+    cur.failures = 1
+    with pytest.raises(FeatureNotSupported):
+        registry.execute(cur, 'touch_cinema', ('lux',))
+    cur.executed = []
+    registry.execute(cur, 'touch_cinema', ('lux',))
+    assert [sql.split(' AS ')[0] for sql, _ in cur.executed] == [
+        'DEALLOCATE ALL', 'PREPARE touch_cinema', 'EXECUTE touch_cinema (%s)'
+    ]
@@ -0,0 +1,67 @@
+import pytest
+from fastapi import HTTPException
+
+from backend.api.rate_limit import InMemoryBucketStore, RateLimit, RateLimiter, load_rules
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.mark.asyncio
+async def test_bucket_allows_burst_then_refills():
+    clock = FakeClock()
+    store = InMemoryBucketStore(clock=clock)
+    limit = RateLimit(3, 30)  # one token every 10s
+
+    results = [await store.consume('k', limit) for _ in range(4)]
+    assert [allowed for allowed, _ in results] == [True, True, True, False]
+    assert results[-1][1] == pytest.approx(10.0)
+
+    clock.now += 10
+    assert (await store.consume('k', limit))[0]
+    assert not (await store.consume('k', limit))[0]
+
+
+@pytest.mark.asyncio
+async def test_limiter_rejects_with_retry_after_per_account():
+    limiter = RateLimiter(
+        InMemoryBucketStore(clock=FakeClock()),
+        {'login': {'ip': RateLimit(100, 60), 'account': RateLimit(2, 300)}}
+    )
+    await limiter.check('login', ip='1.2.3.4', account='Mario@Example.com')
+    await limiter.check('login', ip='5.6.7.8', account='mario@example.com ')
+
+    with pytest.raises(HTTPException) as exc_info:
+        await limiter.check('login', ip='9.9.9.9', account='mario@example.com')
+    assert exc_info.value.status_code == 429
+    assert exc_info.value.headers['Retry-After'] == '150'
+
+    # Other accounts and unprotected routes are unaffected
+    await limiter.check('login', ip='9.9.9.9', account='luigi@example.com')
+    await limiter.check('unlimited', ip='9.9.9.9')
+
+
+@pytest.mark.asyncio
+async def test_limiter_falls_back_when_shared_store_fails():
+    class BrokenStore:
+        async def consume(self, key, limit, cost=1.0):
+            raise ConnectionError("redis down")
+
+    limiter = RateLimiter(BrokenStore(), {'check_email': {'ip': RateLimit(1, 60)}})
+    await limiter.check('check_email', ip='1.2.3.4')
+    with pytest.raises(HTTPException):
+        await limiter.check('check_email', ip='1.2.3.4')
+
+
+def test_rule_overrides():
+    rules = load_rules('{"login": {"account": "10/60"}, "register": {"ip": "5/3600"}}')
+    assert rules['login']['account'].burst == 10
+    assert rules['login']['ip'].burst == 20
+    assert rules['register']['ip'].period == 3600
+    with pytest.raises(ValueError):
+        load_rules('{"login": {"cookie": "1/1"}}')
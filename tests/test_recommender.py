@@ -0,0 +1,103 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('scipy')
+
+from backend.utils.recommender import CooccurrenceModel, RecommendationBuilder
+
+WATCHES = [
+    # user 1 and 2 both watched dune and arrival; user 3 dune and barbie
+    (1, 1, 'dune'), (2, 1, 'arrival'),
+    (3, 2, 'dune'), (4, 2, 'arrival'), (5, 2, 'tenet'),
+    (6, 3, 'dune'), (7, 3, 'barbie'),
+]
+PLAYING = {'dune', 'arrival', 'tenet', 'barbie'}
+
+
+def full_counts(model):
+    watched = model._user_rows(sorted(model.user_movies))
+    return (watched.T @ watched).toarray()
+
+
+def test_incremental_counts_match_a_full_rebuild():
+    incremental = CooccurrenceModel()
+    for watch in WATCHES:
+        incremental.add_watches([watch])
+    # A repeated watch changes nothing
+    assert incremental.add_watches([(8, 1, 'dune')]) == set()
+    assert incremental.last_watch_id == 8
+
+    batch = CooccurrenceModel()
+    assert batch.add_watches(WATCHES) == {1, 2, 3}
+    assert np.array_equal(incremental.counts.toarray(), full_counts(incremental))
+
+    dune, arrival = incremental.movie_index['dune'], incremental.movie_index['arrival']
+    assert incremental.counts[dune, dune] == 3
+    assert incremental.counts[dune, arrival] == 2
+
+
+def test_similar_movies_are_ranked_and_limited_to_playing():
+    model = CooccurrenceModel()
+    model.add_watches(WATCHES)
+
+    similar = [(similar_id, rank) for movie_id, similar_id, _, rank in model.similar_movies(PLAYING) if movie_id == 'dune']
+    assert similar[0] == ('arrival', 1)
+    assert {similar_id for similar_id, _ in similar} == {'arrival', 'tenet', 'barbie'}
+
+    without_arrival = model.similar_movies(PLAYING - {'arrival'})
+    assert all(similar_id != 'arrival' for _, similar_id, _, _ in without_arrival)
+
+
+def test_user_recommendations_skip_watched_movies():
+    model = CooccurrenceModel()
+    model.add_watches(WATCHES)
+
+    recommended = model.recommend_users([1, 3], PLAYING)
+    by_user = {}
+    for user_id, movie_id, score, rank in recommended:
+        by_user.setdefault(user_id, []).append(movie_id)
+    assert 'dune' not in by_user[1] and 'arrival' not in by_user[1]
+    assert set(by_user[1]) == {'tenet', 'barbie'}
+    assert by_user[3][0] == 'arrival'
+
+
+class FakeWatches:
+    def __init__(self, watches):
+        self.watches = list(watches)
+        self.user_lists = {}
+
+    async def get_watches(self, after_id=0):
+        return sorted(watch for watch in self.watches if watch[0] > after_id)
+
+    async def get_playing_movie_ids(self):
+        return sorted(PLAYING)
+
+    async def replace_movie_similar(self, rows):
+        pass
+
+    async def replace_user_recommendations(self, user_ids, rows):
+        if user_ids is None:
+            self.user_lists = {}
+        for user_id, movie_id, _, _ in rows:
+            self.user_lists.setdefault(user_id, []).append(movie_id)
+
+
+@pytest.mark.asyncio
+async def test_late_committed_and_deleted_watches_are_caught_up():
+    # Watch 3 is not committed yet when watch 4 is read
+    db = FakeWatches([watch for watch in WATCHES[:4] if watch[0] != 3])
+    builder = RecommendationBuilder(db, full_interval=3600, rescan_window=2)
+    await builder.run_once()
+    assert builder.model.user_movies[2] == {builder.model.movie_index['arrival']}
+
+    db.watches += [(3, 2, 'dune'), (5, 2, 'tenet'), (6, 3, 'dune')]
+    result = await builder.run_once()
+    assert result['users'] == 2
+    assert builder.model.counts[builder.model.movie_index['dune'], builder.model.movie_index['dune']] == 3
+
+    # A full pass starts over: user 1's watches were deleted
+    db.watches = [watch for watch in db.watches if watch[1] != 1]
+    builder._full_at -= 3600
+    await builder.run_once()
+    assert 1 not in builder.model.user_movies and 1 not in db.user_lists
+    assert np.array_equal(builder.model.counts.toarray(), full_counts(builder.model))
@@ -0,0 +1,248 @@
+import asyncio
+import threading
+
+import pytest
+
+from backend.database.db_manager import DatabaseManager, PoolTimeout
+from backend.database.replicas import Replica, ReplicaSet
+from backend.utils.metrics import current_db_method
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def execute(self, sql, params=()):
+        self.conn.executed.append((sql, params))
+
+    def fetchone(self):
+        return (f"PostgreSQL on {self.conn.server}",)
+
+    def fetchall(self):
+        return [(f'"{self.conn.server}"',)]
+
+
+class FakeConnection:
+    def __init__(self, server):
+        self.server = server
+        self.closed = 0
+        self.executed = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+class FakePool:
+    def __init__(self, server, fail=False):
+        self.server = server
+        self.fail = fail
+        self.borrowed = 0
+
+    def getconn(self):
+        if self.fail:
+            raise ConnectionError(f"{self.server} is down")
+        self.borrowed += 1
+        return FakeConnection(self.server)
+
+    def putconn(self, conn, close=False):
+        pass
+
+    def closeall(self):
+        pass
+
+
+@pytest.fixture
+def db(monkeypatch):
+    monkeypatch.setenv('LOCAL_MODE', 'false')
+    monkeypatch.setenv('DATABASE_URL', 'postgresql://app@primary:5432/stacco')
+    monkeypatch.setenv('DATABASE_REPLICA_URLS', 'postgresql://app@replica1:5432/stacco,postgresql://app@replica2:5432/stacco')
+    monkeypatch.setenv('DB_REPLICA_MAX_LAG_SECONDS', '5')
+    monkeypatch.setenv('DB_READ_AFTER_WRITE_SECONDS', '5')
+    # Health is driven by the tests, not the monitor thread
+    monkeypatch.setattr(ReplicaSet, '_ensure_monitor', lambda self: None)
+    manager = DatabaseManager()
+    manager._pool = FakePool('primary')
+    for replica in manager.replicas.replicas:
+        replica.pool = FakePool(replica.name)
+    return manager
+
+
+def set_lag(monkeypatch, replica, lag):
+    monkeypatch.setattr(replica, 'measure_lag', lambda: lag)
+    replica.check()
+
+
+def server_for(db, **kwargs):
+    with db._get_connection(**kwargs) as conn:
+        return conn.server
+
+
+def test_reads_spread_over_healthy_replicas(db, monkeypatch):
+    first, second = db.replicas.replicas
+    # Replicas start unchecked: reads stay on the primary
+    assert server_for(db, readonly=True) == 'primary'
+
+    set_lag(monkeypatch, first, 0.2)
+    set_lag(monkeypatch, second, 1.0)
+    servers = {server_for(db, readonly=True) for _ in range(4)}
+    assert servers == {'replica1:5432', 'replica2:5432'}
+
+    assert server_for(db, readonly=True, fresh=True) == 'primary'
+
+
+def test_lagging_replica_is_skipped(db, monkeypatch):
+    first, second = db.replicas.replicas
+    set_lag(monkeypatch, first, 30.0)
+    set_lag(monkeypatch, second, 0.0)
+    assert {server_for(db, readonly=True) for _ in range(4)} == {'replica2:5432'}
+
+    set_lag(monkeypatch, second, 12.0)
+    assert server_for(db, readonly=True) == 'primary'
+
+
+def test_reads_stay_on_primary_after_a_write(db, monkeypatch):
+    for replica in db.replicas.replicas:
+        set_lag(monkeypatch, replica, 0.0)
+
+    assert server_for(db) == 'primary'
+    assert server_for(db, readonly=True) == 'primary'
+
+    db._last_write -= 10
+    assert server_for(db, readonly=True) != 'primary'
+
+
+def test_background_writes_do_not_pin_reads(db, monkeypatch):
+    for replica in db.replicas.replicas:
+        set_lag(monkeypatch, replica, 0.0)
+
+    assert server_for(db, pins_reads=False) == 'primary'
+    assert server_for(db, readonly=True) != 'primary'
+
+
+def test_unreachable_replica_falls_back_to_primary(db, monkeypatch):
+    first, second = db.replicas.replicas
+    set_lag(monkeypatch, first, 0.0)
+    first.pool = FakePool(first.name, fail=True)
+    monkeypatch.setattr(ReplicaSet, 'available', lambda self: [r for r in self.replicas if r.healthy])
+
+    assert server_for(db, readonly=True) == 'primary'
+    assert not first.healthy
+    # Its slot was given back
+    assert first.slots.acquire(blocking=False)
+
+
+def test_failed_health_check_marks_replica_down():
+    replica = Replica({'host': 'replica', 'port': 5432}, pool_size=1)
+
+    def unreachable():
+        raise ConnectionError('no route to host')
+
+    replica.healthy, replica.lag = True, 0.0
+    replica.measure_lag = unreachable
+    replica.check()
+    assert not replica.healthy and replica.lag is None
+
+
+def test_statement_timeout_follows_the_calling_method(db):
+    db.statement_timeouts['get_watches'] = 60000
+    with db._get_connection() as conn:
+        assert conn.executed == [("SET statement_timeout = %s", (db.statement_timeout,))]
+
+    token = current_db_method.set('get_watches')
+    try:
+        with db._get_connection() as conn:
+            assert conn.executed == [("SET statement_timeout = %s", (60000,))]
+    finally:
+        current_db_method.reset(token)
+
+
+def test_saturated_pool_fails_fast(db):
+    db.pool_timeout = 0.01
+    for _ in range(db.pool_size):
+        db._pool_slots.acquire()
+    with pytest.raises(PoolTimeout):
+        server_for(db)
+
+
+@pytest.mark.asyncio
+async def test_waiting_for_a_connection_does_not_block_the_loop(db):
+    # Streamed exports hold every connection from threadpool threads
+    for _ in range(db.pool_size):
+        db._pool_slots.acquire()
+    ticks = []
+
+    async def ticker():
+        while True:
+            ticks.append(None)
+            await asyncio.sleep(0.01)
+
+    ticking = asyncio.create_task(ticker())
+    threading.Timer(0.2, db._pool_slots.release).start()
+    try:
+        assert await db.test_connection()
+    finally:
+        ticking.cancel()
+    assert len(ticks) >= 5
+    assert db._pool.borrowed == 1
+
+    # Nothing waits on the loop outside a reserving method
+    db._pool_slots.acquire()
+    with pytest.raises(PoolTimeout):
+        server_for(db)
+
+
+@pytest.mark.asyncio
+async def test_connection_wait_times_out_without_losing_slots(db):
+    db.pool_timeout = 0.05
+    for _ in range(db.pool_size):
+        db._pool_slots.acquire()
+    with pytest.raises(PoolTimeout):
+        await db.test_connection()
+
+    for _ in range(db.pool_size):
+        db._pool_slots.release()
+    assert await db.test_connection()
+    assert all(db._pool_slots.acquire(blocking=False) for _ in range(db.pool_size))
+    assert not db._pool_slots.acquire(blocking=False)
+
+
+@pytest.mark.asyncio
+async def test_replica_reads_do_not_need_a_primary_slot(db, monkeypatch):
+    for replica in db.replicas.replicas:
+        set_lag(monkeypatch, replica, 0.0)
+    db.pool_timeout = 0.05
+    # Streamed exports hold every primary connection
+    for _ in range(db.pool_size):
+        db._pool_slots.acquire()
+
+    servers = {await db.get_catalogue_movies() for _ in range(4)}
+    assert servers == {'["replica1:5432"]', '["replica2:5432"]'}
+    with pytest.raises(PoolTimeout):
+        await db.test_connection()
+
+
+@pytest.mark.asyncio
+async def test_read_waits_for_its_busy_replica(db, monkeypatch):
+    first, second = db.replicas.replicas
+    set_lag(monkeypatch, first, 0.0)
+    for _ in range(db.pool_size):
+        db._pool_slots.acquire()
+        first.slots.acquire()
+
+    threading.Timer(0.1, first.slots.release).start()
+    assert await db.get_catalogue_movies() == '["replica1:5432"]'
+    # The slot it waited for went back to the replica
+    assert first.slots.acquire(blocking=False)
+    assert not first.slots.acquire(blocking=False)
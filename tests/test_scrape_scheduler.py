@@ -0,0 +1,101 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from backend.scrapers.scheduler import ScrapeScheduler, next_showtime, retry_interval, scrape_interval
+
+NOW = datetime(2030, 1, 10, 12, 0)
+
+
+def test_interval_shrinks_close_to_showtimes():
+    assert scrape_interval(None, NOW) == 21600
+    assert scrape_interval(NOW + timedelta(hours=3), NOW) == 1800
+    assert scrape_interval(NOW + timedelta(days=5), NOW) == 21600
+    halfway = scrape_interval(NOW + timedelta(days=2), NOW)
+    assert 1800 < halfway < 21600
+
+
+def test_retry_backoff_is_capped():
+    assert [retry_interval(n, 300, 3600) for n in (1, 2, 3, 4, 5)] == [300, 600, 1200, 2400, 3600]
+
+
+def test_next_showtime_skips_past_and_unparseable_dates():
+    movies = [
+        {'showtimes': [{'date': '10-01-2030', 'time': '10:00'}, {'date': 'Oggi', 'time': '21:00'}]},
+        {'showtimes': [{'date': '11-01-2030', 'time': '18:30'}, {'date': '10-01-2030', 'time': '20:15'}]},
+    ]
+    assert next_showtime(movies, NOW) == datetime(2030, 1, 10, 20, 15)
+    assert next_showtime([], NOW) is None
+
+
+class FakeScraper:
+    def __init__(self, failing=()):
+        self.db = None
+        self.cinemas = {}
+        self.failing = set(failing)
+        self.scraped = []
+
+    async def get_cinemas(self):
+        return [{'id': 'lux'}, {'id': 'odeon'}, {'id': 'tibur'}]
+
+    async def scrape_cinema(self, cinema_id):
+        self.scraped.append(cinema_id)
+        if cinema_id in self.failing:
+            raise ConnectionError('timeout')
+        return [{'showtimes': []}]
+
+
+class FakeSchedule:
+    def __init__(self, cinema_ids):
+        self.rows = {
+            cinema_id: {'cinema_id': cinema_id, 'next_run': None, 'consecutive_failures': 0}
+            for cinema_id in cinema_ids
+        }
+        self.results = []
+        self.refreshes = 0
+
+    async def get_scrape_schedule(self):
+        return [dict(row) for row in self.rows.values()]
+
+    async def schedule_scrape(self, cinema_id, next_run):
+        self.rows[cinema_id]['next_run'] = next_run
+
+    async def record_scrape_result(self, cinema_id, started_at, duration_ms, next_run, movie_count=None, error=None):
+        self.rows[cinema_id]['next_run'] = next_run
+        self.rows[cinema_id]['consecutive_failures'] = self.rows[cinema_id]['consecutive_failures'] + 1 if error else 0
+        self.results.append((cinema_id, error))
+
+    async def refresh_catalogue(self):
+        self.refreshes += 1
+
+    async def prune_catalogue_changes(self, retention_seconds):
+        return 0
+
+
+@pytest.mark.asyncio
+async def test_new_cinemas_are_staggered_and_refreshed_once_per_batch():
+    db = FakeSchedule(['lux', 'odeon', 'tibur'])
+    scheduler = ScrapeScheduler(FakeScraper(), db=db, min_interval=1800, jitter=0)
+
+    assert await scheduler.run_once() == ['lux']
+    assert db.refreshes == 1
+    pending = sorted(row['next_run'] for row in db.rows.values())
+    assert (pending[1] - pending[0]).total_seconds() == pytest.approx(600, abs=1)
+
+    # Nothing else is due yet: no scrape and no catalogue rebuild
+    assert await scheduler.run_once() == []
+    assert db.refreshes == 1
+
+
+@pytest.mark.asyncio
+async def test_failures_are_recorded_and_backed_off():
+    db = FakeSchedule(['lux'])
+    scraper = FakeScraper(failing={'lux'})
+    scheduler = ScrapeScheduler(scraper, db=db, retry_delay=300, jitter=0)
+
+    before = datetime.utcnow()
+    assert await scheduler.run_once() == []
+    assert db.results == [('lux', 'timeout')]
+    assert db.refreshes == 0
+    assert db.rows['lux']['consecutive_failures'] == 1
+    assert db.rows['lux']['next_run'] - before >= timedelta(seconds=299)
@@ -0,0 +1,48 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend.api.snapshot_only import SnapshotOnlyMiddleware
+from backend.database.catalogue_snapshot import CatalogueSnapshot, write_snapshot
+
+
+def edge_app(snapshot):
+    app = FastAPI()
+    app.add_middleware(SnapshotOnlyMiddleware, snapshot=snapshot)
+
+    @app.get("/health")
+    async def health():
+        return {"status": "healthy"}
+
+    @app.get("/api/movies/{movie_id}")
+    async def movie(movie_id: str):
+        return {"id": movie_id}
+
+    @app.get("/api/users/{user_id}")
+    async def user(user_id: int):
+        return {"id": user_id}
+
+    return app
+
+
+def test_only_catalogue_routes_are_served(tmp_path):
+    path = str(tmp_path / 'catalogue.snap')
+    write_snapshot(path, [('dune', '{"id": "dune"}')], [], catalogue_version=3)
+    client = TestClient(edge_app(CatalogueSnapshot(path)))
+
+    assert client.get('/health').status_code == 200
+    assert client.get('/api/movies/dune').json() == {"id": "dune"}
+    assert client.get('/api/users/1').status_code == 503
+    assert client.get('/api/movies/dune/also-watched').status_code == 503
+
+
+def test_out_of_rotation_until_a_snapshot_exists(tmp_path):
+    path = str(tmp_path / 'catalogue.snap')
+    client = TestClient(edge_app(CatalogueSnapshot(path, check_interval=0)))
+
+    response = client.get('/health')
+    assert response.status_code == 503 and response.headers['retry-after'] == '5'
+    assert client.get('/api/movies/dune').status_code == 503
+
+    write_snapshot(path, [('dune', '{"id": "dune"}')], [], catalogue_version=1)
+    assert client.get('/health').status_code == 200
+    assert client.get('/api/movies/dune').status_code == 200
@@ -0,0 +1,108 @@
+import json
+
+import pytest
+
+from backend.database.sqlite_storage import SQLiteStorage
+from backend.database.storage import CatalogueStorage, open_storage, sqlite_location
+
+LUX = {'id': 'lux', 'name': 'Multisala Lux', 'cinema_chain': 'Indipendenti', 'latitude': 41.9,
+       'longitude': 12.5, 'website': 'https://lux.example.com', 'icon_url': 'https://lux.example.com/icon.png'}
+
+
+def programme(*showtimes):
+    return [{
+        'id': 'conclave', 'title': 'Conclave', 'genre': 'Drammatico', 'duration': 120, 'language': 'Italiano',
+        'poster_url': 'https://lux.example.com/conclave.jpg',
+        'showtimes': [{'date': date, 'time': time, 'booking_link': f'https://lux.example.com/{time}'}
+                      for date, time in showtimes]
+    }]
+
+
+async def in_memory():
+    storage = SQLiteStorage(':memory:')
+    await storage._ensure_db_exists()
+    return storage
+
+
+def test_sqlite_urls():
+    assert sqlite_location('sqlite:///catalogue.db') == ('catalogue.db', False)
+    assert sqlite_location('sqlite:////srv/catalogue.db?mode=ro') == ('/srv/catalogue.db', True)
+    assert isinstance(open_storage('sqlite:///:memory:'), CatalogueStorage)
+
+
+@pytest.mark.asyncio
+async def test_catalogue_read_model():
+    storage = await in_memory()
+    await storage.update_cinemas([LUX])
+    await storage.update_movies_and_showtimes('lux', programme(('11-01-2030', '21:00'), ('10-01-2030', '18:30')))
+    await storage.refresh_catalogue()
+
+    movie = json.loads(await storage.get_catalogue_movie('conclave'))
+    assert movie['cinemas'] == 'Multisala Lux' and movie['cinema_list'] == ['Multisala Lux']
+    assert [showtime['date'] for showtime in movie['showtimes']] == ['10-01-2030', '11-01-2030']
+    assert movie['next_showtime'] == '2030-01-10T18:30:00'
+
+    cinema = json.loads(await storage.get_catalogue_cinema('lux'))
+    assert cinema['movie_count'] == 1 and cinema['showtime_count'] == 2
+    assert cinema['currentMovies'][0]['title'] == 'Conclave'
+    assert [m['id'] for m in json.loads(await storage.get_catalogue_movies())] == ['conclave']
+    assert (await storage.get_cinema_by_id('lux'))['name'] == 'Multisala Lux'
+
+    version, refreshed_at = await storage.get_catalogue_version()
+    assert version == 1 and refreshed_at is not None
+
+
+@pytest.mark.asyncio
+async def test_rescrape_drops_upcoming_showtimes_only():
+    storage = await in_memory()
+    await storage.update_cinemas([LUX])
+    await storage.update_movies_and_showtimes('lux', programme(('10-01-2020', '21:00'), ('10-01-2030', '18:30'),
+                                                               ('10-01-2030', '21:00')))
+    # A replayed capture only adds to the programme
+    await storage.update_movies_and_showtimes('lux', programme(('10-01-2030', '21:00')))
+    await storage.refresh_catalogue()
+    movie = json.loads(await storage.get_catalogue_movie('conclave'))
+    assert len(movie['showtimes']) == 3
+
+    await storage.update_movies_and_showtimes('lux', programme(('10-01-2030', '21:00')), prune_missing=True)
+    await storage.refresh_catalogue()
+
+    movie = json.loads(await storage.get_catalogue_movie('conclave'))
+    assert [(s['date'], s['time']) for s in movie['showtimes']] == [('10-01-2020', '21:00'), ('10-01-2030', '21:00')]
+
+
+@pytest.mark.asyncio
+async def test_read_only_file(tmp_path):
+    path = str(tmp_path / 'catalogue.db')
+    writer = SQLiteStorage(path)
+    await writer._ensure_db_exists()
+    await writer.update_cinemas([LUX])
+    await writer.refresh_catalogue()
+    await writer.close_connections()
+
+    reader = open_storage(f'sqlite:///{path}?mode=ro')
+    assert json.loads(await reader.get_catalogue_cinemas())[0]['id'] == 'lux'
+    with pytest.raises(Exception):
+        await reader.update_cinemas([LUX])
+    await reader.close_connections()
+
+
+@pytest.mark.asyncio
+async def test_change_watermark_is_kept_and_migrated(tmp_path):
+    path = str(tmp_path / 'catalogue.db')
+    storage = SQLiteStorage(path)
+    with storage._get_connection() as conn:
+        conn.execute("CREATE TABLE catalogue_meta (id INTEGER PRIMARY KEY CHECK (id = 1), version BIGINT NOT NULL "
+                     "DEFAULT 0, refreshed_at TIMESTAMP, changes_pruned_through BIGINT NOT NULL DEFAULT 0)")
+    await storage._ensure_db_exists()
+
+    await storage.update_cinemas([LUX])
+    await storage.refresh_catalogue()
+    assert (await storage.get_catalogue_documents())[3] == 0
+
+    with storage._get_connection() as conn:
+        conn.execute("UPDATE catalogue_meta SET changes_through = 42")
+    await storage.refresh_catalogue()
+    _, _, version, changes_through = await storage.get_catalogue_documents()
+    assert (version, changes_through) == (2, 42)
+    await storage.close_connections()
@@ -0,0 +1,30 @@
+from backend.benchmarks.synthetic_data import generate_cinemas, generate_movies, generate_users
+
+
+def test_generator_is_deterministic():
+    cinemas = generate_cinemas(5, seed=7)
+    assert cinemas == generate_cinemas(5, seed=7)
+    assert generate_movies(20, cinemas, 10, seed=7) == generate_movies(20, cinemas, 10, seed=7)
+
+
+def test_generated_movies_match_scraper_shape():
+    cinemas = generate_cinemas(3)
+    by_cinema = generate_movies(10, cinemas, 12)
+    assert set(by_cinema) == {cinema['id'] for cinema in cinemas}
+
+    movie_ids = set()
+    for movies in by_cinema.values():
+        for movie in movies:
+            movie_ids.add(movie['id'])
+            assert {'id', 'title', 'genre', 'duration', 'language', 'poster_url', 'showtimes'} <= set(movie)
+            assert movie['showtimes']
+            for showtime in movie['showtimes']:
+                day, month, year = showtime['date'].split('-')
+                assert len(day) == 2 and len(month) == 2 and len(year) == 4
+    assert len(movie_ids) == 10
+
+
+def test_generate_users_unique_emails():
+    users = generate_users(50, 'hash')
+    assert len({user['email'] for user in users}) == 50
+    assert all(user['password'] == 'hash' for user in users)
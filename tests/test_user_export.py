@@ -0,0 +1,60 @@
+import csv
+import io
+import json
+from datetime import date
+
+from backend.api.user_export import ExportLimiter, csv_chunks, ndjson_chunks, token_matches
+
+COLUMNS = ('id', 'email', 'nome', 'data_nascita')
+
+
+def users(count):
+    for i in range(1, count + 1):
+        yield {'id': i, 'email': f'user{i}@example.com', 'nome': 'Anna, "Maria"', 'data_nascita': date(1990, 1, i % 28 + 1)}
+
+
+def test_ndjson_is_chunked_one_object_per_line():
+    chunks = list(ndjson_chunks(users(5), chunk_rows=2))
+    assert len(chunks) == 3
+    rows = [json.loads(line) for line in ''.join(chunks).splitlines()]
+    assert [row['id'] for row in rows] == [1, 2, 3, 4, 5]
+    assert rows[0]['data_nascita'] == '1990-01-02'
+
+
+def test_csv_has_header_and_quotes_values():
+    chunks = list(csv_chunks(users(3), COLUMNS, chunk_rows=2))
+    assert len(chunks) == 2
+    rows = list(csv.reader(io.StringIO(''.join(chunks))))
+    assert rows[0] == list(COLUMNS)
+    assert rows[1] == ['1', 'user1@example.com', 'Anna, "Maria"', '1990-01-02']
+    assert len(rows) == 4
+
+
+def test_empty_export_still_has_csv_header():
+    assert list(ndjson_chunks(iter(()))) == []
+    assert list(csv_chunks(iter(()), COLUMNS)) == ['id,email,nome,data_nascita\r\n']
+
+
+def test_export_token_is_required():
+    assert token_matches('s3cret', 's3cret')
+    assert not token_matches('s3cret', 'guess')
+    assert not token_matches('s3cret', None)
+    # Disabled when no token is configured
+    assert not token_matches(None, '')
+
+
+def test_export_slots_are_released_however_the_stream_ends():
+    limiter = ExportLimiter(1)
+    first = limiter.stream(ndjson_chunks(users(3)))
+    assert limiter.stream(ndjson_chunks(users(3))) is None
+
+    assert len(list(first)) == 1
+    second = limiter.stream(ndjson_chunks(users(3)))
+    assert second is not None
+
+    # Abandoned before the first chunk
+    del second
+    third = limiter.stream(ndjson_chunks(users(3)))
+    next(third)
+    third.close()
+    assert limiter.stream(ndjson_chunks(users(3))) is not None
@@ -0,0 +1,89 @@
+import asyncio
+
+import pytest
+
+from backend.api.watch_buffer import WatchEventBuffer
+
+
+class FakeWatches:
+    def __init__(self, failures=0):
+        self.batches = []
+        self.failures = failures
+
+    async def record_watches(self, events):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError('database unavailable')
+        if any('\x00' in event['movie_id'] for event in events):
+            raise ValueError('A string literal cannot contain NUL (0x00) characters.')
+        self.batches.append(list(events))
+        return len(events)
+
+
+def events(count, start=0):
+    return [{'user_id': 1, 'movie_id': f'movie-{i}', 'cinema_id': 'lux'} for i in range(start, start + count)]
+
+
+@pytest.mark.asyncio
+async def test_full_batches_are_written_without_waiting_for_the_timer():
+    db = FakeWatches()
+    buffer = WatchEventBuffer(db, max_batch=100, flush_interval=60)
+    buffer.start()
+    try:
+        assert buffer.offer(events(250))
+        await asyncio.sleep(0.05)
+        assert [len(batch) for batch in db.batches] == [100, 100, 50]
+        assert buffer.pending == 0
+    finally:
+        await buffer.stop()
+
+
+@pytest.mark.asyncio
+async def test_partial_batch_is_written_after_the_interval():
+    db = FakeWatches()
+    buffer = WatchEventBuffer(db, max_batch=100, flush_interval=0.05)
+    buffer.start()
+    try:
+        buffer.offer(events(3))
+        assert db.batches == []
+        await asyncio.sleep(0.2)
+        assert len(db.batches) == 1 and len(db.batches[0]) == 3
+    finally:
+        await buffer.stop()
+
+
+@pytest.mark.asyncio
+async def test_full_buffer_refuses_events():
+    buffer = WatchEventBuffer(FakeWatches(), max_pending=10)
+    assert buffer.offer(events(8))
+    assert not buffer.offer(events(3))
+    assert buffer.pending == 8
+
+
+@pytest.mark.asyncio
+async def test_failed_batch_is_kept_in_order_and_flushed_on_stop():
+    db = FakeWatches(failures=1)
+    buffer = WatchEventBuffer(db, max_batch=2)
+    buffer.offer(events(3))
+
+    with pytest.raises(ConnectionError):
+        await buffer.flush()
+    assert buffer.pending == 3
+
+    await buffer.stop()
+    assert [event['movie_id'] for batch in db.batches for event in batch] == ['movie-0', 'movie-1', 'movie-2']
+    assert buffer.pending == 0
+
+
+@pytest.mark.asyncio
+async def test_invalid_events_are_isolated_and_dropped():
+    db = FakeWatches()
+    buffer = WatchEventBuffer(db, max_batch=8)
+    queued = events(8)
+    queued[5]['movie_id'] = 'bad\x00'
+    buffer.offer(queued)
+
+    assert await buffer.flush() == 7
+    stored = [event['movie_id'] for batch in db.batches for event in batch]
+    assert stored == [f'movie-{i}' for i in range(8) if i != 5]
+    assert buffer.pending == 0